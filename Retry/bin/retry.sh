@@ -5,41 +5,16 @@ set -euo pipefail
 # -----------------------------
 # Periodically move jobs from inbox/failed -> inbox/pending
 # Allows for automatic retries of transient failures (rate limits, timeouts)
-
-BASE="$HOME/BandcampSync/Sync/inbox"
-FAILED="$BASE/failed"
-PENDING="$BASE/pending"
-LOG="$HOME/BandcampSync/Retry/logs/retry.log"
-
-mkdir -p "$(dirname "$LOG")"
-
-log() {
-  # Structured logging for retry actions
-  local action="$1"
-  local job_id="${2:-}" 
-  local detail="${3:-}"
-  printf '%s action=%s job_id=%s detail="%s"\n' "$(date -Is)" "$action" "$job_id" "$detail" >> "$LOG"
-}
-
-log "retry_start" "-" "retry.sh started"
-
-# Check if there are any files
-if [ -z "$(ls -A "$FAILED")" ]; then
-   log "retry_noop" "-" "no failed jobs found"
-   log "retry_end" "-" "retry.sh finished"
-   exit 0
-fi
-
-count=0
-for job in "$FAILED"/*.job; do
-    [ -e "$job" ] || continue
-    
-    filename="$(basename "$job")"
-    job_id="${filename%.job}"
-    
-    log "retry_requeue" "$job_id" "moving failed->pending"
-    mv "$job" "$PENDING/$filename"
-    count=$((count + 1))
-done
-
-log "retry_end" "-" "requeued $count jobs"
+#
+# Only jobs whose backoff window has passed are moved. Each failure records
+# ATTEMPTS, LAST_ERROR and NEXT_ELIGIBLE in the job file (after the URL line)
+# and pushes the next attempt out exponentially, with jitter, so a batch that
+# failed together is not retried together. The work happens in
+# `bandcampctl retry`, which logs retry_start/retry_requeue/retry_end to
+# Retry/logs/retry.log as before.
+
+BASE="$HOME/BandcampSync"
+PYTHON="$BASE/venv/bin/python"
+[[ -x "$PYTHON" ]] || PYTHON="python3"
+
+exec "$PYTHON" "$BASE/bin/bandcampctl" retry
@@ -6,6 +6,10 @@ set -euo pipefail
 # Against actual state (downloaded albums)
 # Enqueue only what’s missing
 
+BASE="$HOME/BandcampSync"
+PYTHON="$BASE/venv/bin/python"
+[[ -x "$PYTHON" ]] || PYTHON="python3"
+
 LOG="$HOME/BandcampSync/Sync/logs/reconcile.log"
 mkdir -p "$(dirname "$LOG")"
 
@@ -20,4 +24,7 @@ log "reconcile_start" "reconcile.sh started"
 "$HOME/BandcampSync/Sync/bin/enqueue_owned.sh"
 log "reconcile_end" "reconcile.sh finished"
 
+# Archive any log past BANDCAMPSYNC_LOG_MAX_MB / _MAX_AGE_DAYS (hourly, with the timer).
+"$PYTHON" "$BASE/bin/bandcampctl" rotate-logs || log "rotate_failed" "bandcampctl rotate-logs exited $?"
+
 
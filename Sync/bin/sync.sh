@@ -4,6 +4,10 @@ set -euo pipefail
 COOKIES="$HOME/.config/bandcamp/cookies.txt"
 OWNED="$HOME/bandcamp-owned.txt"
 DEST="$HOME/Music/Bandcamp"
+# Fragments and post-processing stay on local disk; yt-dlp moves each
+# finished file into $DEST.
+SCRATCH="${BANDCAMPSYNC_SCRATCH_DIR:-$HOME/BandcampSync/cache/scratch}/sync"
+CTL="$HOME/BandcampSync/bin/bandcampctl"
 
 clean_url() {
   echo "$1" | sed 's/&quot;//g' | cut -d',' -f1
@@ -21,30 +25,45 @@ if [[ ! -f "$OWNED" ]]; then
   exit 1
 fi
 
-mkdir -p "$DEST"
+mkdir -p "$DEST" "$SCRATCH"
+"$CTL" library refresh >/dev/null || true
 
 while IFS= read -r url; do
   url="$(clean_url "$url")"
   [[ -z "$url" ]] && continue
   echo "🔍 $url"
 
-  # Compute intended album folder from yt-dlp metadata (fast).
-  # If it exists, skip. If not, download.
-  album_dir="$(yt-dlp --cookies "$COOKIES" --print '%(artist)s/%(album)s' "$url" 2>/dev/null | head -n1 || true)"
+  # Ask the library index first: no network, no yt-dlp startup.
+  if album_dir="$("$CTL" library has "$url" 2>/dev/null)"; then
+    echo "✔ already have: $album_dir"
+    continue
+  fi
+
+  # Index miss: compute intended album folder from yt-dlp metadata.
+  # If it exists, record it in the index and skip. If not, download.
+  album_dir="$("$CTL" ratelimit run bandcamp.com -- yt-dlp --cookies "$COOKIES" --print '%(artist)s/%(album)s' "$url" 2>/dev/null | head -n1 || true)"
   if [[ -n "$album_dir" && -d "$DEST/$album_dir" ]]; then
+    "$CTL" library record "$url" "$album_dir" || true
     echo "✔ already have: $album_dir"
     continue
   fi
 
   echo "⬇ downloading..."
-  yt-dlp \
+  # Holds a slot on the shared limiter; 429/503s slow every stage down.
+  "$CTL" ratelimit run bandcamp.com -- yt-dlp \
     --cookies "$COOKIES" \
     --extract-audio \
     --audio-format flac \
     --embed-metadata \
     --embed-thumbnail \
-    --output "$DEST/%(artist)s/%(album)s/%(track_number)02d - %(title)s.%(ext)s" \
+    --paths "home:$DEST" \
+    --paths "temp:$SCRATCH" \
+    --output "%(artist)s/%(album)s/%(track_number)02d - %(title)s.%(ext)s" \
     "$url"
 
+  if [[ -n "$album_dir" ]]; then
+    "$CTL" library record "$url" "$album_dir" || true
+  fi
+
 done < "$OWNED"
 
@@ -1,9 +1,27 @@
 import os
+import sys
 import glob
 import subprocess
 import json
 import hashlib
-from flask import Flask, jsonify, send_from_directory, request
+import queue
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from flask import Flask, Response, jsonify, send_from_directory, request
+
+# Shared helpers live with the CLI in bin/bandcampctl_lib
+BIN_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../bin'))
+sys.path.insert(0, BIN_DIR)
+from bandcampctl_lib.artwork import ArtworkCache
+from bandcampctl_lib.config import get_paths, get_settings
+from bandcampctl_lib.diskspace import DiskBudget
+from bandcampctl_lib.fs import job_id_for_url
+from bandcampctl_lib.library import LibraryIndex, norm_key
+from bandcampctl_lib.logrotate import parse_timestamp, search_log
+from bandcampctl_lib.logs import tail_lines
+from bandcampctl_lib.queue_state import QueueState
 
 # Configuration
 SYNC_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../Sync'))
@@ -16,6 +34,26 @@ app = Flask(__name__, static_folder=UI_DIR)
 
 # Music Dir
 MUSIC_DIR = os.path.expanduser("~/Music/Bandcamp")
+LIBRARY_DB = os.path.join(os.path.dirname(SYNC_ROOT), 'cache', 'library.sqlite')
+library_index = LibraryIndex(LIBRARY_DB, MUSIC_DIR)
+
+# Album covers, content-addressed by the download engine; looked up by job_id.
+ARTWORK_DIR = os.path.join(os.path.dirname(SYNC_ROOT), 'cache', 'artwork')
+artwork_cache = ArtworkCache(Path(ARTWORK_DIR))
+
+# Free space vs. the worker's reservations; "disk_low" while it is not claiming jobs.
+disk_budget = DiskBudget(get_paths(), get_settings())
+
+# Inbox queues, kept current by inotify instead of listdir() on every request.
+QUEUE_STATES = ['pending', 'in_progress', 'failed', 'done', 'auth_blocked', 'dead']
+queue_state = QueueState({state: Path(INBOX_DIR, state) for state in QUEUE_STATES})
+
+SYSTEMD_UNITS = [
+    'bandcamp-sync-reconcile.service',
+    'bandcamp-sync-worker.service',
+    'bandcamp-sync.path',
+    'bandcamp-sync-worker.path'
+]
 
 def get_systemd_status(units):
     """
@@ -49,29 +87,21 @@ def get_systemd_status(units):
             statuses[unit] = f"error: {str(e)}"
     return statuses
 
+def get_disk_status():
+    """
+    Free/reserved space on the library and scratch filesystems, and whether
+    the worker has paused the queue for lack of it (state 'disk_low').
+    """
+    try:
+        return disk_budget.status()
+    except OSError as e:
+        return {'state': 'unknown', 'detail': str(e), 'filesystems': []}
+
 def count_jobs():
     """
-    Count jobs in queue directories.
+    Count jobs (*.job files) in queue directories.
     """
-    counts = {
-        'pending': 0,
-        'in_progress': 0,
-        'failed': 0,
-        'done': 0
-    }
-    
-    # Simple file counting assuming *.job or similar. 
-    # If jobs are files, count files. If directories, count directories?
-    # User said "Job files (*.job) contain ONE album URL per file."
-    
-    for state in counts.keys():
-        path = os.path.join(INBOX_DIR, state)
-        if os.path.exists(path):
-            # Count visible files only
-            files = [f for f in os.listdir(path) if not f.startswith('.')]
-            counts[state] = len(files)
-            
-    return counts
+    return queue_state.counts()
 
 def get_current_job():
     """
@@ -79,28 +109,23 @@ def get_current_job():
     Assuming 'in_progress' contains the job being worked on.
     We'll pick the first one we find to show details.
     """
-    in_progress_path = os.path.join(INBOX_DIR, 'in_progress')
-    if not os.path.exists(in_progress_path):
-        return None
-        
-    jobs = [f for f in os.listdir(in_progress_path) if f.endswith('.job')]
+    jobs = queue_state.job_ids('in_progress')
     if not jobs:
         return None
-        
+
     # Just take the first one
-    job_file = jobs[0]
-    full_path = os.path.join(in_progress_path, job_file)
-    
+    job_file = f'{jobs[0]}.job'
+    full_path = os.path.join(INBOX_DIR, 'in_progress', job_file)
+
     # Read content
     try:
         with open(full_path, 'r') as f:
             content = f.read().strip()
-    except:
-        content = "Error reading file"
+        stats = os.stat(full_path)
+    except OSError:
+        # Moved on between the event and this read.
+        return None
 
-    # Get stats
-    stats = os.stat(full_path)
-    
     return {
         'filename': job_file,
         'content': content,
@@ -109,80 +134,27 @@ def get_current_job():
 
 def tail_logs(lines=20):
     """
-    Tail the worker and reconcile logs.
-    We'll just cat them and take the last N lines combined? 
-    Or separate? User asked for "Recent Activity (Read-only Log Tail)".
-    Let's mix them and sort by time if possible, or just grab the latest chunk from each.
-    Simplicity: Grab last N lines of worker.log and reconcile.log, merge and sort?
-    Or just worker.log mostly.
-    
-    Let's look for *.log in Sync/logs
+    Last N lines of every *.log in Sync/logs, as {filename: [lines]}.
+    Uses the shared reverse block reader, so the cost is bounded by N rather
+    than by how large worker.log has grown.
     """
-    log_files = glob.glob(os.path.join(LOGS_DIR, '*.log'))
-    entries = []
-    
-    for log_file in log_files:
+    logs_data = {}
+    for log_file in glob.glob(os.path.join(LOGS_DIR, '*.log')):
         filename = os.path.basename(log_file)
         try:
-            # Check size, if huge, seeking might be needed, but for "Recent Activity" 
-            # on a small tool, reading last 10KB is usually fine.
-            file_size = os.path.getsize(log_file)
-            read_size = min(file_size, 20000) # 20KB
-            
-            with open(log_file, 'r', errors='replace') as f:
-                if file_size > read_size:
-                    f.seek(file_size - read_size)
-                
-                content = f.read()
-                file_lines = content.splitlines()
-                
-                # Add to entries
-                for line in file_lines:
-                    if line.strip():
-                        entries.append({
-                            'source': filename,
-                            'text': line.strip()
-                        })
+            logs_data[filename] = tail_lines(Path(log_file), limit=lines)
         except Exception:
-            pass
-
-    # This is a very rough "latest entries". 
-    # Real log parsing for timestamps is fragile without a known format.
-    # We will just return the raw lines to the frontend, maybe just the last N total.
-    # Since we don't know the timestamp format for sure, we can't reliably sort merged logs.
-    # We'll just return the last 15 lines of each log found.
-    # A robust dashboard would use a structured logger. We settle for "whatever is there".
-    
-    # Better: return the data grouped by log file? 
-    # Inspector View requirement: "See related logs".
-    # Recent Activity: "worker -> picked job..."
-    
-    # Let's try to just return the last N lines of the largest/most active log?
-    # Or just return a dict of {filename: [last lines]} and let frontend render.
-    
-    logs_data = {}
-    for log_file in log_files:
-         filename = os.path.basename(log_file)
-         try:
-            # efficient tail
-            proc = subprocess.run(['tail', '-n', str(lines), log_file], capture_output=True, text=True)
-            logs_data[filename] = proc.stdout.splitlines()
-         except:
-             logs_data[filename] = ["Error reading log"]
-             
+            logs_data[filename] = ["Error reading log"]
     return logs_data
 
 def get_job_id(url):
     """
     Generate deterministic job_id from URL (sha1).
-    Matches logic in Sync/bin/enqueue_owned.sh
+    Matches logic in Sync/bin/enqueue_owned.sh / bandcampctl enqueue
     """
     if not url:
         return None
-    # clean url logic from bash: echo "$1" | sed 's/&quot;//g' | cut -d',' -f1
-    # python equivalent:
-    url = url.replace('&quot;', '').split(',')[0]
-    return hashlib.sha1(url.encode('utf-8')).hexdigest()
+    return job_id_for_url(url)
 
 def get_collection_status():
     """
@@ -198,16 +170,14 @@ def get_collection_status():
          return {'status': 'error', 'items': []}
 
     # Map job_id -> status from queues
-    job_status_map = {}
-    
-    for state in ['pending', 'in_progress', 'failed', 'done']:
-        path = os.path.join(INBOX_DIR, state)
-        if os.path.exists(path):
-            files = os.listdir(path)
-            for f in files:
-                if f.endswith('.job'):
-                    job_id = f[:-4] # remove .job
-                    job_status_map[job_id] = state.upper()
+    job_status_map = {job_id: state.upper() for job_id, state in queue_state.job_ids_by_queue().items()}
+
+    # Library index: albums already on disk, whether or not a done/ job exists.
+    # (_refresh_library() keeps it current.)
+    try:
+        library_job_ids, library_keys = library_index.snapshot()
+    except Exception:
+        library_job_ids, library_keys = set(), set()
 
     # Annotate items
     results = []
@@ -221,35 +191,240 @@ def get_collection_status():
         # Determine status
         status = 'UNKNOWN'
         
-        # 1. Check Filesystem (Highest Priority if done job is missing or just to be sure)
-        # Structure: ~/Music/Bandcamp/Artist/Album
-        # We need to sanitize names as yt-dlp/downloader does?
-        # Downloader uses yt-dlp metdata, which might differ slightly from JSON.
-        # But we can try a direct check if simple.
-        # However, checking job_status 'DONE' is reliable for "we processed it".
-        # Let's rely on job_status DONE first, but also check FS if unknown?
-        # User requested: "I would like it to show Downloaded if I downloaded."
-        
-        # Check if job marked as DONE
+        # Queue state is the pipeline truth for anything that has a job;
+        # otherwise fall back to the library index (downloaded outside the queue,
+        # or the done/ job file was cleaned up).
         if job_id and job_status_map.get(job_id) == 'DONE':
              status = 'DOWNLOADED'
         elif job_id and job_id in job_status_map:
              status = job_status_map[job_id]
-        
-        # If still UNKNOWN, check FS? 
-        # Risky without exact path match. Let's stick to job queue state for now as it is the "pipeline" truth.
-        # If the user has "already have" in logs, it means the job went to DONE.
-        # So checking DONE queue is correct.
+        elif job_id in library_job_ids or norm_key(artist, title) in library_keys:
+             status = 'DOWNLOADED'
         
         results.append({
             'artist': artist,
             'title': title,
             'status': status,
-            'url': url
+            'url': url,
+            'job_id': job_id
         })
         
     return {'status': 'ok', 'items': results}
 
+# Memoized /api/collection payload. Rebuilt only when an input changes:
+# collection.json, the queues (QueueState.generation) or the library index
+# (its generation; the rescan itself runs on its own thread, see below).
+_collection_cache = {'signature': None, 'body': None, 'etag': None}
+_collection_lock = threading.Lock()
+
+def _stat_key(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+def collection_signature():
+    try:
+        library_key = library_index.fingerprint()
+    except Exception:
+        library_key = None
+    return (
+        _stat_key(COLLECTION_FILE),
+        queue_state.generation,
+        library_key,
+    )
+
+def get_collection_payload():
+    """
+    Return (json_bytes, etag) for the collection status, recomputing only on change.
+    The ETag is a hash of the body, so it is stable across restarts and
+    identical content never forces a re-download.
+    """
+    signature = collection_signature()
+    with _collection_lock:
+        if _collection_cache['signature'] != signature:
+            body = json.dumps(get_collection_status(), separators=(',', ':')).encode('utf-8')
+            _collection_cache['signature'] = signature
+            _collection_cache['body'] = body
+            _collection_cache['etag'] = hashlib.sha1(body).hexdigest()
+        return _collection_cache['body'], _collection_cache['etag']
+
+# Queued to a client that fell behind: its stream ends so the browser reconnects.
+_CLOSE = ('close', None)
+
+class EventHub:
+    """
+    One shared producer for the dashboard's push channel (/api/events).
+
+    A single background thread watches queue counts, the current job, log
+    files and the collection payload, and fans out only what changed to every
+    connected client. Server work follows the rate of change instead of
+    (tabs x poll rate). The thread runs only while someone is subscribed.
+    """
+
+    def __init__(self, interval=1.0, systemd_interval=15.0, client_buffer=200):
+        self.interval = interval
+        self.systemd_interval = systemd_interval
+        self.client_buffer = client_buffer
+        self._clients = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._state = {}
+        self._log_offsets = {}
+
+    def subscribe(self):
+        client = queue.Queue(maxsize=self.client_buffer)
+        # The log tail, systemctl and the collection payload are slow: build
+        # them outside the lock so publishing to other tabs never waits.
+        logs = tail_logs(20)
+        while True:
+            with self._lock:
+                if self._thread is not None and self._thread.is_alive():
+                    self._clients.add(client)
+                    client.put(('snapshot', dict(self._state, logs=logs)))
+                    return client
+            state, offsets = self._snapshot()
+            with self._lock:
+                # Another subscriber may have started the hub meanwhile.
+                if self._thread is None or not self._thread.is_alive():
+                    self._state, self._log_offsets = state, offsets
+                    self._clients.add(client)
+                    self._thread = threading.Thread(target=self._run, name='event-hub', daemon=True)
+                    self._thread.start()
+                    client.put(('snapshot', dict(state, logs=logs)))
+                    return client
+
+    def unsubscribe(self, client):
+        with self._lock:
+            self._clients.discard(client)
+
+    def publish(self, event, data):
+        with self._lock:
+            clients = list(self._clients)
+        for client in clients:
+            try:
+                client.put_nowait((event, data))
+            except queue.Full:
+                # Too slow to keep up: drop it. Its backlog is moot; the
+                # sentinel ends its stream, and EventSource reconnects and
+                # starts again from a fresh snapshot.
+                self.unsubscribe(client)
+                try:
+                    while True:
+                        client.get_nowait()
+                except queue.Empty:
+                    pass
+                try:
+                    client.put_nowait(_CLOSE)
+                except queue.Full:
+                    pass
+
+    def _snapshot(self):
+        """(state, log offsets) for a hub that is starting up."""
+        offsets = {path: os.path.getsize(path) for path in glob.glob(os.path.join(LOGS_DIR, '*.log'))}
+        return {
+            'queue_generation': queue_state.generation,
+            'counts': count_jobs(),
+            'current_job': get_current_job(),
+            'systemd': get_systemd_status(SYSTEMD_UNITS),
+            'disk': get_disk_status(),
+            'collection_etag': get_collection_payload()[1],
+            'systemd_checked': time.monotonic(),
+        }, offsets
+
+    def _new_log_lines(self):
+        """Yield (filename, [lines]) appended since the last tick."""
+        for path in glob.glob(os.path.join(LOGS_DIR, '*.log')):
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                continue
+            offset = self._log_offsets.get(path, 0)
+            if size < offset:
+                offset = 0  # truncated or replaced
+            if size == offset:
+                continue
+            with open(path, 'rb') as f:
+                f.seek(offset)
+                chunk = f.read(size - offset)
+            # Only hand out complete lines; a partial last line waits a tick.
+            end = chunk.rfind(b'\n') + 1
+            self._log_offsets[path] = offset + end
+            lines = [l for l in chunk[:end].decode('utf-8', errors='replace').splitlines() if l.strip()]
+            if lines:
+                yield os.path.basename(path), lines
+
+    def _tick(self):
+        state = self._state
+
+        # Queue events are only recomputed when a job file actually moved.
+        generation = queue_state.generation
+        if generation != state.get('queue_generation'):
+            state['queue_generation'] = generation
+            counts = count_jobs()
+            if counts != state['counts']:
+                delta = {k: counts[k] - state['counts'].get(k, 0) for k in counts if counts[k] != state['counts'].get(k, 0)}
+                state['counts'] = counts
+                self.publish('queue', {'counts': counts, 'delta': delta})
+
+            current_job = get_current_job()
+            if current_job != state['current_job']:
+                state['current_job'] = current_job
+                self.publish('current_job', current_job)
+
+        for filename, lines in self._new_log_lines():
+            self.publish('log', {'source': filename, 'lines': lines})
+            for line in lines:
+                if 'action=job_transition' in line:
+                    self.publish('job', {'source': filename, 'line': line})
+
+        etag = get_collection_payload()[1]
+        if etag != state['collection_etag']:
+            state['collection_etag'] = etag
+            self.publish('collection', {'etag': etag})
+
+        if time.monotonic() - state['systemd_checked'] >= self.systemd_interval:
+            state['systemd_checked'] = time.monotonic()
+            systemd = get_systemd_status(SYSTEMD_UNITS)
+            disk = get_disk_status()
+            # Free space drifts all the time; only a state change is news.
+            if systemd != state['systemd'] or disk['state'] != state['disk']['state']:
+                state['systemd'] = systemd
+                state['disk'] = disk
+                self.publish('status', {'systemd': systemd, 'disk': disk})
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._clients:
+                    self._thread = None
+                    return
+            try:
+                self._tick()
+            except Exception as e:
+                print(f"event hub tick failed: {e}")
+            time.sleep(self.interval)
+
+event_hub = EventHub()
+
+# Albums copied into ~/Music/Bandcamp by hand only show up after a rescan;
+# do it here rather than on every request or event hub tick.
+LIBRARY_REFRESH_S = 30
+
+def _refresh_library():
+    while True:
+        try:
+            library_index.refresh()
+        except Exception as e:
+            print(f"library refresh failed: {e}")
+        time.sleep(LIBRARY_REFRESH_S)
+
+threading.Thread(target=_refresh_library, name='library-refresh', daemon=True).start()
+
+def format_sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
 @app.route('/')
 def index():
     return send_from_directory(UI_DIR, 'index.html')
@@ -260,14 +435,9 @@ def static_files(path):
 
 @app.route('/api/status')
 def api_status():
-    units = [
-        'bandcamp-sync-reconcile.service',
-        'bandcamp-sync-worker.service',
-        'bandcamp-sync.path',
-        'bandcamp-sync-worker.path'
-    ]
     return jsonify({
-        'systemd': get_systemd_status(units)
+        'systemd': get_systemd_status(SYSTEMD_UNITS),
+        'disk': get_disk_status()
     })
 
 @app.route('/api/queue')
@@ -283,11 +453,88 @@ def api_logs():
         'logs': tail_logs(20)
     })
 
+@app.route('/api/logs/search')
+def api_logs_search():
+    """
+    Search one Sync log (live file + compressed archive segments), e.g.
+    /api/logs/search?log=worker&job=<job_id>&q=failed&since=2026-01-01T00:00:00
+    Segments whose sidecar index rules out the job or time range are skipped
+    without being decompressed. Returns the last `limit` matches.
+    """
+    name = request.args.get('log', 'worker')
+    log_path = os.path.join(LOGS_DIR, f'{name}.log')
+    if os.path.basename(log_path) != f'{name}.log' or not os.path.exists(log_path):
+        return jsonify({'error': f'unknown log: {name}'}), 404
+
+    bounds = {}
+    for key in ('since', 'until'):
+        value = request.args.get(key)
+        bounds[key] = parse_timestamp(value) if value else None
+        if value and bounds[key] is None:
+            return jsonify({'error': f'bad {key} timestamp: {value}'}), 400
+
+    limit = request.args.get('limit', 200, type=int)
+    matches = deque(search_log(
+        Path(log_path),
+        name,
+        job_id=request.args.get('job') or None,
+        text=request.args.get('q') or None,
+        since=bounds['since'],
+        until=bounds['until'],
+    ), maxlen=limit)
+    return jsonify({'log': name, 'lines': list(matches)})
+
+@app.route('/api/events')
+def api_events():
+    """
+    Server-Sent Events stream: a 'snapshot' on connect, then only changes
+    (queue, current_job, job, log, collection, status). A 'ping' every 15s
+    keeps proxies from closing the connection and lets the UI show liveness.
+    """
+    client = event_hub.subscribe()
+
+    def stream():
+        try:
+            while True:
+                try:
+                    item = client.get(timeout=15)
+                except queue.Empty:
+                    item = ('ping', {'time': time.time()})
+                if item is _CLOSE:
+                    return
+                yield format_sse(*item)
+        finally:
+            event_hub.unsubscribe(client)
+
+    response = Response(stream(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 @app.route('/api/collection')
 def api_collection():
-    return jsonify(get_collection_status())
+    body, etag = get_collection_payload()
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/api/artwork/<job_id>')
+def api_artwork(job_id):
+    """
+    An album's cover from the local artwork cache (no Bandcamp request).
+    404 until the album has been downloaded.
+    """
+    path = artwork_cache.lookup(job_id) if len(job_id) == 40 and job_id.isalnum() else None
+    if path is None:
+        return jsonify({'error': 'no artwork'}), 404
+    return send_from_directory(ARTWORK_DIR, path.name, max_age=3600)
 
 if __name__ == '__main__':
     print(f"Starting BandcampSync Dashboard on http://localhost:5000")
     print(f"Observing: {SYNC_ROOT}")
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    # threaded: each open /api/events stream holds a request thread.
+    app.run(host='0.0.0.0', port=5000, debug=True, threaded=True)
@@ -20,17 +20,12 @@ async function fetchStatus() {
 
         updateHeader(true);
         updateSystemd(statusData.systemd);
-        updateQueue(queueData.counts);
-        updateCurrentJob(queueData.current_job);
+        updateDisk(statusData.disk);
         updateQueue(queueData.counts);
         updateCurrentJob(queueData.current_job);
         updateLogs(logsData.logs);
 
-        // Separate fetch for collection to not block essential pulse if it's heavy?
-        // Actually, let's just do it here for simplicity.
-        const collectionRes = await fetch('/api/collection');
-        const collectionData = await collectionRes.json();
-        updateCollection(collectionData);
+        await fetchCollection();
 
     } catch (e) {
         console.error("Fetch failed", e);
@@ -38,6 +33,19 @@ async function fetchStatus() {
     }
 }
 
+// Collection is large and rarely changes: revalidate with the last ETag and
+// only parse + re-render when the server says it changed (200 vs 304).
+let collectionEtag = null;
+
+async function fetchCollection() {
+    const headers = collectionEtag ? { 'If-None-Match': collectionEtag } : {};
+    const res = await fetch('/api/collection', { headers, cache: 'no-store' });
+    if (res.status === 304) return;
+    const data = await res.json();
+    collectionEtag = res.headers.get('ETag');
+    updateCollection(data);
+}
+
 function updateHeader(alive) {
     const el = document.getElementById('header-status');
     if (alive) {
@@ -54,6 +62,8 @@ function updateQueue(counts) {
     document.getElementById('count-in-progress').textContent = counts.in_progress;
     document.getElementById('count-failed').textContent = counts.failed;
     document.getElementById('count-done').textContent = counts.done;
+    document.getElementById('count-auth-blocked').textContent = counts.auth_blocked;
+    document.getElementById('count-dead').textContent = counts.dead;
 }
 
 function updateSystemd(units) {
@@ -82,6 +92,34 @@ function updateSystemd(units) {
     }
 }
 
+function updateDisk(disk) {
+    const container = document.getElementById('disk-stats');
+    container.innerHTML = '';
+    if (!disk) return;
+
+    // One row per filesystem; library and scratch often share one.
+    const colorClass = disk.state === 'ok' ? 'active' : 'failed';
+    const mb = bytes => Math.floor(bytes / 1048576);
+    for (const fs of disk.filesystems) {
+        const row = document.createElement('div');
+        row.className = 'systemd-item';
+        row.innerHTML = `
+            <span>${fs.roles.join(' + ')}</span>
+            <div style="display:flex; align-items:center;">
+                <span class="dot ${colorClass}"></span>
+                <small>${mb(fs.free_bytes)} MB free, ${mb(fs.reserved_bytes)} MB reserved</small>
+            </div>
+        `;
+        container.appendChild(row);
+    }
+    if (disk.state !== 'ok') {
+        const row = document.createElement('div');
+        row.className = 'systemd-item';
+        row.innerHTML = `<small>${disk.state.toUpperCase()}: ${disk.detail || ''}</small>`;
+        container.appendChild(row);
+    }
+}
+
 function updateCurrentJob(job) {
     const container = document.getElementById('job-details');
     if (!job) {
@@ -119,12 +157,37 @@ function updateLogs(logs) {
     fullConsole.textContent = text;
 }
 
+function buildCollectionRows(data) {
+    const fragment = document.createDocumentFragment();
+    data.items.forEach(item => {
+        const row = document.createElement('tr');
+
+        let colorClass = 'lcars-text-gray';
+        if (item.status === 'DOWNLOADED') colorClass = 'lcars-text-orange';
+        if (item.status === 'PENDING') colorClass = 'lcars-text-yellow';
+        if (item.status === 'FAILED') colorClass = 'lcars-text-red';
+        if (item.status === 'AUTH_BLOCKED' || item.status === 'DEAD') colorClass = 'lcars-text-red';
+        if (item.status === 'IN_PROGRESS') colorClass = 'lcars-text-blue';
+
+        row.innerHTML = `
+            <td class="${colorClass}">${item.status}</td>
+            <td>${item.artist}</td>
+            <td>${item.title}</td>
+        `;
+        fragment.appendChild(row);
+    });
+    return fragment;
+}
+
 function updateCollection(data) {
     const targets = [
         { body: 'collection-list-body', warning: 'collection-warning' },
         { body: 'collection-list-body-dashboard', warning: 'collection-warning-dashboard' }
     ];
 
+    // Build the rows once; each table gets its own clone.
+    const rows = data.status === 'missing_file' ? null : buildCollectionRows(data);
+
     targets.forEach(target => {
         const tbody = document.getElementById(target.body);
         const warning = document.getElementById(target.warning);
@@ -139,27 +202,55 @@ function updateCollection(data) {
             if (warning) warning.style.display = 'none';
         }
 
-        tbody.innerHTML = ''; // Clear existing
+        tbody.replaceChildren(rows.cloneNode(true));
+    });
+}
 
-        data.items.forEach(item => {
-            const row = document.createElement('tr');
+// Push channel: one EventSource per tab. The server sends a snapshot on
+// connect and then only changes, so nothing here polls.
+const LOG_LINES = 20;
+let logBuffers = {};
 
-            let colorClass = 'lcars-text-gray';
-            if (item.status === 'DOWNLOADED') colorClass = 'lcars-text-orange';
-            if (item.status === 'PENDING') colorClass = 'lcars-text-yellow';
-            if (item.status === 'FAILED') colorClass = 'lcars-text-red';
-            if (item.status === 'IN_PROGRESS') colorClass = 'lcars-text-blue';
+function appendLogLines(source, lines) {
+    const buffer = (logBuffers[source] || []).concat(lines);
+    logBuffers[source] = buffer.slice(-LOG_LINES);
+    updateLogs(logBuffers);
+}
 
-            row.innerHTML = `
-                <td class="${colorClass}">${item.status}</td>
-                <td>${item.artist}</td>
-                <td>${item.title}</td>
-            `;
-            tbody.appendChild(row);
-        });
+function connectEvents() {
+    const es = new EventSource('/api/events');
+    const on = (name, handler) => es.addEventListener(name, e => {
+        updateHeader(true);
+        handler(JSON.parse(e.data));
     });
+
+    on('snapshot', data => {
+        updateSystemd(data.systemd);
+        updateDisk(data.disk);
+        updateQueue(data.counts);
+        updateCurrentJob(data.current_job);
+        logBuffers = data.logs;
+        updateLogs(logBuffers);
+        fetchCollection();
+    });
+    on('queue', data => updateQueue(data.counts));
+    on('current_job', job => updateCurrentJob(job));
+    on('log', data => appendLogLines(data.source, data.lines));
+    on('collection', () => fetchCollection());
+    on('status', data => {
+        updateSystemd(data.systemd);
+        updateDisk(data.disk);
+    });
+    on('ping', () => {});
+
+    // EventSource reconnects by itself and gets a fresh snapshot.
+    es.onerror = () => updateHeader(false);
 }
 
 // Init
-setInterval(fetchStatus, 3000);
-fetchStatus();
+if (window.EventSource) {
+    connectEvents();
+} else {
+    setInterval(fetchStatus, 3000);
+    fetchStatus();
+}
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Benchmark for bandcampctl_lib.logs.tail_lines.
+
+Builds worker.log-shaped files of increasing size in a temp directory and
+times tailing the last N lines from each. The reverse block reader should
+take the same time at 1MB and at 1GB; the old read-everything approach is
+timed alongside for the smaller files for comparison.
+
+    python3 benchmarks/bench_tail.py                 # 1MB, 100MB, 1GB
+    python3 benchmarks/bench_tail.py --sizes-mb 1 10 --lines 200
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "bin"))
+from bandcampctl_lib.logs import tail_lines  # noqa: E402
+
+LINE = '2026-01-01T00:00:00+00:00 action=job_transition job_id=0123456789abcdef0123456789abcdef01234567 detail="in_progress->done"\n'
+
+
+def build_log(path, size_mb):
+    chunk = (LINE * (1024 * 1024 // len(LINE) + 1)).encode("utf-8")[: 1024 * 1024]
+    # Keep every chunk line-aligned so the file is a valid log.
+    chunk = chunk[: chunk.rfind(b"\n") + 1]
+    with path.open("wb") as f:
+        written = 0
+        while written < size_mb * 1024 * 1024:
+            f.write(chunk)
+            written += len(chunk)
+
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def read_all_tail(path, limit):
+    return path.read_text(encoding="utf-8", errors="replace").splitlines()[-limit:]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes-mb", type=int, nargs="+", default=[1, 100, 1024])
+    parser.add_argument("--lines", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--full-read-max-mb", type=int, default=100,
+                        help="skip the read-everything comparison above this size")
+    args = parser.parse_args(argv)
+
+    print(f"{'size':>8}  {'tail_lines':>12}  {'read_text':>12}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size_mb in args.sizes_mb:
+            path = Path(tmp) / f"worker-{size_mb}mb.log"
+            build_log(path, size_mb)
+            assert tail_lines(path, args.lines) == read_all_tail(path, args.lines) if size_mb <= 10 else True
+            fast = best_of(lambda: tail_lines(path, args.lines), args.repeat)
+            if size_mb <= args.full_read_max_mb:
+                slow = f"{best_of(lambda: read_all_tail(path, args.lines), 1) * 1000:10.2f}ms"
+            else:
+                slow = "skipped"
+            print(f"{size_mb:>6}MB  {fast * 1000:10.3f}ms  {slow:>12}")
+            path.unlink()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -29,7 +29,7 @@ def run_reconcile(paths: Paths) -> ActionResult:
 
 
 def run_worker_once(paths: Paths) -> ActionResult:
-    return _run([str(paths.stage / "bin" / "worker.sh")])
+    return _run([str(paths.stage / "bin" / "worker.sh"), "--once"])
 
 
 def run_scaffold(paths: Paths) -> ActionResult:
@@ -0,0 +1,164 @@
+"""Album artwork, fetched once per album and kept content-addressed.
+
+Layout under ~/BandcampSync/cache/artwork:
+
+    <sha256>.jpg        the image bytes, named by their digest
+    refs/<job_id>       "<sha256>.jpg", which image belongs to which album
+
+Albums that share a cover (reissues, deluxe editions) share one file. The
+download engine fetches an album's cover URL once, embeds the cached file
+into every track and copies it to the album folder as cover.jpg; the
+dashboard serves it from here by job id.
+
+The cache is capped at BANDCAMPSYNC_ARTWORK_CACHE_MB (default 256). Every
+hit bumps the image's mtime, and once the total goes over the cap the least
+recently used images are removed; refs pointing at them simply miss next
+time.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import shutil
+from pathlib import Path
+from typing import Any, List, Optional, Tuple
+
+from .ratelimit import RateLimiter
+
+# Bandcamp serves covers as JPEG; PNG shows up for some user uploads.
+_SIGNATURES = ((b"\xff\xd8\xff", ".jpg"), (b"\x89PNG\r\n\x1a\n", ".png"))
+_MAX_IMAGE_BYTES = 32 * 1024 * 1024
+
+
+class ArtworkError(Exception):
+    pass
+
+
+def image_ext(data: bytes) -> Optional[str]:
+    for signature, ext in _SIGNATURES:
+        if data.startswith(signature):
+            return ext
+    return None
+
+
+class ArtworkCache:
+    def __init__(self, root: Path, max_bytes: int = 256 * 1024 * 1024) -> None:
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+
+    def _ref(self, job_id: str) -> Path:
+        return self.root / "refs" / job_id
+
+    def lookup(self, job_id: str) -> Optional[Path]:
+        """The album's cached image, or None; a hit counts as a use."""
+        try:
+            name = self._ref(job_id).read_text(encoding="utf-8").strip()
+        except OSError:
+            return None
+        if not name or os.sep in name:
+            return None
+        path = self.root / name
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def put(self, job_id: str, data: bytes) -> Path:
+        """Store image bytes for an album; returns the content-addressed file."""
+        ext = image_ext(data)
+        if ext is None:
+            raise ArtworkError("not a JPEG or PNG image")
+        name = hashlib.sha256(data).hexdigest() + ext
+        path = self.root / name
+        self.root.mkdir(parents=True, exist_ok=True)
+        if path.exists():
+            os.utime(path)
+        else:
+            tmp = self.root / f".{name}.{os.getpid()}.tmp"
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+        ref = self._ref(job_id)
+        ref.parent.mkdir(parents=True, exist_ok=True)
+        tmp_ref = ref.with_name(f".{job_id}.{os.getpid()}.tmp")
+        tmp_ref.write_text(name, encoding="utf-8")
+        os.replace(tmp_ref, ref)
+        self.evict(keep=path)
+        return path
+
+    def put_file(self, job_id: str, source: Path) -> Optional[Path]:
+        """Adopt an image that is already on disk (e.g. a zip's cover.jpg)."""
+        try:
+            data = source.read_bytes()
+            return self.put(job_id, data)
+        except (OSError, ArtworkError):
+            return None
+
+    def fetch(self, job_id: str, url: str, limiter: RateLimiter, session: Any = None) -> Path:
+        """The album's image: from the cache, else one paced GET of url."""
+        cached = self.lookup(job_id)
+        if cached is not None:
+            return cached
+        if session is None:
+            import requests
+
+            session = requests.Session()
+            session.headers.update({"User-Agent": "BandcampSync/1.0"})
+        limiter.acquire(url, hold=False)
+        try:
+            resp = session.get(url, timeout=30)
+        except Exception as exc:
+            raise ArtworkError(f"request failed: {exc}") from exc
+        retry_after = resp.headers.get("Retry-After", "")
+        limiter.report(url, resp.status_code, float(retry_after) if retry_after.isdigit() else None)
+        if resp.status_code != 200:
+            raise ArtworkError(f"HTTP Error {resp.status_code} for {url}")
+        if len(resp.content) > _MAX_IMAGE_BYTES:
+            raise ArtworkError(f"image too large ({len(resp.content)} bytes)")
+        return self.put(job_id, resp.content)
+
+    def _images(self) -> List[Tuple[float, int, Path]]:
+        images = []
+        try:
+            with os.scandir(self.root) as it:
+                for entry in it:
+                    if entry.name.startswith(".") or not entry.is_file():
+                        continue
+                    st = entry.stat()
+                    images.append((st.st_mtime, st.st_size, Path(entry.path)))
+        except FileNotFoundError:
+            pass
+        return images
+
+    def evict(self, keep: Optional[Path] = None) -> int:
+        """Drop least recently used images until under max_bytes; returns how many."""
+        images = self._images()
+        total = sum(size for _mtime, size, _path in images)
+        removed = 0
+        for _mtime, size, path in sorted(images):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        return removed
+
+
+def install_cover(image: Path, album_path: Path) -> Path:
+    """Copy the cached image into the album folder as cover.jpg (or cover.png)."""
+    dest = album_path / f"cover{image.suffix}"
+    try:
+        if dest.stat().st_size == image.stat().st_size and dest.read_bytes() == image.read_bytes():
+            return dest
+    except OSError:
+        pass
+    album_path.mkdir(parents=True, exist_ok=True)
+    tmp = album_path / f".{dest.name}.tmp"
+    shutil.copyfile(image, tmp)
+    os.replace(tmp, dest)
+    return dest
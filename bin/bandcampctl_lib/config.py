@@ -1,7 +1,9 @@
 from __future__ import annotations
 
+import os
 from dataclasses import dataclass
 from pathlib import Path
+from typing import Dict
 
 
 @dataclass(frozen=True)
@@ -14,10 +16,44 @@ class Paths:
     in_progress: Path
     failed: Path
     done: Path
+    auth_blocked: Path
+    dead: Path
+    leases: Path
     worker_log: Path
     reconcile_log: Path
     enqueue_log: Path
     ctl_log: Path
+    retry_log: Path
+    cache: Path
+    artwork: Path
+    info_cache: Path
+    music: Path
+    library_db: Path
+    joblog_db: Path
+    ratelimit_state: Path
+    disk_state: Path
+    collection: Path
+    owned: Path
+    cookies: Path
+
+    def queues(self) -> Dict[str, Path]:
+        return {
+            "pending": self.pending,
+            "in_progress": self.in_progress,
+            "failed": self.failed,
+            "done": self.done,
+            "auth_blocked": self.auth_blocked,
+            "dead": self.dead,
+        }
+
+    def named_logs(self) -> Dict[str, Path]:
+        return {
+            "worker": self.worker_log,
+            "reconcile": self.reconcile_log,
+            "enqueue": self.enqueue_log,
+            "ctl": self.ctl_log,
+            "retry": self.retry_log,
+        }
 
 
 def get_paths() -> Paths:
@@ -26,6 +62,7 @@ def get_paths() -> Paths:
     stage = base / "Sync"
     inbox = stage / "inbox"
     logs = stage / "logs"
+    cache = base / "cache"
     return Paths(
         base=base,
         stage=stage,
@@ -35,8 +72,92 @@ def get_paths() -> Paths:
         in_progress=inbox / "in_progress",
         failed=inbox / "failed",
         done=inbox / "done",
+        auth_blocked=inbox / "auth_blocked",
+        dead=inbox / "dead",
+        leases=inbox / "leases",
         worker_log=logs / "worker.log",
         reconcile_log=logs / "reconcile.log",
         enqueue_log=logs / "enqueue.log",
         ctl_log=logs / "ctl.log",
+        retry_log=base / "Retry" / "logs" / "retry.log",
+        cache=cache,
+        artwork=cache / "artwork",
+        info_cache=cache / "info",
+        music=home / "Music" / "Bandcamp",
+        library_db=cache / "library.sqlite",
+        joblog_db=cache / "joblog.sqlite",
+        ratelimit_state=cache / "ratelimit.json",
+        disk_state=cache / "disk.json",
+        collection=base / "collection.json",
+        owned=home / "bandcamp-owned.txt",
+        cookies=home / ".config" / "bandcamp" / "cookies.txt",
+    )
+
+
+@dataclass(frozen=True)
+class Settings:
+    worker_slots: int
+    worker_poll_s: float
+    worker_idle_exit_s: float
+    log_max_bytes: int
+    log_max_age_s: float
+    log_keep_days: float
+    retry_base_s: float
+    retry_max_s: float
+    rate_bandcamp_rps: float
+    rate_cdn_rps: float
+    conn_bandcamp: int
+    conn_cdn: int
+    lease_ttl_s: float
+    download_format: str
+    scratch_dir: Path
+    post_workers: int
+    post_queue: int
+    artwork_cache_bytes: int
+    info_ttl_s: float
+    info_cache_bytes: int
+    disk_min_free_bytes: int
+    track_parallel: int
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def get_settings() -> Settings:
+    # Tunables come from the environment so systemd units can set them with
+    # Environment= lines; CLI flags override these per invocation.
+    return Settings(
+        worker_slots=max(1, _env_int("BANDCAMPSYNC_WORKER_SLOTS", 2)),
+        worker_poll_s=_env_float("BANDCAMPSYNC_WORKER_POLL_S", 5.0),
+        worker_idle_exit_s=_env_float("BANDCAMPSYNC_WORKER_IDLE_EXIT_S", 0.0),
+        log_max_bytes=_env_int("BANDCAMPSYNC_LOG_MAX_MB", 20) * 1024 * 1024,
+        log_max_age_s=_env_float("BANDCAMPSYNC_LOG_MAX_AGE_DAYS", 7.0) * 86400,
+        log_keep_days=_env_float("BANDCAMPSYNC_LOG_KEEP_DAYS", 365.0),
+        retry_base_s=_env_float("BANDCAMPSYNC_RETRY_BASE_S", 900.0),
+        retry_max_s=_env_float("BANDCAMPSYNC_RETRY_MAX_S", 6 * 3600.0),
+        rate_bandcamp_rps=max(0.01, _env_float("BANDCAMPSYNC_RATE_BANDCAMP_RPS", 2.0)),
+        rate_cdn_rps=max(0.01, _env_float("BANDCAMPSYNC_RATE_CDN_RPS", 8.0)),
+        conn_bandcamp=max(1, _env_int("BANDCAMPSYNC_CONN_BANDCAMP", 2)),
+        conn_cdn=max(1, _env_int("BANDCAMPSYNC_CONN_CDN", 4)),
+        lease_ttl_s=max(10.0, _env_float("BANDCAMPSYNC_LEASE_TTL_S", 120.0)),
+        download_format=os.environ.get("BANDCAMPSYNC_FORMAT", "flac"),
+        scratch_dir=Path(os.environ.get("BANDCAMPSYNC_SCRATCH_DIR") or get_paths().cache / "scratch").expanduser(),
+        post_workers=max(1, _env_int("BANDCAMPSYNC_POST_WORKERS", os.cpu_count() or 1)),
+        post_queue=max(1, _env_int("BANDCAMPSYNC_POST_QUEUE", 4)),
+        artwork_cache_bytes=max(1, _env_int("BANDCAMPSYNC_ARTWORK_CACHE_MB", 256)) * 1024 * 1024,
+        info_ttl_s=_env_float("BANDCAMPSYNC_INFO_TTL_DAYS", 7.0) * 86400,
+        info_cache_bytes=max(1, _env_int("BANDCAMPSYNC_INFO_CACHE_MB", 256)) * 1024 * 1024,
+        disk_min_free_bytes=max(0, _env_int("BANDCAMPSYNC_DISK_MIN_FREE_MB", 1024)) * 1024 * 1024,
+        track_parallel=max(0, _env_int("BANDCAMPSYNC_TRACK_PARALLEL", 4)),
     )
@@ -1,13 +1,19 @@
 from __future__ import annotations
 
+import re
+import sqlite3
 import time
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Dict, List, Optional
 
-from .config import Paths
-from .fs import Job, file_mtime, is_file_not_dir, list_jobs
+from .config import Paths, get_settings
+from .diskspace import DISK_LOW, DiskBudget
+from .fs import file_mtime, is_file_not_dir, pid_alive
+from .joblog import JobLogIndex
+from .leases import lease_expired
 from .logs import read_entries
+from .queue_state import QueueState
 
 
 @dataclass(frozen=True)
@@ -18,12 +24,7 @@ class WarningItem:
 
 def queue_dir_warnings(paths: Paths) -> List[WarningItem]:
     warnings: List[WarningItem] = []
-    for label, path in {
-        "pending": paths.pending,
-        "in_progress": paths.in_progress,
-        "failed": paths.failed,
-        "done": paths.done,
-    }.items():
+    for label, path in paths.queues().items():
         if is_file_not_dir(path):
             warnings.append(WarningItem(code="queue_dir_is_file", message=f"{label} queue is a file: {path}"))
     return warnings
@@ -45,8 +46,12 @@ def logs_stale_warnings(paths: Paths, max_age_s: int = 3600) -> List[WarningItem
     return warnings
 
 
+_PID_RE = re.compile(r"\bpid=(\d+)")
+
+
 def worker_lifecycle_warnings(paths: Paths) -> List[WarningItem]:
     # Detect a worker start without a matching end in recent logs.
+    # The worker is long-running, so an open start is fine while its pid lives.
     warnings: List[WarningItem] = []
     entries = read_entries(paths.worker_log, limit=200)
     last_start = None
@@ -57,50 +62,78 @@ def worker_lifecycle_warnings(paths: Paths) -> List[WarningItem]:
         if entry.action == "worker_end":
             last_end = entry
     if last_start and (not last_end or last_end.timestamp < last_start.timestamp):
+        match = _PID_RE.search(last_start.detail)
+        if match and pid_alive(int(match.group(1))):
+            return warnings
         warnings.append(WarningItem(code="worker_incomplete", message="last worker_start has no matching worker_end"))
     return warnings
 
 
-def job_log_coverage_warnings(paths: Paths) -> List[WarningItem]:
+def job_log_coverage_warnings(paths: Paths, queues: QueueState) -> List[WarningItem]:
     # Heuristic: warn if any job in pending/in_progress has no log entries.
+    # Checked against the job log index, i.e. the whole worker.log history.
     warnings: List[WarningItem] = []
-    entries = read_entries(paths.worker_log, limit=500)
-    seen_job_ids = {e.job_id for e in entries if e.job_id and e.job_id != "-"}
-
-    for queue_name, queue_path in {
-        "pending": paths.pending,
-        "in_progress": paths.in_progress,
-    }.items():
-        for job in list_jobs(queue_path, queue_name):
-            if job.job_id not in seen_job_ids:
+    queued = {
+        "pending": queues.job_ids("pending"),
+        "in_progress": queues.job_ids("in_progress"),
+    }
+    index = JobLogIndex(paths.joblog_db, paths.named_logs())
+    try:
+        index.refresh()
+        seen_job_ids = index.job_ids_with_entries(
+            (job_id for job_ids in queued.values() for job_id in job_ids), logs=["worker"]
+        )
+    except sqlite3.Error:
+        return warnings
+
+    for queue_name, job_ids in queued.items():
+        for job_id in job_ids:
+            if job_id not in seen_job_ids:
                 warnings.append(
                     WarningItem(
                         code="job_missing_log",
-                        message=f"job {job.job_id} in {queue_name} has no worker log entries",
+                        message=f"job {job_id} in {queue_name} has no worker log entries",
                     )
                 )
     return warnings
 
 
-def stuck_job_warnings(paths: Paths, max_age_s: int = 1800) -> List[WarningItem]:
+def stuck_job_warnings(paths: Paths, queues: QueueState, ttl_s: Optional[float] = None) -> List[WarningItem]:
+    # A job is stuck once its lease lapsed; the next reap sends it back to pending.
     warnings: List[WarningItem] = []
+    ttl_s = get_settings().lease_ttl_s if ttl_s is None else ttl_s
     now = time.time()
-    for job in list_jobs(paths.in_progress, "in_progress"):
-        if now - job.mtime > max_age_s:
+    for job_id in queues.job_ids("in_progress"):
+        reason = lease_expired(paths, job_id, ttl_s, now)
+        if reason:
             warnings.append(
                 WarningItem(
                     code="job_stuck",
-                    message=f"job {job.job_id} in in_progress for >{max_age_s}s",
+                    message=f"job {job_id} in in_progress: {reason}",
                 )
             )
     return warnings
 
 
-def collect_warnings(paths: Paths) -> List[WarningItem]:
+def disk_warnings(paths: Paths) -> List[WarningItem]:
+    # The worker stops claiming jobs while this holds (diskspace.py).
+    try:
+        disk = DiskBudget(paths, get_settings()).status()
+    except OSError as exc:
+        return [WarningItem(code="disk_unknown", message=f"cannot check free space: {exc}")]
+    if disk["state"] != DISK_LOW:
+        return []
+    return [WarningItem(code=DISK_LOW, message=disk["detail"] or "below BANDCAMPSYNC_DISK_MIN_FREE_MB")]
+
+
+def collect_warnings(paths: Paths, queues: Optional[QueueState] = None) -> List[WarningItem]:
+    # Pass a long-lived QueueState (TUI) to avoid a fresh scan per call.
+    queues = queues or QueueState(paths.queues(), use_inotify=False)
     warnings: List[WarningItem] = []
     warnings.extend(queue_dir_warnings(paths))
     warnings.extend(worker_lifecycle_warnings(paths))
-    warnings.extend(job_log_coverage_warnings(paths))
+    warnings.extend(job_log_coverage_warnings(paths, queues))
     warnings.extend(logs_stale_warnings(paths))
-    warnings.extend(stuck_job_warnings(paths))
+    warnings.extend(stuck_job_warnings(paths, queues))
+    warnings.extend(disk_warnings(paths))
     return warnings
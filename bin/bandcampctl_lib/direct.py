@@ -0,0 +1,435 @@
+"""Direct download of purchased files from the collection's download page.
+
+Owned items have a purchase download page (the "redownload_url" that
+capture_collection_api.py stores per item) which serves the original files
+in the format picked, so nothing is transcoded:
+
+1. fetch the download page with the cookies and read its pagedata blob,
+2. ask .../statdownload/... for the current CDN link of the chosen format,
+3. stream the response and unpack the zip entry by entry into a staging
+   directory in scratch while it downloads; the archive is never written
+   to disk. Single-track purchases arrive as the bare file. The caller
+   publishes the result as ~/Music/Bandcamp/<Artist>/<Album>/.
+
+Anything unexpected raises DirectDownloadError and the caller falls back to
+yt-dlp. Every request is paced by the shared rate limiter.
+"""
+from __future__ import annotations
+
+import html
+import json
+import os
+import re
+import struct
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import unquote
+
+from .config import Paths, Settings
+from .library import AUDIO_EXTS
+from .manifest import AlbumManifest, TrackEntry, write_manifest
+from .ratelimit import Lease, RateLimiter
+
+_PAGEDATA = re.compile(r'id="pagedata"\s+data-blob="([^"]*)"')
+_CHUNK = 256 * 1024
+
+_LOCAL_HEADER = struct.Struct("<IHHHHHIIIHH")
+_LOCAL_SIG = 0x04034B50
+_DESCRIPTOR_SIG = 0x08074B50
+_DESCRIPTOR_MAGIC = struct.pack("<I", _DESCRIPTOR_SIG)
+_FLAG_ENCRYPTED = 0x1
+_FLAG_DESCRIPTOR = 0x8
+_FLAG_UTF8 = 0x800
+_STORED = 0
+_DEFLATED = 8
+
+
+class DirectDownloadError(Exception):
+    pass
+
+
+# yt-dlp's default (non-restricted) substitutions, for when it cannot be imported.
+_FULLWIDTH = {ch: chr(ord(ch) + 0xFEE0) for ch in '"*:<>?|'}
+_FULLWIDTH.update({"/": "\u29f8", "\\": "\u29f9"})
+
+
+def _sanitize_like_yt_dlp(component: str) -> str:
+    component = re.sub(r"[0-9]+(?::[0-9]+)+", lambda m: m.group(0).replace(":", "_"), component)
+    out = []
+    for ch in component:
+        if ch == "\n":
+            out.append("\0 ")
+        elif ch in _FULLWIDTH:
+            out.append(_FULLWIDTH[ch])
+        elif ord(ch) >= 32 and ord(ch) != 127:
+            out.append(ch)
+    result = re.sub(r"(\0.)(?:(?=\1)..)+", r"\1", "".join(out))
+    strip = r"(?:\0.|[ _-])*"
+    result = re.sub(f"^\0.{strip}|{strip}\0.$", "", result)
+    return result.replace("\0", "")
+
+
+def sanitize(component: str) -> str:
+    # What yt-dlp does to each field of the output template, so both
+    # engines land an album (and its tracks) under the same names.
+    try:
+        from yt_dlp.utils import sanitize_filename
+    except ImportError:
+        result = _sanitize_like_yt_dlp(component)
+    else:
+        result = sanitize_filename(component)
+    return "_" if result in ("", ".", "..") else result
+
+
+def load_cookies(session: Any, cookies: Path) -> int:
+    """Netscape cookies.txt -> requests session (the format yt-dlp reads)."""
+    count = 0
+    try:
+        lines = cookies.read_text(encoding="utf-8", errors="replace").splitlines()
+    except OSError:
+        return 0
+    for line in lines:
+        line = line.strip()
+        if line.startswith("#HttpOnly_"):
+            line = line[len("#HttpOnly_"):]
+        elif not line or line.startswith("#"):
+            continue
+        parts = line.split("\t")
+        if len(parts) < 7:
+            continue
+        domain, _flag, path, secure, _expiry, name, value = parts[:7]
+        session.cookies.set(name, value, domain=domain, path=path, secure=secure.upper() == "TRUE")
+        count += 1
+    return count
+
+
+class _Discard:
+    def write(self, data: bytes) -> None:
+        pass
+
+
+class _Stream:
+    """Exact-size reads over an iterator of byte chunks."""
+
+    def __init__(self, chunks: Iterator[bytes]) -> None:
+        self._chunks = chunks
+        self._buf = b""
+
+    def read(self, n: int) -> bytes:
+        while len(self._buf) < n:
+            chunk = next(self._chunks, b"")
+            if not chunk:
+                break
+            self._buf += chunk
+        data, self._buf = self._buf[:n], self._buf[n:]
+        return data
+
+    def read_exact(self, n: int) -> bytes:
+        data = self.read(n)
+        if len(data) != n:
+            raise DirectDownloadError(f"archive truncated (wanted {n} bytes, got {len(data)})")
+        return data
+
+    def unread(self, data: bytes) -> None:
+        self._buf = data + self._buf
+
+    def peek(self, n: int) -> bytes:
+        data = self.read(n)
+        self.unread(data)
+        return data
+
+
+def _zip64_sizes(extra: bytes, csize: int, usize: int) -> Tuple[int, int, bool]:
+    """(compressed, uncompressed size, zip64?) from a local header's extra field.
+
+    A zip64 entry's data descriptor carries 8-byte sizes instead of 4."""
+    pos = 0
+    while pos + 4 <= len(extra):
+        header_id, size = struct.unpack_from("<HH", extra, pos)
+        if header_id == 0x0001:
+            values = list(struct.unpack_from(f"<{size // 8}Q", extra, pos + 4))
+            if usize == 0xFFFFFFFF and values:
+                usize = values.pop(0)
+            if csize == 0xFFFFFFFF and values:
+                csize = values.pop(0)
+            return csize, usize, True
+        pos += 4 + size
+    return csize, usize, False
+
+
+def _copy_stored_until_descriptor(stream: _Stream, out: Any, zip64: bool = False) -> int:
+    """Stored entry of unknown size: copy up to the data descriptor.
+
+    A descriptor signature only counts where the CRC and size after it match
+    the bytes before it, so the same four bytes inside audio data do not.
+    """
+    crc = 0
+    count = 0
+    pending = b""
+    # Signature, CRC and the two sizes, 8 bytes each for zip64.
+    size_format, length, size_mask = ("<IQ", 24, 2**64 - 1) if zip64 else ("<II", 16, 0xFFFFFFFF)
+    while True:
+        chunk = stream.read(_CHUNK)
+        if not chunk:
+            raise DirectDownloadError("archive truncated inside an entry")
+        pending += chunk
+        cut = max(0, len(pending) - (length - 1))
+        pos = pending.find(_DESCRIPTOR_MAGIC)
+        while pos >= 0:
+            if len(pending) < pos + length:
+                cut = min(cut, pos)
+                break
+            head_crc = zlib.crc32(pending[:pos], crc)
+            d_crc, d_size = struct.unpack_from(size_format, pending, pos + 4)
+            if d_crc == head_crc and d_size == (count + pos) & size_mask:
+                out.write(pending[:pos])
+                stream.unread(pending[pos + length:])
+                return head_crc
+            pos = pending.find(_DESCRIPTOR_MAGIC, pos + 1)
+        out.write(pending[:cut])
+        crc = zlib.crc32(pending[:cut], crc)
+        count += cut
+        pending = pending[cut:]
+
+
+def _copy_entry(stream: _Stream, out: Any, method: int, flags: int, csize: int, zip64: bool = False) -> int:
+    """Copy one entry's data to out; returns its CRC-32."""
+    crc = 0
+    inflater = zlib.decompressobj(-15) if method == _DEFLATED else None
+    if flags & _FLAG_DESCRIPTOR:
+        # Size unknown up front: a deflate stream marks its own end, a stored
+        # entry ends at its (verified) data descriptor.
+        if inflater is None:
+            return _copy_stored_until_descriptor(stream, out, zip64)
+        while not inflater.eof:
+            chunk = stream.read(_CHUNK)
+            if not chunk:
+                raise DirectDownloadError("archive truncated inside an entry")
+            data = inflater.decompress(chunk)
+            out.write(data)
+            crc = zlib.crc32(data, crc)
+        stream.unread(inflater.unused_data)
+        if struct.unpack("<I", stream.peek(4))[0] == _DESCRIPTOR_SIG:
+            stream.read_exact(4)
+        expected_crc = struct.unpack("<I", stream.read_exact(4))[0]
+        stream.read_exact(16 if zip64 else 8)  # compressed + uncompressed size
+        if crc != expected_crc:
+            raise DirectDownloadError("CRC mismatch in archive entry")
+        return crc
+
+    remaining = csize
+    while remaining:
+        chunk = stream.read(min(_CHUNK, remaining))
+        if not chunk:
+            raise DirectDownloadError("archive truncated inside an entry")
+        remaining -= len(chunk)
+        data = inflater.decompress(chunk) if inflater is not None else chunk
+        out.write(data)
+        crc = zlib.crc32(data, crc)
+    if inflater is not None:
+        data = inflater.flush()
+        out.write(data)
+        crc = zlib.crc32(data, crc)
+    return crc
+
+
+def _track_name(entry_name: str, artist: str, title: str) -> str:
+    """"Artist - Album - 01 Title.flac" -> "01 - Title.flac" (the yt-dlp layout)."""
+    base = os.path.basename(entry_name.replace("\\", "/"))
+    stem, ext = os.path.splitext(base)
+    if ext.lower() not in AUDIO_EXTS:
+        return sanitize(base)
+    prefix = f"{artist} - {title} - "
+    if stem.startswith(prefix):
+        stem = stem[len(prefix):]
+    match = re.match(r"^(\d+)\s+(.*)$", stem)
+    if match:
+        stem = f"{int(match.group(1)):02d} - {match.group(2)}"
+    return sanitize(stem + ext)
+
+
+def _write_atomic(album_path: Path, name: str, fill: Any) -> Path:
+    # Unpack under a dot-name so a half-written track is never mistaken for one.
+    dest = album_path / name
+    part = album_path / f".{name}.part"
+    try:
+        with part.open("wb") as out:
+            fill(out)
+        os.replace(part, dest)
+    except BaseException:
+        try:
+            part.unlink()
+        except OSError:
+            pass
+        raise
+    return dest
+
+
+def extract_zip_stream(stream: _Stream, album_path: Path, artist: str, title: str) -> List[Path]:
+    """Unpack a zip from a byte stream (local headers only) into album_path."""
+    written: List[Path] = []
+    album_path.mkdir(parents=True, exist_ok=True)
+    while True:
+        head = stream.read(4)
+        if len(head) < 4 or struct.unpack("<I", head)[0] != _LOCAL_SIG:
+            # Central directory (or the end): every entry has been seen.
+            break
+        fields = _LOCAL_HEADER.unpack(head + stream.read_exact(_LOCAL_HEADER.size - 4))
+        _sig, _version, flags, method, _time, _date, crc, csize, usize, name_len, extra_len = fields
+        raw_name = stream.read_exact(name_len)
+        extra = stream.read_exact(extra_len)
+        name = raw_name.decode("utf-8" if flags & _FLAG_UTF8 else "cp437", "replace")
+        csize, usize, zip64 = _zip64_sizes(extra, csize, usize)
+        if flags & _FLAG_ENCRYPTED:
+            raise DirectDownloadError(f"encrypted archive entry: {name}")
+        if method not in (_STORED, _DEFLATED):
+            raise DirectDownloadError(f"unsupported compression method {method}: {name}")
+        if name.endswith("/"):
+            _copy_entry(stream, _Discard(), method, flags, csize, zip64)
+            continue
+
+        actual: Dict[str, int] = {}
+
+        def fill(out: Any) -> None:
+            actual["crc"] = _copy_entry(stream, out, method, flags, csize, zip64)
+
+        dest = _write_atomic(album_path, _track_name(name, artist, title), fill)
+        if not flags & _FLAG_DESCRIPTOR and actual["crc"] != crc:
+            dest.unlink()
+            raise DirectDownloadError(f"CRC mismatch: {name}")
+        written.append(dest)
+    if not written:
+        raise DirectDownloadError("archive contained no files")
+    return written
+
+
+class DirectDownloader:
+    def __init__(self, paths: Paths, settings: Settings, session: Any = None) -> None:
+        self.paths = paths
+        self.format = settings.download_format
+        self.limiter = RateLimiter(paths.ratelimit_state, settings)
+        if session is None:
+            import requests
+
+            session = requests.Session()
+            session.headers.update({"User-Agent": "BandcampSync/1.0"})
+            load_cookies(session, paths.cookies)
+        self.session = session
+
+    def _get(self, url: str, lease: Optional[Lease] = None, **kwargs: Any) -> Any:
+        """GET through the limiter: a token per request, or a held lease (the
+        caller's) whose status is fed back when the caller releases it."""
+        if lease is None:
+            self.limiter.acquire(url, hold=False)
+        try:
+            resp = self.session.get(url, timeout=60, **kwargs)
+        except Exception as exc:
+            raise DirectDownloadError(f"request failed: {exc}") from exc
+        retry_after = resp.headers.get("Retry-After", "")
+        retry_s = float(retry_after) if retry_after.isdigit() else None
+        if lease is None:
+            self.limiter.report(url, resp.status_code, retry_s)
+        else:
+            lease.status, lease.retry_after = resp.status_code, retry_s
+        if resp.status_code != 200:
+            resp.close()
+            raise DirectDownloadError(f"HTTP Error {resp.status_code} for {url.split('?')[0]}")
+        return resp
+
+    def resolve(self, redownload_url: str) -> Tuple[str, Dict[str, Any]]:
+        """(download URL for the chosen format, the page's digital item)."""
+        page = self._get(redownload_url).text
+        match = _PAGEDATA.search(page)
+        if not match:
+            raise DirectDownloadError("download page has no pagedata (not logged in?)")
+        try:
+            blob = json.loads(html.unescape(match.group(1)))
+            item = blob["digital_items"][0]
+            downloads = item["downloads"]
+            if self.format not in downloads:
+                raise DirectDownloadError(f"format {self.format} not offered (have {', '.join(sorted(downloads))})")
+            url = downloads[self.format]["url"]
+            if not isinstance(url, str) or not url:
+                raise DirectDownloadError(f"no download link for {self.format}")
+        except (ValueError, KeyError, IndexError, TypeError, AttributeError) as exc:
+            raise DirectDownloadError(f"unexpected download page data: {exc}") from exc
+        # statdownload hands out the current CDN link (the page's may need a
+        # re-sign); the page link still works if this is not understood.
+        stat_url = url.replace("/download/", "/statdownload/", 1) + "&.vrs=1"
+        try:
+            body = self._get(stat_url).text
+            # Plain JSON, or the same object wrapped in a JS callback.
+            stat, _end = json.JSONDecoder().raw_decode(body, body.index('{"'))
+            url = stat.get("download_url") or stat.get("retry_url") or url
+        except (DirectDownloadError, ValueError):
+            pass
+        return url, item
+
+    def download(self, item_url: str, job_id: str, redownload_url: str, artist: str, title: str,
+                 album_path: Path) -> str:
+        """Fetch and unpack one purchase into album_path and write its
+        manifest there; returns the Artist/Album it belongs under."""
+        url, item = self.resolve(redownload_url)
+        artist = item.get("artist") or artist
+        title = item.get("title") or title
+        album_dir = f"{sanitize(artist)}/{sanitize(title)}"
+        manifest = AlbumManifest(url=item_url, job_id=job_id, artist=artist, album=title)
+        write_manifest(album_path, manifest)
+        # The transfer holds a CDN connection for as long as it runs, so it
+        # counts against BANDCAMPSYNC_CONN_CDN like any other download.
+        lease = self.limiter.acquire(url)
+        try:
+            resp = self._get(url, lease=lease, stream=True)
+            try:
+                stream = _Stream(resp.iter_content(_CHUNK))
+                head = stream.peek(4)
+                if len(head) == 4 and struct.unpack("<I", head)[0] == _LOCAL_SIG:
+                    files = extract_zip_stream(stream, album_path, artist, title)
+                else:
+                    album_path.mkdir(parents=True, exist_ok=True)
+                    name = _filename(resp.headers.get("Content-Disposition", "")) or f"{title}.{self.format}"
+                    files = [_write_atomic(album_path, _track_name(name, artist, title),
+                                           lambda out: _copy_all(stream, out))]
+            except Exception as exc:
+                if isinstance(exc, DirectDownloadError):
+                    raise
+                raise DirectDownloadError(f"download interrupted: {exc}") from exc
+            finally:
+                resp.close()
+        finally:
+            self.limiter.release(lease)
+        write_manifest(album_path, _manifest_for(manifest, files))
+        return album_dir
+
+
+def _drain(stream: _Stream) -> Iterator[bytes]:
+    while True:
+        chunk = stream.read(_CHUNK)
+        if not chunk:
+            return
+        yield chunk
+
+
+def _copy_all(stream: _Stream, out: Any) -> None:
+    for chunk in _drain(stream):
+        out.write(chunk)
+
+
+def _filename(content_disposition: str) -> str:
+    match = re.search(r"filename\*=UTF-8''([^;]+)|filename=\"?([^\";]+)\"?", content_disposition)
+    if not match:
+        return ""
+    return unquote(match.group(1)) if match.group(1) else match.group(2)
+
+
+def _manifest_for(manifest: AlbumManifest, files: List[Path]) -> AlbumManifest:
+    manifest.complete = True
+    audio = sorted(path for path in files if path.suffix.lower() in AUDIO_EXTS)
+    for index, path in enumerate(audio, start=1):
+        match = re.match(r"^(\d+) - (.*)$", path.stem)
+        number, name = (int(match.group(1)), match.group(2)) if match else (index, path.stem)
+        manifest.tracks.append(
+            TrackEntry(index=index, number=number, title=name, duration=None, file=path.name, size=path.stat().st_size)
+        )
+    return manifest
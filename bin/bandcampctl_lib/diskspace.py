@@ -0,0 +1,222 @@
+"""Disk admission control: do not start albums there is no room for.
+
+Two filesystems fill up while an album downloads: the scratch directory
+(raw streams plus the converted tracks) and the music library it is
+published into, often the same one. Before a download the engine
+estimates the album from its extractor metadata:
+
+    bytes = sum(track duration) x bitrate of the format it ends up in
+
+and reserves that much in cache/disk.json (flock-guarded, like the rate
+limiter's state), so albums running in parallel do not each count the same
+free space. A reservation shrinks as the album's scratch directory fills
+and is dropped when the job leaves in_progress; reservations of a process
+that died are dropped on the next look.
+
+When free space minus outstanding reservations would fall below
+BANDCAMPSYNC_DISK_MIN_FREE_MB (default 1024) on either filesystem, the
+reservation is refused: the job goes back to pending without counting as an
+attempt, and the worker stops claiming jobs (state "disk_low", shown by
+`bandcampctl status` and /api/status) until there is room again for the
+album it had to put back. An album that would not fit even with nothing
+else reserved is not waited for: that job fails instead.
+"""
+from __future__ import annotations
+
+import os
+import time
+from pathlib import Path
+from typing import Any, ContextManager, Dict, List, Optional, Sequence, Tuple
+
+from .config import Paths, Settings
+from .fs import locked_json, pid_alive
+
+OK = "ok"
+DISK_LOW = "disk_low"
+
+# Exit status of `download --fetch-only` when the album did not fit
+# (EX_TEMPFAIL): the worker puts the job back instead of failing it.
+DISK_LOW_EXIT = 75
+
+# Roughly what each format takes per second of audio; FLAC is what the
+# yt-dlp path converts to, so it is also the default.
+_KBPS = {
+    "flac": 1000,
+    "alac": 1000,
+    "wav": 1411,
+    "aiff-lossless": 1411,
+    "mp3-320": 320,
+    "mp3-v0": 260,
+    "aac-hi": 256,
+    "vorbis": 192,
+}
+# The raw stream sits in scratch next to its conversion until publishing.
+_RAW_KBPS = 320
+# A track whose duration the extractor did not report, and an album whose
+# track list is not known yet (a purchase fetched before any probe).
+_UNKNOWN_TRACK_S = 300.0
+_UNKNOWN_ALBUM_S = 3600.0
+
+
+def estimate_bytes(durations: Optional[Sequence[Optional[float]]], fmt: str = "flac", raw: bool = False) -> int:
+    """Size of an album from its tracks' durations (None: not known yet)."""
+    if durations is None:
+        seconds = _UNKNOWN_ALBUM_S
+    else:
+        seconds = sum(d if d else _UNKNOWN_TRACK_S for d in durations)
+    kbps = _KBPS.get(fmt, _KBPS["flac"]) + (_RAW_KBPS if raw else 0)
+    return int(seconds * kbps * 1000 / 8)
+
+
+def _existing(path: Path) -> Path:
+    # statvfs needs a path that exists; the library may not have been created yet.
+    path = Path(path)
+    while not path.exists() and path != path.parent:
+        path = path.parent
+    return path
+
+
+def _du(path: Path) -> int:
+    total = 0
+    for root, _dirs, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+class DiskBudget:
+    def __init__(self, paths: Paths, settings: Settings, owner: Optional[int] = None) -> None:
+        self.state_path = paths.disk_state
+        self.roots = {"music": paths.music, "scratch": settings.scratch_dir}
+        self.min_free = settings.disk_min_free_bytes
+        # Reservations die with this process (the worker, also for the
+        # download_one.sh it runs).
+        self.owner = owner or os.getpid()
+
+    def _state(self) -> ContextManager[Dict[str, Any]]:
+        return locked_json(self.state_path)
+
+    def _devices(self) -> Dict[str, Tuple[int, Path]]:
+        # role -> (st_dev, path to statvfs)
+        devices = {}
+        for role, root in self.roots.items():
+            path = _existing(root)
+            devices[role] = (os.stat(path).st_dev, path)
+        return devices
+
+    def _outstanding(self, state: Dict[str, Any]) -> Dict[str, int]:
+        """Reserved bytes not yet written, per role; drops dead owners' reservations."""
+        reservations = state.setdefault("reservations", {})
+        reserved = {role: 0 for role in self.roots}
+        for job_id, entry in list(reservations.items()):
+            if not pid_alive(int(entry.get("pid", 0))):
+                del reservations[job_id]
+                continue
+            need = entry.get("bytes", {})
+            reserved["scratch"] += max(0, int(need.get("scratch", 0)) - _du(self.roots["scratch"] / job_id))
+            reserved["music"] += int(need.get("music", 0))
+        if not pid_alive(int(state.get("paused", {}).get("pid", 0))):
+            state.pop("paused", None)
+        return reserved
+
+    def _filesystems(self, reserved: Dict[str, int], extra: Dict[str, int]) -> List[Dict[str, Any]]:
+        # One row per filesystem; scratch and library often share one.
+        rows: Dict[int, Dict[str, Any]] = {}
+        for role, (dev, path) in self._devices().items():
+            row = rows.get(dev)
+            if row is None:
+                st = os.statvfs(path)
+                row = rows[dev] = {"roles": [], "path": str(path), "free_bytes": st.f_bavail * st.f_frsize,
+                                   "reserved_bytes": 0, "needed_bytes": 0}
+            row["roles"].append(role)
+            row["reserved_bytes"] += reserved.get(role, 0)
+            row["needed_bytes"] += extra.get(role, 0)
+        return list(rows.values())
+
+    def _low(self, rows: List[Dict[str, Any]]) -> List[str]:
+        low = []
+        for row in rows:
+            if row["free_bytes"] - row["reserved_bytes"] - row["needed_bytes"] >= self.min_free:
+                continue
+            detail = f"{'+'.join(row['roles'])}: {row['free_bytes'] // 2**20} MB free"
+            if row["reserved_bytes"]:
+                detail += f", {row['reserved_bytes'] // 2**20} MB reserved"
+            if row["needed_bytes"]:
+                detail += f", {row['needed_bytes'] // 2**20} MB needed"
+            low.append(f"{detail} (minimum {self.min_free // 2**20} MB)")
+        return low
+
+    def _need(self, album_bytes: int, scratch_bytes: int) -> Dict[str, int]:
+        devices = self._devices()
+        if devices["music"][0] == devices["scratch"][0]:
+            # Published with a rename: the album never exists twice.
+            return {"scratch": scratch_bytes}
+        return {"scratch": scratch_bytes, "music": album_bytes}
+
+    def admit(self) -> Optional[str]:
+        """None when a new job may be claimed, else why not (disk_low)."""
+        with self._state() as state:
+            reserved = self._outstanding(state)
+            # While paused, wait for room for the album that was put back.
+            paused = state.get("paused")
+            rows = self._filesystems(reserved, paused.get("needed", {}) if paused else {})
+            low = self._low(rows)
+            if not low:
+                state.pop("paused", None)
+                return None
+            if paused:
+                paused["detail"] = "; ".join(low)
+            else:
+                state["paused"] = {"pid": self.owner, "since": time.time(), "needed": {}, "detail": "; ".join(low)}
+            return "; ".join(low)
+
+    def _missing(self, job_id: str, need: Dict[str, int]) -> Dict[str, int]:
+        # A resumed album already has part of its share in scratch.
+        return dict(need, scratch=max(0, need["scratch"] - _du(self.roots["scratch"] / job_id)))
+
+    def oversize(self, job_id: str, album_bytes: int, scratch_bytes: int) -> Optional[str]:
+        """Why the album cannot fit even with no other reservations, else None.
+
+        Waiting for such an album would pause the queue for good."""
+        missing = self._missing(job_id, self._need(album_bytes, scratch_bytes))
+        low = self._low(self._filesystems({}, missing))
+        return "; ".join(low) if low else None
+
+    def reserve(self, job_id: str, album_bytes: int, scratch_bytes: int) -> Optional[str]:
+        """Reserve room for one album; None on success, else why not (disk_low)."""
+        need = self._need(album_bytes, scratch_bytes)
+        missing = self._missing(job_id, need)
+        with self._state() as state:
+            reservations = state.setdefault("reservations", {})
+            reservations.pop(job_id, None)
+            reserved = self._outstanding(state)
+            low = self._low(self._filesystems(reserved, missing))
+            if low:
+                state["paused"] = {"pid": self.owner, "since": time.time(), "job_id": job_id,
+                                   "needed": missing, "detail": "; ".join(low)}
+                return "; ".join(low)
+            reservations[job_id] = {"pid": self.owner, "at": time.time(), "bytes": need}
+            return None
+
+    def release(self, job_id: str) -> None:
+        with self._state() as state:
+            state.setdefault("reservations", {}).pop(job_id, None)
+
+    def status(self) -> Dict[str, Any]:
+        """For `bandcampctl status` and /api/status; read-only apart from pruning."""
+        with self._state() as state:
+            reserved = self._outstanding(state)
+            rows = self._filesystems(reserved, {})
+            paused = state.get("paused")
+            live = self._low(rows)
+            return {
+                "state": DISK_LOW if paused or live else OK,
+                "since": paused.get("since") if paused else None,
+                "detail": paused.get("detail") if paused else "; ".join(live),
+                "min_free_bytes": self.min_free,
+                "reservations": len(state.get("reservations", {})),
+                "filesystems": rows,
+            }
@@ -0,0 +1,692 @@
+"""Track-level album download (what download_one.sh runs).
+
+Instead of "album directory exists -> skip, else fetch everything":
+
+1. probe the release once with `yt-dlp -J` for its track list (position,
+   track number, title, duration) and the file name each track lands under,
+   or reuse an earlier probe from the info cache (infocache.py),
+2. check which tracks are already on disk with a plausible size and, when
+   ffprobe is available, duration,
+3. fetch only the missing positions, as the raw stream, into a per-job
+   scratch directory (BANDCAMPSYNC_SCRATCH_DIR, default
+   ~/BandcampSync/cache/scratch): several tracks at once straight from
+   their probed stream URLs (streams.py), the rest with yt-dlp
+   `--playlist-items`; and the album's cover once, through the artwork
+   cache (artwork.py),
+4. post-process: convert each raw track to FLAC, tag it and embed the
+   cover with ffmpeg into the album's staging directory in scratch, and
+   put the cover next to the tracks as cover.jpg,
+5. write the album manifest (manifest.py), before the fetch as incomplete
+   and after post-processing with what is actually there, and publish the
+   finished album into the library in one rename (publish.py).
+
+Nothing is written under ~/Music/Bandcamp before step 5: an interrupted
+album stays in scratch, where the next attempt picks it up.
+
+Steps 1-3 are the network stage (fetch_job), step 4-5 the CPU stage
+(postprocess). `bandcampctl download` runs both back to back; the worker
+runs the network stage in its download slots and hands the result (a
+handoff.json in the scratch directory) to a separate pool of ffmpeg
+processes, so downloads and conversions overlap. There the probe and fetch
+go through the slot's embedded yt-dlp (ytdlp.py) instead of two programs.
+
+Purchases whose download page is known (collection.json "redownload_url")
+skip all of that and fetch the original files directly (direct.py), in
+BANDCAMPSYNC_FORMAT (default flac) with no transcode; yt-dlp remains the
+fallback when that fails.
+
+An album that is still missing tracks afterwards exits non-zero, so the job
+goes through the normal failure/backoff path and the next attempt resumes.
+In the worker, room for the album is reserved before anything is fetched
+(diskspace.py); when there is none the job exits with DISK_LOW_EXIT.
+"""
+from __future__ import annotations
+
+import glob
+import json
+import os
+import shutil
+import subprocess
+import sys
+import threading
+from concurrent.futures import Executor
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import IO, Dict, List, Optional, Sequence, Tuple
+
+from .artwork import ArtworkCache, ArtworkError, install_cover
+from .config import Paths, Settings
+from .direct import DirectDownloadError, DirectDownloader
+from .diskspace import DISK_LOW, DISK_LOW_EXIT, DiskBudget, estimate_bytes
+from .fs import job_id_for_url, read_collection, read_job_url
+from .infocache import InfoCache, expired_positions, info_entries, replace_entry
+from .library import AUDIO_EXTS, LibraryIndex
+from .manifest import AlbumManifest, TrackEntry, read_manifest, write_manifest
+from .publish import publish_album
+from .ratelimit import RateLimiter
+from .streams import StreamFetcher
+from .ytdlp import YtDlpEngine
+
+# Handoff states: nothing left to do (already present / fetched directly),
+# or raw tracks waiting in scratch for the post-processing stage.
+DONE = "done"
+FETCHED = "fetched"
+
+HANDOFF_NAME = "handoff.json"
+INFO_NAME = "info.json"
+# Under a job's scratch directory: the album being built, and a purchase
+# being unpacked.
+STAGE_NAME = "album"
+DIRECT_NAME = "direct"
+_NOT_AUDIO = {".part", ".ytdl", ".json", ".jpg", ".jpeg", ".png", ".webp"}
+
+OUTPUT_TEMPLATE = "%(artist)s/%(album)s/%(track_number)02d - %(title)s.%(ext)s"
+
+# Anything under ~32 kbit/s for its stated duration is a cut-off download.
+_MIN_BYTES_PER_S = 4000
+_MIN_BYTES = 64 * 1024
+# Container durations differ slightly from Bandcamp's; allow that, not a gap.
+_DURATION_SLACK_S = 2.0
+_DURATION_RATIO = 0.95
+
+
+class DownloadError(Exception):
+    pass
+
+
+class DiskLowError(DownloadError):
+    pass
+
+
+@dataclass(frozen=True)
+class ExpectedTrack:
+    index: int
+    number: int
+    title: str
+    duration: Optional[float]
+    stem: str
+    track_id: str = ""
+
+
+@dataclass(frozen=True)
+class Release:
+    url: str
+    artist: str
+    album: str
+    album_dir: str
+    tracks: List[ExpectedTrack]
+    cover_url: str = ""
+
+
+@dataclass
+class Handoff:
+    """What the network stage leaves for the CPU stage."""
+
+    job_id: str
+    url: str
+    status: str
+    album_dir: str = ""
+    release: Optional[Release] = None
+    # Track index -> raw audio file in scratch; the album cover in the artwork cache.
+    raw: Dict[int, str] = field(default_factory=dict)
+    cover: str = ""
+
+    def save(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.tmp")
+        tmp.write_text(json.dumps(asdict(self)), encoding="utf-8")
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "Handoff":
+        data = json.loads(path.read_text(encoding="utf-8"))
+        release = data.pop("release")
+        if release is not None:
+            tracks = [ExpectedTrack(**track) for track in release.pop("tracks")]
+            release = Release(tracks=tracks, **release)
+        raw = {int(k): v for k, v in data.pop("raw").items()}
+        return cls(release=release, raw=raw, **data)
+
+
+def scratch_for(settings: Settings, job_id: str) -> Path:
+    return settings.scratch_dir / job_id
+
+
+def stage_for(settings: Settings, job_id: str) -> Path:
+    return scratch_for(settings, job_id) / STAGE_NAME
+
+
+def _yt_dlp_base(cookies: Path, sleep_requests: Optional[str]) -> List[str]:
+    cmd = ["yt-dlp", "--cookies", str(cookies)]
+    if sleep_requests:
+        cmd += ["--sleep-requests", sleep_requests]
+    return cmd
+
+
+def parse_release(url: str, info: Dict, dest: Path) -> Release:
+    """Expected tracks from `yt-dlp -J` output (an album playlist or one track)."""
+    entries = [entry for entry in (info.get("entries") or [info]) if entry]
+    if not entries:
+        raise DownloadError(f"ERROR: no tracks found for {url}")
+    tracks: List[ExpectedTrack] = []
+    album_dir = ""
+    for position, entry in enumerate(entries, start=1):
+        filename = entry.get("filename") or entry.get("_filename")
+        if not filename:
+            raise DownloadError(f"ERROR: yt-dlp did not report a file name for track {position}")
+        path = Path(filename)
+        try:
+            rel = path.relative_to(dest)
+        except ValueError:
+            rel = Path(*path.parts[-3:])
+        album_dir = album_dir or str(rel.parent)
+        duration = entry.get("duration")
+        tracks.append(
+            ExpectedTrack(
+                index=position,
+                number=int(entry.get("track_number") or position),
+                title=entry.get("track") or entry.get("title") or "",
+                duration=float(duration) if duration else None,
+                stem=path.stem,
+                track_id=str(entry.get("id") or position),
+            )
+        )
+    first = entries[0]
+    return Release(
+        url=url,
+        artist=first.get("artist") or first.get("uploader") or "",
+        album=first.get("album") or info.get("title") or "",
+        album_dir=album_dir,
+        tracks=tracks,
+        cover_url=first.get("thumbnail") or info.get("thumbnail") or "",
+    )
+
+
+def probe_info(url: str, dest: Path, cookies: Path, sleep_requests: Optional[str] = None,
+               engine: Optional[YtDlpEngine] = None) -> Dict:
+    """`yt-dlp -J` for url, with file names under dest."""
+    if engine is not None:
+        info = engine.probe(url, str(dest / OUTPUT_TEMPLATE), sleep_requests)
+        if info is None:
+            raise DownloadError(f"ERROR: yt-dlp probe failed for {url}")
+        return info
+    # -J leaves out the file names; -j prints one track per line with them,
+    # so the album is put back together here.
+    # --format as in fetch_raw, so each track's "url" is the stream that gets fetched.
+    cmd = _yt_dlp_base(cookies, sleep_requests) + [
+        "-j", "--format", "bestaudio/best", "--output", str(dest / OUTPUT_TEMPLATE), url,
+    ]
+    proc = subprocess.run(cmd, stdout=subprocess.PIPE, text=True, errors="replace")
+    if proc.returncode != 0:
+        raise DownloadError(f"ERROR: yt-dlp probe failed rc={proc.returncode} for {url}")
+    try:
+        tracks = [json.loads(line) for line in proc.stdout.splitlines() if line.strip()]
+    except ValueError as exc:
+        raise DownloadError(f"ERROR: could not parse yt-dlp metadata for {url}: {exc}") from exc
+    if len(tracks) == 1 and not tracks[0].get("playlist_index"):
+        return tracks[0]
+    first = tracks[0] if tracks else {}
+    return {
+        "_type": "playlist",
+        "id": first.get("playlist_id"),
+        "title": first.get("playlist_title") or first.get("playlist"),
+        "webpage_url": first.get("playlist_webpage_url") or url,
+        "extractor": first.get("extractor"),
+        "extractor_key": first.get("extractor_key"),
+        "entries": tracks,
+    }
+
+
+def probe(url: str, dest: Path, cookies: Path, sleep_requests: Optional[str] = None,
+          engine: Optional[YtDlpEngine] = None) -> Release:
+    return parse_release(url, probe_info(url, dest, cookies, sleep_requests, engine), dest)
+
+
+def _refresh_expired(cache: InfoCache, url: str, info: Dict, positions: Sequence[int], dest: Path,
+                     cookies: Path, sleep_requests: Optional[str], engine: Optional[YtDlpEngine],
+                     err: IO[str]) -> None:
+    """Re-extract only the tracks whose signed stream URLs ran out."""
+    expired = expired_positions(info, positions)
+    if not expired:
+        return
+    tracks = info_entries(info)
+    refreshed = 0
+    for position in expired:
+        old = tracks[position - 1]
+        if not old.get("webpage_url"):
+            continue
+        try:
+            fresh = info_entries(probe_info(old["webpage_url"], dest, cookies, sleep_requests, engine))
+        except DownloadError as exc:
+            # yt-dlp falls back to the album page itself if the stale URL fails.
+            print(f"WARNING: could not refresh track {position}: {exc}", file=err)
+            continue
+        match = [entry for entry in fresh if entry.get("id") == old.get("id")]
+        if match:
+            replace_entry(info, position, match[0])
+            refreshed += 1
+    print(f"↻ refreshed {refreshed}/{len(expired)} expired stream URLs for {url}")
+    # The album metadata is as old as it was; only the stream URLs are new.
+    cache.put(url, info, fetched_at=cache.fetched_at(url))
+
+
+def _ffprobe_duration(path: Path) -> Optional[float]:
+    if shutil.which("ffprobe") is None:
+        return None
+    proc = subprocess.run(
+        ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", str(path)],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        text=True,
+    )
+    try:
+        return float(proc.stdout.strip())
+    except ValueError:
+        return None
+
+
+def _audio_files(album_path: Path) -> Dict[str, Path]:
+    # stem -> file; the extension depends on the audio format picked.
+    try:
+        with os.scandir(album_path) as it:
+            return {
+                os.path.splitext(e.name)[0]: album_path / e.name
+                for e in it
+                if e.is_file() and os.path.splitext(e.name)[1].lower() in AUDIO_EXTS
+            }
+    except FileNotFoundError:
+        return {}
+
+
+def track_ok(path: Path, expected: ExpectedTrack) -> bool:
+    """Plausibly the whole track: big enough, and as long as its stated duration."""
+    try:
+        size = path.stat().st_size
+    except OSError:
+        return False
+    if size < (_MIN_BYTES_PER_S * expected.duration if expected.duration else _MIN_BYTES):
+        return False
+    if expected.duration:
+        actual = _ffprobe_duration(path)
+        if actual is not None and actual < expected.duration * _DURATION_RATIO - _DURATION_SLACK_S:
+            return False
+    return True
+
+
+def check_tracks(release: Release, dest: Path, job_id: str, stage: Optional[Path] = None) -> AlbumManifest:
+    """Manifest of the release with file/size filled in for tracks that are
+    complete, in the library or (not yet published) in stage."""
+    places = [_audio_files(dest / release.album_dir)]
+    if stage is not None:
+        places.append(_audio_files(stage))
+    manifest = AlbumManifest(url=release.url, job_id=job_id, artist=release.artist, album=release.album)
+    for track in release.tracks:
+        entry = TrackEntry(index=track.index, number=track.number, title=track.title, duration=track.duration)
+        for on_disk in places:
+            path = on_disk.get(track.stem)
+            if path is not None and track_ok(path, track):
+                entry.file = path.name
+                entry.size = path.stat().st_size
+                break
+        manifest.tracks.append(entry)
+    manifest.complete = not manifest.missing()
+    return manifest
+
+
+def fetch_raw(release: Release, scratch: Path, cookies: Path, positions: Sequence[int],
+              sleep_requests: Optional[str] = None, engine: Optional[YtDlpEngine] = None,
+              info_file: Optional[Path] = None) -> int:
+    """Network only: raw audio as <track id>.<ext> in scratch (no per-track art).
+
+    With info_file (a saved probe) the album page is not fetched again.
+    """
+    scratch.mkdir(parents=True, exist_ok=True)
+    partial = len(positions) < len(release.tracks)
+    outtmpl = str(scratch / "%(id)s.%(ext)s")
+    items = positions if partial else None
+    if engine is not None:
+        if info_file is not None:
+            return engine.fetch_info(info_file, outtmpl, items, sleep_requests)
+        return engine.fetch(release.url, outtmpl, items, sleep_requests)
+    cmd = _yt_dlp_base(cookies, sleep_requests) + [
+        "--format", "bestaudio/best",
+        "--output", outtmpl,
+    ]
+    if items:
+        cmd += ["--playlist-items", ",".join(str(p) for p in items)]
+    if info_file is not None:
+        # Without --no-clean-info-json yt-dlp drops an album's "entries" on load.
+        cmd += ["--no-clean-info-json", "--load-info-json", str(info_file)]
+    else:
+        cmd += [release.url]
+    return subprocess.run(cmd).returncode
+
+
+def _scratch_audio(scratch: Path) -> Dict[str, Path]:
+    # track id -> audio; yt-dlp's .part/.ytdl leftovers, our handoff and
+    # thumbnails from older attempts are not.
+    audio: Dict[str, Path] = {}
+    try:
+        with os.scandir(scratch) as it:
+            for entry in it:
+                stem, ext = os.path.splitext(entry.name)
+                if not entry.is_file() or entry.name.startswith(".") or ext.lower() in _NOT_AUDIO:
+                    continue
+                audio[stem] = scratch / entry.name
+    except FileNotFoundError:
+        pass
+    return audio
+
+
+def album_art(paths: Paths, settings: Settings, job_id: str, cover_url: str,
+              err: Optional[IO[str]] = None) -> Optional[Path]:
+    """The album's cover from the artwork cache, fetching it on a miss."""
+    cache = ArtworkCache(paths.artwork, settings.artwork_cache_bytes)
+    if not cover_url:
+        return cache.lookup(job_id)
+    try:
+        return cache.fetch(job_id, cover_url, RateLimiter(paths.ratelimit_state, settings))
+    except ArtworkError as exc:
+        # Tracks without embedded art beat no tracks at all.
+        print(f"WARNING: no cover art for {job_id}: {exc}", file=err or sys.stderr)
+        return None
+
+
+def collection_item(paths: Paths, job_id: str) -> Optional[Dict]:
+    for item in read_collection(paths.collection):
+        if item.get("item_url") and job_id_for_url(item["item_url"]) == job_id:
+            return item
+    return None
+
+
+def publish(paths: Paths, stage: Path, album_dir: str, manifest: Optional[AlbumManifest] = None) -> None:
+    """Staged album -> ~/Music/Bandcamp/<album_dir>, with its final manifest."""
+    if manifest is not None:
+        write_manifest(stage, manifest)
+    try:
+        publish_album(stage, paths.music / album_dir)
+    except OSError as exc:
+        # The stage stays in scratch; the next attempt publishes it.
+        raise DownloadError(f"ERROR: could not publish {album_dir}: {exc}") from exc
+
+
+def reserve(budget: Optional[DiskBudget], job_id: str, durations: Optional[Sequence[Optional[float]]],
+            fmt: str = "flac", raw: bool = True) -> None:
+    """Reserve disk room for the album (see diskspace.py); DiskLowError if there
+    is none yet, DownloadError if there never will be."""
+    if budget is None:
+        return
+    album_bytes, scratch_bytes = estimate_bytes(durations, fmt), estimate_bytes(durations, fmt, raw=raw)
+    reason = budget.oversize(job_id, album_bytes, scratch_bytes)
+    if reason is not None:
+        raise DownloadError(f"ERROR: album {job_id} is larger than the free disk space: {reason}")
+    reason = budget.reserve(job_id, album_bytes, scratch_bytes)
+    if reason is not None:
+        raise DiskLowError(f"ERROR: {DISK_LOW}: no room for {job_id}: {reason}")
+
+
+def download_direct(paths: Paths, settings: Settings, url: str, job_id: str,
+                    err: Optional[IO[str]] = None, budget: Optional[DiskBudget] = None,
+                    info: Optional[Dict] = None) -> Optional[str]:
+    """Artist/Album fetched from the purchase download page and published, or
+    None to use yt-dlp. Raises DownloadError when it cannot be published or
+    will never fit, DiskLowError when there is no room for it yet."""
+    item = collection_item(paths, job_id)
+    if not item or not item.get("redownload_url"):
+        return None
+    # Sized from an earlier probe when there is one; the zip has no track list.
+    durations = [entry.get("duration") for entry in info_entries(info)] if info else None
+    reserve(budget, job_id, durations, settings.download_format, raw=False)
+    stage = scratch_for(settings, job_id) / DIRECT_NAME
+    # Unpacked files from an interrupted attempt are not to be trusted.
+    shutil.rmtree(stage, ignore_errors=True)
+    try:
+        album_dir = DirectDownloader(paths, settings).download(
+            url, job_id, item["redownload_url"], item.get("band_name", ""), item.get("item_title", ""), stage
+        )
+    except DirectDownloadError as exc:
+        shutil.rmtree(stage, ignore_errors=True)
+        print(f"direct download failed ({exc}); falling back to yt-dlp", file=err or sys.stderr)
+        return None
+    # Purchase zips carry their own cover.jpg; remember it for the dashboard.
+    ArtworkCache(paths.artwork, settings.artwork_cache_bytes).put_file(job_id, stage / "cover.jpg")
+    publish(paths, stage, album_dir)
+    return album_dir
+
+
+def fetch_job(paths: Paths, settings: Settings, job_path: Path, sleep_requests: Optional[str] = None,
+              engine: Optional[YtDlpEngine] = None, err: Optional[IO[str]] = None,
+              budget: Optional[DiskBudget] = None,
+              streams: Optional[StreamFetcher] = None) -> Tuple[int, Optional[Handoff]]:
+    """Network stage for one job; on success the handoff is also saved to scratch.
+
+    With an engine (the worker's), yt-dlp runs in-process instead of as two
+    programs; error lines go to `err` (default stderr) either way. With a
+    budget, the album's disk room is reserved before it is fetched. Tracks
+    are fetched in parallel through `streams` (the worker's, else one made
+    here unless BANDCAMPSYNC_TRACK_PARALLEL is 0).
+    """
+    err = err or sys.stderr
+    if not job_path.is_file():
+        print(f"ERROR: job file not found: {job_path}", file=err)
+        return 1, None
+    url = read_job_url(job_path)
+    if not url:
+        print(f"ERROR: job file is empty: {job_path}", file=err)
+        return 1, None
+    if not paths.cookies.is_file():
+        print(f"ERROR: Missing cookies at {paths.cookies}", file=err)
+        return 1, None
+    paths.music.mkdir(parents=True, exist_ok=True)
+    sleep_requests = sleep_requests or os.environ.get("BANDCAMPSYNC_SLEEP_REQUESTS") or None
+    job_id = job_id_for_url(url)
+    scratch = scratch_for(settings, job_id)
+
+    # Ask the library index first: no network, no yt-dlp startup.
+    library = LibraryIndex(paths.library_db, paths.music)
+    album_dir = library.lookup(url)
+    if album_dir:
+        print(f"✔ already have: {album_dir}")
+        return 0, _finish(scratch, Handoff(job_id, url, DONE, album_dir))
+
+    # Retries and skip checks reuse the last probe instead of the album page.
+    info_cache = InfoCache(paths.info_cache, settings.info_ttl_s, settings.info_cache_bytes)
+    info = info_cache.get(url)
+
+    try:
+        album_dir = download_direct(paths, settings, url, job_id, err, budget, info)
+    except DownloadError as exc:
+        print(str(exc), file=err)
+        return DISK_LOW_EXIT if isinstance(exc, DiskLowError) else 1, None
+    if album_dir:
+        library.record(url, album_dir)
+        print(f"✔ downloaded: {album_dir}")
+        return 0, _finish(scratch, Handoff(job_id, url, DONE, album_dir))
+
+    cached = info is not None
+    try:
+        if info is None:
+            info = probe_info(url, paths.music, paths.cookies, sleep_requests, engine)
+            info_cache.put(url, info)
+        release = parse_release(url, info, paths.music)
+    except DownloadError as exc:
+        if cached:
+            info_cache.discard(url)
+        print(str(exc), file=err)
+        return 1, None
+    album_path = paths.music / release.album_dir
+    stage = scratch / STAGE_NAME
+    by_index = {track.index: track for track in release.tracks}
+    manifest = check_tracks(release, paths.music, job_id, stage)
+    if manifest.complete:
+        if stage.is_dir():
+            # Built by an earlier attempt that did not get to publish it.
+            try:
+                publish(paths, stage, release.album_dir, manifest)
+            except DownloadError as exc:
+                print(str(exc), file=err)
+                return 1, None
+            print(f"✔ downloaded: {release.album_dir}")
+        else:
+            write_manifest(album_path, manifest)
+            print(f"✔ already have: {release.album_dir}")
+        library.record(url, release.album_dir)
+        return 0, _finish(scratch, Handoff(job_id, url, DONE, release.album_dir))
+
+    missing = manifest.missing()
+    try:
+        reserve(budget, job_id, [by_index[entry.index].duration for entry in missing])
+    except DownloadError as exc:
+        print(str(exc), file=err)
+        return DISK_LOW_EXIT if isinstance(exc, DiskLowError) else 1, None
+    previous = read_manifest(stage) or read_manifest(album_path)
+    resumed = " (resuming)" if previous is not None or len(missing) < len(manifest.tracks) else ""
+    print(f"⬇ downloading {url}: {len(missing)}/{len(manifest.tracks)} tracks{resumed}")
+    write_manifest(stage, manifest)
+    positions = [entry.index for entry in missing]
+    _refresh_expired(info_cache, url, info, positions, paths.music, paths.cookies, sleep_requests, engine, err)
+    scratch.mkdir(parents=True, exist_ok=True)
+    info_file = scratch / INFO_NAME
+    info_file.write_text(json.dumps(info, ensure_ascii=False), encoding="utf-8")
+    rest = list(positions)
+    own_streams = streams is None and settings.track_parallel > 0
+    if own_streams:
+        limiter = RateLimiter(paths.ratelimit_state, settings)
+        streams = StreamFetcher(limiter, min(settings.track_parallel, settings.conn_cdn))
+    if streams is not None:
+        try:
+            done = set(streams.fetch(info_entries(info), positions, scratch, err))
+        finally:
+            if own_streams:
+                streams.close()
+        rest = [p for p in positions if p not in done]
+    returncode = 0
+    if rest:
+        returncode = fetch_raw(release, scratch, paths.cookies, rest, sleep_requests, engine, info_file)
+
+    audio = _scratch_audio(scratch)
+    handoff = Handoff(job_id, url, FETCHED, release.album_dir, release)
+    for entry in missing:
+        track_id = by_index[entry.index].track_id
+        if track_id in audio:
+            handoff.raw[entry.index] = str(audio[track_id])
+    if len(handoff.raw) < len(missing):
+        if cached:
+            # Maybe the cached info itself is at fault; the next attempt probes afresh.
+            info_cache.discard(url)
+        numbers = ",".join(str(entry.number) for entry in missing if entry.index not in handoff.raw)
+        print(f"ERROR: incomplete album {release.album_dir}: tracks {numbers} not fetched", file=err)
+        return returncode or 1, None
+    cover = album_art(paths, settings, job_id, release.cover_url, err)
+    handoff.cover = str(cover) if cover else ""
+    handoff.save(scratch / HANDOFF_NAME)
+    return 0, handoff
+
+
+def _finish(scratch: Path, handoff: Handoff) -> Handoff:
+    # Nothing to post-process; raw files from an earlier attempt are moot now.
+    shutil.rmtree(scratch, ignore_errors=True)
+    return handoff
+
+
+def _ffmpeg_convert(raw: Path, cover: Optional[Path], dest: Path, tags: Dict[str, str]) -> Optional[str]:
+    """raw -> dest (FLAC, tagged, cover attached); an error line on failure."""
+    if shutil.which("ffmpeg") is None:
+        return "ERROR: ffmpeg not found (needed to convert downloaded tracks)"
+    part = dest.with_name(f".{dest.name}.part")
+    cmd = ["ffmpeg", "-nostdin", "-y", "-v", "error", "-i", str(raw)]
+    if cover is not None:
+        cmd += ["-i", str(cover), "-map", "0:a", "-map", "1:v", "-c:v", "copy",
+                "-disposition:v", "attached_pic", "-metadata:s:v", "comment=Cover (front)"]
+    else:
+        cmd += ["-map", "0:a"]
+    # A lossless source is copied as is; anything else becomes FLAC.
+    cmd += ["-c:a", "copy" if raw.suffix.lower() == ".flac" else "flac"]
+    for key, value in tags.items():
+        cmd += ["-metadata", f"{key}={value}"]
+    cmd += ["-f", "flac", str(part)]
+    proc = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, errors="replace")
+    if proc.returncode != 0:
+        try:
+            part.unlink()
+        except OSError:
+            pass
+        detail = (proc.stderr.strip().splitlines() or [f"rc={proc.returncode}"])[-1]
+        return f"ERROR: ffmpeg failed on {raw.name}: {detail}"
+    # Replaces a truncated copy from an earlier attempt in one step.
+    for stale in dest.parent.glob(f"{glob.escape(dest.stem)}.*"):
+        if stale.suffix.lower() in AUDIO_EXTS and stale != dest:
+            stale.unlink()
+    os.replace(part, dest)
+    return None
+
+
+def postprocess(
+    paths: Paths,
+    settings: Settings,
+    handoff: Handoff,
+    executor: Optional[Executor] = None,
+    cancel: Optional[threading.Event] = None,
+) -> Tuple[int, List[str]]:
+    """CPU stage: convert, tag and embed art for the fetched tracks in the
+    staging directory, then publish the album. Returns (returncode, error lines).
+
+    With an executor the tracks are converted in parallel (one ffmpeg
+    process per task); `cancel` stops before tracks not yet started.
+    """
+    release = handoff.release
+    if handoff.status != FETCHED or release is None:
+        return 0, []
+    stage = stage_for(settings, handoff.job_id)
+    stage.mkdir(parents=True, exist_ok=True)
+    by_index = {track.index: track for track in release.tracks}
+    total = str(len(release.tracks))
+    # One image for the whole album; it may have been evicted since the fetch.
+    cover: Optional[Path] = Path(handoff.cover) if handoff.cover else None
+    if cover is not None and not cover.is_file():
+        cover = album_art(paths, settings, handoff.job_id, release.cover_url)
+
+    def convert(index: int) -> Optional[str]:
+        if cancel is not None and cancel.is_set():
+            return "ERROR: post-processing cancelled"
+        track = by_index[index]
+        tags = {
+            "title": track.title,
+            "artist": release.artist,
+            "album_artist": release.artist,
+            "album": release.album,
+            "track": f"{track.number}/{total}",
+        }
+        return _ffmpeg_convert(Path(handoff.raw[index]), cover, stage / f"{track.stem}.flac", tags)
+
+    indexes = sorted(handoff.raw)
+    results = list(executor.map(convert, indexes)) if executor is not None else [convert(i) for i in indexes]
+    errors = [error for error in results if error]
+    if cover is not None:
+        install_cover(cover, stage)
+
+    manifest = check_tracks(release, paths.music, handoff.job_id, stage)
+    if errors or not manifest.complete:
+        write_manifest(stage, manifest)
+        numbers = ",".join(str(entry.number) for entry in manifest.missing())
+        errors.append(f"ERROR: incomplete album {release.album_dir}: missing tracks {numbers}")
+        return 1, errors
+    try:
+        publish(paths, stage, release.album_dir, manifest)
+    except DownloadError as exc:
+        return 1, [str(exc)]
+    LibraryIndex(paths.library_db, paths.music).record(handoff.url, release.album_dir)
+    shutil.rmtree(scratch_for(settings, handoff.job_id), ignore_errors=True)
+    print(f"✔ downloaded: {release.album_dir}")
+    return 0, []
+
+
+def download_job(paths: Paths, settings: Settings, job_path: Path, sleep_requests: Optional[str] = None) -> int:
+    """Both stages back to back; 0 when every track is on disk."""
+    returncode, handoff = fetch_job(paths, settings, job_path, sleep_requests)
+    if returncode != 0 or handoff is None:
+        return returncode
+    returncode, errors = postprocess(paths, settings, handoff)
+    for line in errors:
+        print(line, file=sys.stderr)
+    return returncode
@@ -0,0 +1,106 @@
+"""Batch enqueuer: owned URLs -> pending/*.job.
+
+In-process replacement for the per-URL sed/cut/sha1sum loop in
+enqueue_owned.sh. Deduplicates against every queue state, not just pending,
+so albums that are in progress, done or failed are not re-enqueued on every
+reconcile.
+
+Jobs are stamped with a priority class (priority.py). collection.json lists
+purchases newest first (the incremental refresh merges new ones in at the
+top), so the unqueued items at its head, above the first one some queue
+already knows, are new purchases and jump ahead of the backfill and of
+retries. Everything else, including the whole very first import, is
+backfill.
+"""
+from __future__ import annotations
+
+import os
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set
+
+from .config import Paths
+from .fs import clean_url, ensure_dirs, job_id_for_url, read_collection, write_job_file
+from .logs import append_entries
+from .priority import BACKFILL, NEW, stamp
+
+
+@dataclass(frozen=True)
+class EnqueueResult:
+    total: int
+    enqueued: List[str]
+    already_queued: int
+
+
+def known_job_ids(paths: Paths) -> Set[str]:
+    # One scandir per queue directory; names only, job files are never opened.
+    known: Set[str] = set()
+    for queue_path in paths.queues().values():
+        try:
+            with os.scandir(queue_path) as it:
+                known.update(e.name[: -len(".job")] for e in it if e.name.endswith(".job"))
+        except FileNotFoundError:
+            continue
+    return known
+
+
+def read_owned_urls(path: Path) -> List[str]:
+    try:
+        lines = path.read_text(encoding="utf-8", errors="replace").splitlines()
+    except OSError:
+        return []
+    return [url for url in (clean_url(line) for line in lines) if url]
+
+
+def collection_head(collection: Path, known: Set[str]) -> Set[str]:
+    """Job ids of the unqueued items at the top of collection.json."""
+    head: Set[str] = set()
+    for item in read_collection(collection):
+        url = clean_url(str(item.get("item_url") or ""))
+        if not url:
+            continue
+        job_id = job_id_for_url(url)
+        if job_id in known:
+            break
+        head.add(job_id)
+    return head
+
+
+def enqueue_urls(paths: Paths, urls: Iterable[str], head: Optional[Set[str]] = None) -> EnqueueResult:
+    """Enqueue the URLs no queue knows; those whose job id is in `head` as new purchases."""
+    ensure_dirs([paths.pending, paths.logs])
+    known = known_job_ids(paths)
+    # Nothing queued yet: the first import is all backfill.
+    head = head if known else set()
+
+    new_jobs: Dict[str, str] = {}
+    total = 0
+    already = 0
+    for url in urls:
+        total += 1
+        job_id = job_id_for_url(url)
+        if job_id in known or job_id in new_jobs:
+            already += 1
+            continue
+        new_jobs[job_id] = url
+
+    # Consecutive microsecond stamps keep the batch in list order within its class.
+    now = time.time()
+    fresh = 0
+    for i, (job_id, url) in enumerate(new_jobs.items()):
+        kind = NEW if head and job_id in head else BACKFILL
+        fresh += kind == NEW
+        write_job_file(paths.pending / f"{job_id}.job", url, stamp({}, kind, now + i / 1e6))
+
+    rows = [("enqueue_job", job_id, url) for job_id, url in new_jobs.items()]
+    rows.append(
+        ("enqueue_summary", "-", f"total={total} enqueued={len(new_jobs)} already_queued={already} "
+                                 f"new={fresh} backfill={len(new_jobs) - fresh}")
+    )
+    append_entries(paths.enqueue_log, rows)
+    return EnqueueResult(total=total, enqueued=list(new_jobs), already_queued=already)
+
+
+def enqueue_owned(paths: Paths, owned: Path) -> EnqueueResult:
+    return enqueue_urls(paths, read_owned_urls(owned), collection_head(paths.collection, known_job_ids(paths)))
@@ -0,0 +1,68 @@
+"""Classify a failed download from its exit status and stderr.
+
+    transient  timeouts, 429, 5xx, dropped connections -> failed/ (backoff + retry)
+    auth       missing/expired cookies, login required  -> auth_blocked/
+    permanent  404, removed or geo-blocked releases     -> dead/
+
+Auth-blocked jobs are retried once the cookies file changes; dead jobs only
+by hand (`bandcampctl retry JOB_ID`). Anything not recognised is treated as
+transient, so an unknown error costs a few backed-off retries, not the album.
+"""
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from typing import Iterable, List, Tuple
+
+TRANSIENT = "transient"
+AUTH = "auth"
+PERMANENT = "permanent"
+
+# First match wins; auth before permanent so a login wall on a 403 reads as
+# auth. The auth and permanent phrases are the ones we and yt-dlp actually
+# print (raise_login_required and its --cookies hint; removed or blocked
+# releases), not any mention of "login" or "not available": a format that is
+# not available or a missing ffmpeg is worth a retry, not the dead queue.
+_RULES: List[Tuple[str, re.Pattern]] = [
+    (AUTH, re.compile(r"^ERROR: Missing cookies at |cookies (?:have expired|are no longer valid)|"
+                      r"only available for registered users|(?:requires|needs) (?:a )?login|login required|"
+                      r"Sign in to confirm|Use --cookies|--cookies-from-browser|HTTP Error 401", re.I)),
+    (TRANSIENT, re.compile(r"HTTP Error (?:429|5\d\d)|Too Many Requests|timed? ?out|Connection (?:reset|refused|aborted)|"
+                           r"Temporary failure|Name or service not known|Remote end closed|IncompleteRead", re.I)),
+    (PERMANENT, re.compile(r"HTTP Error (?:404|410)|Unsupported URL|This (?:album|track) is (?:no longer|not) available|"
+                           r"Video unavailable|geo.?restrict|available (?:in|from) your (?:country|location|region)|"
+                           r"job file (?:not found|is empty)", re.I)),
+]
+
+
+_THROTTLED = re.compile(r"HTTP Error (?:429|503)|Too Many Requests", re.I)
+
+
+@dataclass(frozen=True)
+class Failure:
+    kind: str
+    reason: str
+
+
+def _error_lines(stderr: Iterable[str]) -> List[str]:
+    lines = [line.strip() for line in stderr if line.strip()]
+    # yt-dlp prints the actual cause on ERROR: lines; prefer those.
+    errors = [line for line in lines if line.startswith("ERROR")]
+    return errors or lines
+
+
+def classify(returncode: int, stderr: Iterable[str]) -> Failure:
+    lines = _error_lines(stderr)
+    if returncode < 0:
+        return Failure(TRANSIENT, f"killed by signal {-returncode}")
+    for kind, pattern in _RULES:
+        for line in reversed(lines):
+            if pattern.search(line):
+                return Failure(kind, line)
+    reason = lines[-1] if lines else f"exited rc={returncode}"
+    return Failure(TRANSIENT, reason)
+
+
+def throttled(stderr: Iterable[str]) -> bool:
+    """True if the server pushed back (429/503) anywhere in the output."""
+    return any(_THROTTLED.search(line) for line in stderr)
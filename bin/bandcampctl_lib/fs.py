@@ -1,10 +1,16 @@
 from __future__ import annotations
 
+import fcntl
+import hashlib
+import json
 import os
 import shutil
+from contextlib import contextmanager
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Iterable, List, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .logs import tail_lines
 
 
 @dataclass(frozen=True)
@@ -21,6 +27,63 @@ def ensure_dirs(paths: Iterable[Path]) -> None:
         path.mkdir(parents=True, exist_ok=True)
 
 
+def pid_alive(pid: int) -> bool:
+    """Whether a process on this host exists (one we may not signal counts)."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+@contextmanager
+def flocked(path: Path) -> Iterator[int]:
+    """Hold an exclusive flock on `path` (created if missing); yields its fd."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(str(path), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield fd
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def locked_json(path: Path) -> Iterator[Dict[str, Any]]:
+    """Read-modify-write a JSON state file under flock.
+
+    Yields the decoded object ({} if the file is missing or unreadable) and
+    writes it back when the block exits normally."""
+    with flocked(path) as fd:
+        raw = b""
+        while True:
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                break
+            raw += chunk
+        try:
+            state = json.loads(raw) if raw else {}
+        except ValueError:
+            state = {}
+        yield state
+        data = json.dumps(state, sort_keys=True).encode("utf-8")
+        os.lseek(fd, 0, os.SEEK_SET)
+        os.ftruncate(fd, 0)
+        os.write(fd, data)
+
+
+def clean_url(url: str) -> str:
+    # Mirrors the shell stages: sed 's/&quot;//g' | cut -d',' -f1
+    return url.replace("&quot;", "").split(",")[0]
+
+
+def job_id_for_url(url: str) -> str:
+    # Deterministic job id: sha1 of the cleaned URL, same as enqueue_owned.sh.
+    return hashlib.sha1(clean_url(url).encode("utf-8")).hexdigest()
+
+
 def read_job_url(job_path: Path) -> str:
     try:
         line = job_path.read_text(encoding="utf-8").splitlines()[0].strip()
@@ -32,6 +95,37 @@ def read_job_url(job_path: Path) -> str:
     return line
 
 
+def read_job_file(job_path: Path) -> Tuple[str, Dict[str, str]]:
+    """(url, metadata) from a job file.
+
+    Line 1 is the URL (raw or URL=...), which is all the shell stages read.
+    Any further KEY=value lines are retry/scheduling metadata.
+    """
+    try:
+        lines = job_path.read_text(encoding="utf-8").splitlines()
+    except Exception:
+        return "", {}
+    if not lines:
+        return "", {}
+    first = lines[0].strip()
+    url = first.split("=", 1)[1].strip() if first.startswith("URL=") else first
+    meta: Dict[str, str] = {}
+    for line in lines[1:]:
+        key, sep, value = line.partition("=")
+        if sep and key.strip():
+            meta[key.strip()] = value.strip()
+    return url, meta
+
+
+def write_job_file(job_path: Path, url: str, meta: Optional[Dict[str, str]] = None) -> None:
+    # Write under a dot-name and rename into place so the worker (and the
+    # systemd path unit) never see a half-written .job file.
+    lines = [url] + [f"{key}={value}" for key, value in (meta or {}).items()]
+    tmp = job_path.with_name(f".{job_path.stem}.tmp")
+    tmp.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    os.replace(tmp, job_path)
+
+
 def list_jobs(queue_path: Path, queue_name: str) -> List[Job]:
     jobs: List[Job] = []
     if not queue_path.exists() or not queue_path.is_dir():
@@ -55,14 +149,7 @@ def move_job(job: Job, dest_queue: Path) -> Path:
 
 
 def read_tail(path: Path, lines: int = 50) -> List[str]:
-    if not path.exists():
-        return []
-    try:
-        data = path.read_text(encoding="utf-8", errors="replace")
-    except Exception:
-        return []
-    content = data.splitlines()
-    return content[-lines:]
+    return tail_lines(path, limit=lines)
 
 
 def file_mtime(path: Path) -> Optional[float]:
@@ -81,3 +168,11 @@ def read_job_contents(path: Path) -> str:
         return path.read_text(encoding="utf-8", errors="replace")
     except Exception:
         return ""
+
+
+def read_collection(path: Path) -> List[Dict[str, Any]]:
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except Exception:
+        return []
+    return [item for item in data if isinstance(item, dict)] if isinstance(data, list) else []
@@ -0,0 +1,159 @@
+"""Cache of extractor results (`yt-dlp -J` output), keyed by album URL.
+
+    ~/BandcampSync/cache/info/<job_id>.json.gz
+        {"url": ..., "fetched_at": 1767225600.0, "info": {...}}
+
+A retry, a resume or a skip check of an album probed before reads its
+track list from here instead of fetching and parsing the album page again,
+and the fetch itself is fed the cached info (yt-dlp --load-info-json).
+Entries older than BANDCAMPSYNC_INFO_TTL_DAYS (default 7) are refetched;
+the cache is capped at BANDCAMPSYNC_INFO_CACHE_MB (default 256) and drops
+the least recently used entries first (a hit bumps the file's mtime).
+
+The stream URLs inside are signed and expire long before the metadata goes
+stale. expired_positions() reads the expiry Bandcamp puts in them (the `ts`
+parameter, or the time in front of `token`), so the caller can refresh just
+those tracks from their own pages and keep the rest of the album's info.
+"""
+from __future__ import annotations
+
+import gzip
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from .fs import job_id_for_url
+
+# A URL that expires within this margin counts as expired: a fetch can
+# queue behind the rate limiter for a while before it starts.
+_EXPIRY_MARGIN_S = 300.0
+
+
+def url_expires(url: str) -> Optional[float]:
+    """Expiry (unix time) carried in a signed stream URL, if any."""
+    query = parse_qs(urlsplit(url).query)
+    for value in query.get("ts", []) + [token.split("_", 1)[0] for token in query.get("token", [])]:
+        if value.isdigit():
+            return float(value)
+    return None
+
+
+def _entry_expires(entry: Dict[str, Any]) -> Optional[float]:
+    urls = [entry.get("url") or ""] + [fmt.get("url") or "" for fmt in entry.get("formats") or []]
+    expiries = [expiry for expiry in (url_expires(url) for url in urls if url) if expiry is not None]
+    return min(expiries) if expiries else None
+
+
+def info_entries(info: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [entry for entry in (info.get("entries") or [info]) if entry]
+
+
+def expired_positions(info: Dict[str, Any], positions: Iterable[int], now: Optional[float] = None) -> List[int]:
+    """Which of the (1-based) track positions have stream URLs past their expiry."""
+    now = time.time() if now is None else now
+    tracks = info_entries(info)
+    expired = []
+    for position in positions:
+        if not 1 <= position <= len(tracks):
+            continue
+        expiry = _entry_expires(tracks[position - 1])
+        if expiry is not None and expiry < now + _EXPIRY_MARGIN_S:
+            expired.append(position)
+    return expired
+
+
+def replace_entry(info: Dict[str, Any], position: int, fresh: Dict[str, Any]) -> None:
+    """Swap in a re-extracted track, keeping where the probe said it lands."""
+    if not info.get("entries"):
+        fresh.setdefault("filename", info.get("filename"))
+        info.clear()
+        info.update(fresh)
+        return
+    old = info["entries"][position - 1]
+    for key in ("filename", "playlist_index", "track_number"):
+        if key in old:
+            fresh[key] = old[key]
+    info["entries"][position - 1] = fresh
+
+
+class InfoCache:
+    def __init__(self, root: Path, ttl_s: float, max_bytes: int) -> None:
+        self.root = Path(root)
+        self.ttl_s = ttl_s
+        self.max_bytes = max_bytes
+
+    def _path(self, url: str) -> Path:
+        return self.root / f"{job_id_for_url(url)}.json.gz"
+
+    def get(self, url: str, now: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """The cached info for url while it is fresh, else None."""
+        entry = self._read(url)
+        now = time.time() if now is None else now
+        if entry is None or now - entry[0] > self.ttl_s:
+            return None
+        try:
+            os.utime(self._path(url))
+        except OSError:
+            pass
+        return entry[1]
+
+    def fetched_at(self, url: str) -> Optional[float]:
+        entry = self._read(url)
+        return entry[0] if entry else None
+
+    def _read(self, url: str) -> Optional[Tuple[float, Dict[str, Any]]]:
+        try:
+            with gzip.open(self._path(url), "rt", encoding="utf-8") as fh:
+                data = json.load(fh)
+            if data.get("url") != url:
+                return None
+            return float(data["fetched_at"]), data["info"]
+        except (OSError, ValueError, KeyError, TypeError, EOFError):
+            return None
+
+    def put(self, url: str, info: Dict[str, Any], fetched_at: Optional[float] = None) -> None:
+        path = self._path(url)
+        self.root.mkdir(parents=True, exist_ok=True)
+        data = {"url": url, "fetched_at": time.time() if fetched_at is None else fetched_at, "info": info}
+        # Per thread: two worker slots may cache the same URL at once.
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with gzip.open(tmp, "wt", encoding="utf-8") as fh:
+            json.dump(data, fh, ensure_ascii=False)
+        os.replace(tmp, path)
+        self.evict(keep=path)
+
+    def discard(self, url: str) -> None:
+        try:
+            self._path(url).unlink()
+        except FileNotFoundError:
+            pass
+
+    def evict(self, keep: Optional[Path] = None) -> int:
+        """Drop least recently used entries until under max_bytes; returns how many."""
+        files = []
+        try:
+            with os.scandir(self.root) as it:
+                for entry in it:
+                    if entry.name.endswith(".json.gz") and not entry.name.startswith("."):
+                        st = entry.stat()
+                        files.append((st.st_mtime, st.st_size, Path(entry.path)))
+        except FileNotFoundError:
+            return 0
+        total = sum(size for _mtime, size, _path in files)
+        removed = 0
+        for _mtime, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        return removed
@@ -0,0 +1,268 @@
+"""Index from job_id to the log lines that mention it.
+
+Each structured log is indexed incrementally: the index remembers how far
+into every file it has read and only parses what was appended since. A
+job's history is then a lookup of (file, byte offset) pairs plus one seek
+per line, independent of how long the logs have grown.
+
+Rotation is followed by inode: when a live log is replaced, the old file's
+row is pointed at the renamed file (e.g. worker.log.1) so history recorded
+there stays readable. Built-in rotation (logrotate.py) then moves the row to
+the compressed segment; offsets are into the uncompressed stream.
+"""
+from __future__ import annotations
+
+import gzip
+import os
+import re
+import sqlite3
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Set
+
+from .logs import LogEntry, parse_line
+
+_JOB_ID_RE = re.compile(rb"\bjob_id=(\S+)")
+_CHUNK = 1024 * 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    file_id INTEGER PRIMARY KEY,
+    log TEXT NOT NULL,
+    inode INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    offset INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_log ON files(log, path);
+CREATE TABLE IF NOT EXISTS entries (
+    job_id TEXT NOT NULL,
+    file_id INTEGER NOT NULL,
+    offset INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_job ON entries(job_id, file_id, offset);
+"""
+
+
+def _find_rotated(live: Path, inode: int) -> Optional[Path]:
+    # logrotate-style renames keep the inode: worker.log -> worker.log.1
+    try:
+        with os.scandir(live.parent) as it:
+            for entry in it:
+                if entry.name.startswith(live.name + ".") and entry.inode() == inode:
+                    return Path(entry.path)
+    except OSError:
+        pass
+    return None
+
+
+class JobLogIndex:
+    def __init__(self, db_path: Path, logs: Dict[str, Path]) -> None:
+        self.db_path = Path(db_path)
+        self.logs = logs
+
+    @contextmanager
+    def connect(self) -> Iterator[sqlite3.Connection]:
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            yield conn
+        finally:
+            conn.close()
+
+    def refresh(self) -> int:
+        """Index everything appended since the last call. Returns new entry count."""
+        added = 0
+        with self.connect() as conn:
+            # IMMEDIATE: two refreshers must not index the same bytes twice.
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for name, path in self.logs.items():
+                    added += self._refresh_log(conn, name, path)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return added
+
+    def _refresh_log(self, conn: sqlite3.Connection, name: str, path: Path) -> int:
+        row = conn.execute(
+            "SELECT file_id, inode, offset FROM files WHERE log = ? AND path = ?", (name, str(path))
+        ).fetchone()
+        try:
+            st = path.stat()
+        except OSError:
+            # Renamed and not yet recreated: follow the old file if it is still around.
+            rotated = _find_rotated(path, row[1]) if row else None
+            if rotated is None:
+                return 0
+            conn.execute("UPDATE files SET path = ? WHERE file_id = ?", (str(rotated), row[0]))
+            return self._index_range(conn, row[0], rotated, row[2])
+
+        added = 0
+
+        if row and row[1] != st.st_ino:
+            file_id, inode, offset = row
+            rotated = _find_rotated(path, inode)
+            if rotated is None:
+                # Old file is gone; so is any history that lived in it.
+                conn.execute("DELETE FROM entries WHERE file_id = ?", (file_id,))
+                conn.execute("DELETE FROM files WHERE file_id = ?", (file_id,))
+            else:
+                # Pick up whatever was appended just before the rename.
+                added += self._index_range(conn, file_id, rotated, offset)
+                conn.execute("UPDATE files SET path = ? WHERE file_id = ?", (str(rotated), file_id))
+            row = None
+        elif row and st.st_size < row[2]:
+            # Truncated in place (copytruncate): start over for this file.
+            conn.execute("DELETE FROM entries WHERE file_id = ?", (row[0],))
+            conn.execute("UPDATE files SET offset = 0 WHERE file_id = ?", (row[0],))
+            row = (row[0], row[1], 0)
+
+        if row is None:
+            cur = conn.execute(
+                "INSERT INTO files(log, inode, path, offset) VALUES (?, ?, ?, 0)", (name, st.st_ino, str(path))
+            )
+            row = (cur.lastrowid, st.st_ino, 0)
+
+        file_id, _, offset = row
+        if st.st_size > offset:
+            added += self._index_range(conn, file_id, path, offset)
+        return added
+
+    def _index_range(self, conn: sqlite3.Connection, file_id: int, path: Path, offset: int) -> int:
+        rows = []
+        try:
+            with path.open("rb") as handle:
+                handle.seek(offset)
+                pending = b""
+                base = offset
+                while True:
+                    chunk = handle.read(_CHUNK)
+                    if not chunk:
+                        break
+                    data = pending + chunk
+                    end = data.rfind(b"\n") + 1
+                    start = 0
+                    while start < end:
+                        stop = data.index(b"\n", start) + 1
+                        match = _JOB_ID_RE.search(data, start, stop)
+                        if match and match.group(1) != b"-":
+                            rows.append((match.group(1).decode("utf-8", "replace"), file_id, base + start))
+                        start = stop
+                    pending = data[end:]
+                    base += end
+                # Only complete lines are indexed; a partial line waits.
+                offset = base
+        except OSError:
+            return 0
+        conn.executemany("INSERT INTO entries(job_id, file_id, offset) VALUES (?, ?, ?)", rows)
+        conn.execute("UPDATE files SET offset = ? WHERE file_id = ?", (offset, file_id))
+        return len(rows)
+
+    def adopt(self, name: str, path: Path) -> int:
+        """Index a file of log `name` found outside the live path (e.g. left
+        over by an interrupted rotation). Files already known by inode are
+        only caught up. Returns new entry count."""
+        try:
+            inode = path.stat().st_ino
+        except OSError:
+            return 0
+        with self.connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT file_id, path, offset FROM files WHERE log = ? AND inode = ?", (name, inode)
+                ).fetchone()
+                added = 0
+                if row is None:
+                    cur = conn.execute(
+                        "INSERT INTO files(log, inode, path, offset) VALUES (?, ?, ?, 0)", (name, inode, str(path))
+                    )
+                    added = self._index_range(conn, cur.lastrowid, path, 0)
+                elif row[1] == str(path):
+                    added = self._index_range(conn, row[0], path, row[2])
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return added
+
+    def move_file(self, old_path: Path, new_path: Path) -> None:
+        """Record that an indexed file now lives at new_path (e.g. compressed)."""
+        with self.connect() as conn:
+            conn.execute("UPDATE files SET path = ? WHERE path = ?", (str(new_path), str(old_path)))
+
+    def forget_file(self, path: Path) -> None:
+        with self.connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "DELETE FROM entries WHERE file_id IN (SELECT file_id FROM files WHERE path = ?)", (str(path),)
+            )
+            conn.execute("DELETE FROM files WHERE path = ?", (str(path),))
+            conn.execute("COMMIT")
+
+    def history(self, job_id: str, logs: Optional[Iterable[str]] = None, limit: Optional[int] = None) -> List[LogEntry]:
+        """Log entries for one job, oldest first (per log, in file order)."""
+        query = (
+            "SELECT f.path, e.offset FROM entries e JOIN files f ON f.file_id = e.file_id "
+            "WHERE e.job_id = ?"
+        )
+        params: List[object] = [job_id]
+        if logs is not None:
+            names = list(logs)
+            query += f" AND f.log IN ({','.join('?' * len(names))})"
+            params.extend(names)
+        query += " ORDER BY e.file_id DESC, e.offset DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+
+        with self.connect() as conn:
+            locations = conn.execute(query, params).fetchall()
+        locations.reverse()
+
+        entries: List[LogEntry] = []
+        handles: Dict[str, object] = {}
+        try:
+            for path, offset in locations:
+                handle = handles.get(path)
+                if handle is None:
+                    try:
+                        # Offsets ascend within a file, so gzip seeks only
+                        # ever decompress forward, once per segment.
+                        opener = gzip.open if path.endswith(".gz") else open
+                        handle = handles[path] = opener(path, "rb")
+                    except OSError:
+                        continue
+                handle.seek(offset)
+                entry = parse_line(handle.readline().decode("utf-8", errors="replace"))
+                if entry and entry.job_id == job_id:
+                    entries.append(entry)
+        finally:
+            for handle in handles.values():
+                handle.close()
+        return entries
+
+    def job_ids_with_entries(self, job_ids: Iterable[str], logs: Optional[Iterable[str]] = None) -> Set[str]:
+        wanted = list(job_ids)
+        if not wanted:
+            return set()
+        found: Set[str] = set()
+        log_filter = ""
+        log_params: List[str] = []
+        if logs is not None:
+            log_params = list(logs)
+            log_filter = f" AND f.log IN ({','.join('?' * len(log_params))})"
+        with self.connect() as conn:
+            # Chunked to stay under SQLite's bound-parameter limit.
+            for i in range(0, len(wanted), 500):
+                chunk = wanted[i : i + 500]
+                rows = conn.execute(
+                    "SELECT DISTINCT e.job_id FROM entries e JOIN files f ON f.file_id = e.file_id "
+                    f"WHERE e.job_id IN ({','.join('?' * len(chunk))}){log_filter}",
+                    chunk + log_params,
+                )
+                found.update(row[0] for row in rows)
+        return found
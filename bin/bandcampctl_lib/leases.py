@@ -0,0 +1,168 @@
+"""Leases on in_progress jobs, so a dead worker's jobs go back to pending.
+
+Claiming a job (rename into in_progress/) is followed by writing
+inbox/leases/<job_id>.lease:
+
+    {"pid": 1234, "host": "nas", "claimed_at": ..., "expires": ...}
+
+The worker renews the expiry with a heartbeat while the download runs and
+removes the file when the job leaves in_progress/. The reaper returns a job
+to pending/ once its lease has expired, or at once when the owner is a
+process on this host that no longer exists. A job with no lease file (a
+claim whose lease is not written yet, or one made before leases existed)
+gets one TTL from the moment it was moved into in_progress/.
+
+The reclaim is a single rename, so if the owner finishes at the same moment
+exactly one of the two moves wins; the worker treats a job file that has
+vanished from in_progress/ as taken back and leaves it alone. Renewals and
+reclaims take inbox/leases/.lock, and a renewal only rewrites a lease that
+is still its own: a late heartbeat cannot overwrite the lease of whoever
+claimed the job after it was reaped.
+"""
+from __future__ import annotations
+
+import json
+import os
+import socket
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Iterator, List, Optional
+
+from .config import Paths
+from .fs import flocked, pid_alive
+
+HOST = socket.gethostname()
+
+
+@dataclass(frozen=True)
+class JobLease:
+    job_id: str
+    pid: int
+    host: str
+    claimed_at: float
+    expires: float
+
+    @property
+    def owner(self) -> str:
+        return f"{self.pid}@{self.host}"
+
+
+def lease_path(paths: Paths, job_id: str) -> Path:
+    return paths.leases / f"{job_id}.lease"
+
+
+@contextmanager
+def _locked(paths: Paths) -> Iterator[None]:
+    with flocked(paths.leases / ".lock"):
+        yield
+
+
+def write_lease(paths: Paths, job_id: str, ttl_s: float, claimed_at: Optional[float] = None) -> JobLease:
+    now = time.time()
+    lease = JobLease(job_id, os.getpid(), HOST, now if claimed_at is None else claimed_at, now + ttl_s)
+    paths.leases.mkdir(parents=True, exist_ok=True)
+    path = lease_path(paths, job_id)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    data = {"pid": lease.pid, "host": lease.host, "claimed_at": lease.claimed_at, "expires": lease.expires}
+    tmp.write_text(json.dumps(data), encoding="utf-8")
+    os.replace(tmp, path)
+    return lease
+
+
+def renew_lease(paths: Paths, job_id: str, ttl_s: float, claimed_at: float) -> bool:
+    """Extend this process's lease; False if the job is no longer ours."""
+    with _locked(paths):
+        lease = read_lease(paths, job_id)
+        if lease is None or (lease.pid, lease.host) != (os.getpid(), HOST):
+            return False
+        if not (paths.in_progress / f"{job_id}.job").exists():
+            return False
+        write_lease(paths, job_id, ttl_s, claimed_at)
+        return True
+
+
+def read_lease(paths: Paths, job_id: str) -> Optional[JobLease]:
+    try:
+        data = json.loads(lease_path(paths, job_id).read_text(encoding="utf-8"))
+        return JobLease(job_id, int(data["pid"]), str(data["host"]), float(data["claimed_at"]), float(data["expires"]))
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def release_lease(paths: Paths, job_id: str) -> None:
+    try:
+        lease_path(paths, job_id).unlink()
+    except FileNotFoundError:
+        pass
+
+
+def lease_expired(paths: Paths, job_id: str, ttl_s: float, now: Optional[float] = None) -> Optional[str]:
+    """Why the in_progress job's lease is void, or None while it is held."""
+    now = time.time() if now is None else now
+    lease = read_lease(paths, job_id)
+    if lease is None:
+        try:
+            # rename() updates ctime, so this is when the job entered in_progress/.
+            moved_at = (paths.in_progress / f"{job_id}.job").stat().st_ctime
+        except OSError:
+            return None
+        return f"no lease for {int(now - moved_at)}s" if now - moved_at > ttl_s else None
+    if lease.host == HOST and not pid_alive(lease.pid):
+        return f"owner {lease.owner} is gone"
+    if lease.expires < now:
+        return f"lease of {lease.owner} expired {int(now - lease.expires)}s ago"
+    return None
+
+
+def reap_expired(
+    paths: Paths,
+    ttl_s: float,
+    log: Callable[[str, str, str], None],
+    now: Optional[float] = None,
+) -> List[str]:
+    """Move in_progress jobs with a void lease back to pending/.
+
+    Logs one lease_expired line per job via log(action, job_id, detail) and
+    returns the reclaimed job ids. Stale lease files of jobs no longer in
+    progress are removed as well.
+    """
+    now = time.time() if now is None else now
+    try:
+        with os.scandir(paths.in_progress) as it:
+            job_ids = [e.name[: -len(".job")] for e in it if e.name.endswith(".job") and not e.name.startswith(".")]
+    except FileNotFoundError:
+        job_ids = []
+
+    reclaimed: List[str] = []
+    for job_id in sorted(job_ids):
+        if lease_expired(paths, job_id, ttl_s, now) is None:
+            continue
+        paths.pending.mkdir(parents=True, exist_ok=True)
+        with _locked(paths):
+            # Again under the lock: the owner may have renewed in between.
+            reason = lease_expired(paths, job_id, ttl_s, now)
+            if reason is None:
+                continue
+            try:
+                os.rename(paths.in_progress / f"{job_id}.job", paths.pending / f"{job_id}.job")
+            except FileNotFoundError:
+                continue
+            release_lease(paths, job_id)
+        reclaimed.append(job_id)
+        log("lease_expired", job_id, f"in_progress->pending {reason}")
+
+    in_progress = set(job_ids)
+    try:
+        with os.scandir(paths.leases) as it:
+            orphans = [e.name[: -len(".lease")] for e in it if e.name.endswith(".lease")]
+    except FileNotFoundError:
+        orphans = []
+    for job_id in orphans:
+        if job_id in in_progress:
+            continue
+        lease = read_lease(paths, job_id)
+        if lease is None or lease.expires < now:
+            release_lease(paths, job_id)
+    return reclaimed
@@ -0,0 +1,273 @@
+"""On-disk index of the music library (~/Music/Bandcamp/<Artist>/<Album>/).
+
+Answers "do we already have this album?" without a yt-dlp metadata probe.
+Albums are keyed by their Artist/Album path and by a normalized
+artist+title key, and downloaded items are linked to their album path by
+job_id/URL. Refreshes are incremental: an artist directory is only re-listed
+when its mtime changes, and an album is only recounted when its own mtime
+changes.
+
+An album whose manifest (manifest.py) says it is incomplete, i.e. a
+download that was interrupted part way, is not reported as present.
+"""
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from .fs import clean_url, job_id_for_url
+from .manifest import album_complete
+
+AUDIO_EXTS = {".flac", ".mp3", ".m4a", ".ogg", ".opus", ".wav", ".aiff", ".aac", ".alac"}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS artists (
+    name TEXT PRIMARY KEY,
+    mtime REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS albums (
+    path TEXT PRIMARY KEY,
+    artist TEXT NOT NULL,
+    album TEXT NOT NULL,
+    norm_key TEXT NOT NULL,
+    mtime REAL NOT NULL,
+    track_count INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS albums_norm_key ON albums(norm_key);
+CREATE TABLE IF NOT EXISTS items (
+    job_id TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    path TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS items_path ON items(path);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+_REFRESH_LOCK = threading.RLock()
+_LAST_REFRESH: Dict[str, float] = {}
+
+
+@dataclass(frozen=True)
+class AlbumRow:
+    path: str
+    artist: str
+    album: str
+    norm_key: str
+    mtime: float
+    track_count: int
+
+
+@dataclass(frozen=True)
+class RefreshStats:
+    artists: int
+    albums: int
+    rescanned_artists: int
+    elapsed_s: float
+
+
+def normalize(text: str) -> str:
+    # yt-dlp sanitizes path components (e.g. '/' -> '⧸', ':' -> '：'), so
+    # compare on letters and digits only, case-folded.
+    text = unicodedata.normalize("NFKC", text or "").casefold()
+    return "".join(ch for ch in text if ch.isalnum())
+
+
+def norm_key(artist: str, album: str) -> str:
+    return f"{normalize(artist)}|{normalize(album)}"
+
+
+def _mtime(path: str) -> Optional[float]:
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+def _count_tracks(album_path: str) -> int:
+    try:
+        with os.scandir(album_path) as it:
+            return sum(1 for e in it if e.is_file() and os.path.splitext(e.name)[1].lower() in AUDIO_EXTS)
+    except OSError:
+        return 0
+
+
+def _album_row(root: str, artist: str, album: str, mtime: float) -> AlbumRow:
+    return AlbumRow(
+        path=f"{artist}/{album}",
+        artist=artist,
+        album=album,
+        norm_key=norm_key(artist, album),
+        mtime=mtime,
+        track_count=_count_tracks(os.path.join(root, artist, album)),
+    )
+
+
+def _scan_artist(root: str, artist: str, mtime: float, known_mtime: Optional[float],
+                 known_albums: Dict[str, AlbumRow]) -> Tuple[List[AlbumRow], bool]:
+    artist_path = os.path.join(root, artist)
+    rows: List[AlbumRow] = []
+
+    if known_mtime == mtime:
+        # Album set unchanged; only albums whose own mtime moved need a recount.
+        for row in known_albums.values():
+            album_mtime = _mtime(os.path.join(artist_path, row.album))
+            if album_mtime is None:
+                continue
+            rows.append(row if album_mtime == row.mtime else _album_row(root, artist, row.album, album_mtime))
+        return rows, False
+
+    try:
+        with os.scandir(artist_path) as it:
+            entries = [(e.name, e.stat().st_mtime) for e in it if e.is_dir() and not e.name.startswith(".")]
+    except OSError:
+        return rows, True
+    for album, album_mtime in entries:
+        known = known_albums.get(album)
+        rows.append(known if known and known.mtime == album_mtime else _album_row(root, artist, album, album_mtime))
+    return rows, True
+
+
+def _bump(conn: sqlite3.Connection) -> None:
+    # Every write to albums or items moves the generation, so readers can
+    # tell "changed" from one row instead of rehashing the tables.
+    conn.execute(
+        "INSERT INTO meta(key, value) VALUES ('generation', 1) "
+        "ON CONFLICT(key) DO UPDATE SET value = value + 1"
+    )
+
+
+class LibraryIndex:
+    def __init__(self, db_path: Path, music_root: Path, scan_threads: int = 16) -> None:
+        self.db_path = Path(db_path)
+        self.music_root = Path(music_root)
+        self.scan_threads = scan_threads
+
+    @contextmanager
+    def connect(self) -> Iterator[sqlite3.Connection]:
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.db_path), timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def refresh(self) -> RefreshStats:
+        """Bring the index in line with the filesystem, touching only what changed."""
+        started = time.monotonic()
+        root = str(self.music_root)
+        try:
+            with os.scandir(root) as it:
+                artists = {e.name: e.stat().st_mtime for e in it if e.is_dir() and not e.name.startswith(".")}
+        except OSError:
+            artists = {}
+
+        with self.connect() as conn:
+            known_artists = dict(conn.execute("SELECT name, mtime FROM artists"))
+            known_albums: Dict[str, Dict[str, AlbumRow]] = {}
+            for row in conn.execute("SELECT path, artist, album, norm_key, mtime, track_count FROM albums"):
+                album = AlbumRow(*row)
+                known_albums.setdefault(album.artist, {})[album.album] = album
+
+            with ThreadPoolExecutor(max_workers=self.scan_threads) as pool:
+                futures = {
+                    name: pool.submit(_scan_artist, root, name, mtime, known_artists.get(name), known_albums.get(name, {}))
+                    for name, mtime in artists.items()
+                }
+                results = {name: future.result() for name, future in futures.items()}
+
+            rescanned = sum(1 for _, changed in results.values() if changed)
+            rows = [row for album_rows, _ in results.values() for row in album_rows]
+            previous = {row for albums in known_albums.values() for row in albums.values()}
+            # Skip the rewrite when nothing moved so the generation stays put.
+            if artists != known_artists or set(rows) != previous:
+                conn.execute("DELETE FROM artists")
+                conn.executemany("INSERT INTO artists(name, mtime) VALUES (?, ?)", artists.items())
+                conn.execute("DELETE FROM albums")
+                conn.executemany(
+                    "INSERT INTO albums(path, artist, album, norm_key, mtime, track_count) VALUES (?, ?, ?, ?, ?, ?)",
+                    [(r.path, r.artist, r.album, r.norm_key, r.mtime, r.track_count) for r in rows],
+                )
+                _bump(conn)
+
+        with _REFRESH_LOCK:
+            _LAST_REFRESH[str(self.db_path)] = time.monotonic()
+        return RefreshStats(
+            artists=len(artists),
+            albums=len(rows),
+            rescanned_artists=rescanned,
+            elapsed_s=time.monotonic() - started,
+        )
+
+    def refresh_if_stale(self, max_age_s: float = 30.0) -> None:
+        # Held across the refresh so concurrent callers wait for one scan
+        # instead of each starting their own.
+        with _REFRESH_LOCK:
+            last = _LAST_REFRESH.get(str(self.db_path))
+            if last is None or time.monotonic() - last >= max_age_s:
+                self.refresh()
+
+    def record(self, url: str, rel_path: str) -> None:
+        """Link a downloaded item to the album directory it landed in."""
+        url = clean_url(url)
+        with self.connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO items(job_id, url, path) VALUES (?, ?, ?)",
+                (job_id_for_url(url), url, rel_path.strip("/")),
+            )
+            _bump(conn)
+
+    def _album_exists(self, rel_path: str) -> bool:
+        album_path = self.music_root / rel_path
+        return album_path.is_dir() and album_complete(album_path)
+
+    def lookup(self, url: str, artist: str = "", title: str = "") -> Optional[str]:
+        """Return the Artist/Album path for an item we already have, else None.
+
+        Checks the recorded job_id link first, then falls back to matching the
+        collection's artist/title against album directories on disk.
+        """
+        job_id = job_id_for_url(url)
+        with self.connect() as conn:
+            row = conn.execute("SELECT path FROM items WHERE job_id = ?", (job_id,)).fetchone()
+            if row and self._album_exists(row[0]):
+                return row[0]
+            if artist and title:
+                row = conn.execute(
+                    "SELECT path FROM albums WHERE norm_key = ? LIMIT 1", (norm_key(artist, title),)
+                ).fetchone()
+                if row and self._album_exists(row[0]):
+                    conn.execute(
+                        "INSERT OR REPLACE INTO items(job_id, url, path) VALUES (?, ?, ?)",
+                        (job_id, clean_url(url), row[0]),
+                    )
+                    _bump(conn)
+                    return row[0]
+        return None
+
+    def fingerprint(self) -> int:
+        """Generation of the index: moves whenever albums or item links are written."""
+        with self.connect() as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()
+        return row[0] if row else 0
+
+    def snapshot(self) -> Tuple[Set[str], Set[str]]:
+        """(job_ids linked to a present album, norm_keys of present albums) for bulk status."""
+        with self.connect() as conn:
+            present = {row[0] for row in conn.execute("SELECT path FROM albums")}
+            keys = {row[0] for row in conn.execute("SELECT norm_key FROM albums")}
+            job_ids = {job_id for job_id, path in conn.execute("SELECT job_id, path FROM items") if path in present}
+        return job_ids, keys
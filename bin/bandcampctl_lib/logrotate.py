@@ -0,0 +1,289 @@
+"""Size/age-based rotation of the append-only stage logs.
+
+A live log (e.g. Sync/logs/worker.log) is renamed aside, compressed into
+<log dir>/archive/<name>.<stamp>.gz and described by a sidecar
+<name>.<stamp>.idx.json holding its time range, line count and the job_ids
+it mentions. Searches read the sidecars first and only decompress segments
+that can contain a match.
+
+Writers need no coordination: the shell stages reopen the log for every
+line (`printf >> "$LOG"`) and so does logs.append_entry. A rotation cut
+short after the rename leaves <name>.<stamp> beside the live log; the next
+rotate_logs finishes archiving it.
+
+Segments are gzip (stdlib); zstd would need a third-party module.
+"""
+from __future__ import annotations
+
+import glob
+import gzip
+import json
+import os
+import re
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set
+
+from .config import Paths, Settings
+from .joblog import JobLogIndex
+
+_JOB_ID_RE = re.compile(r"\bjob_id=(\S+)")
+_SEGMENT_SUFFIX = ".gz"
+_SIDECAR_SUFFIX = ".idx.json"
+_STAMP_RE = re.compile(r"\d{8}T\d{6}\.\d{6}")
+
+
+@dataclass(frozen=True)
+class Segment:
+    log: str
+    path: Path
+    first_ts: str
+    last_ts: str
+    lines: int
+    job_ids: Set[str]
+
+
+def archive_dir(log_path: Path) -> Path:
+    return log_path.parent / "archive"
+
+
+def parse_timestamp(text: str) -> Optional[datetime]:
+    # Shell lines are `date -Is` (with offset); ctl.log lines are naive local time.
+    try:
+        parsed = datetime.fromisoformat(text)
+    except ValueError:
+        return None
+    return parsed.astimezone() if parsed.tzinfo is None else parsed
+
+
+def _first_timestamp(path: Path) -> Optional[datetime]:
+    try:
+        with path.open("r", encoding="utf-8", errors="replace") as handle:
+            first = handle.readline()
+    except OSError:
+        return None
+    return parse_timestamp(first.split(" ", 1)[0]) if first else None
+
+
+def needs_rotation(path: Path, settings: Settings, now: Optional[float] = None, force: bool = False) -> bool:
+    try:
+        size = path.stat().st_size
+    except OSError:
+        return False
+    if size == 0:
+        return False
+    if force or size >= settings.log_max_bytes:
+        return True
+    first = _first_timestamp(path)
+    now = time.time() if now is None else now
+    return first is not None and now - first.timestamp() >= settings.log_max_age_s
+
+
+def _sidecar_path(segment_path: Path) -> Path:
+    return segment_path.with_name(segment_path.name[: -len(_SEGMENT_SUFFIX)] + _SIDECAR_SUFFIX)
+
+
+def _compress(source: Path, dest: Path) -> Dict[str, object]:
+    """gzip source into dest while collecting what the sidecar needs."""
+    first_ts = last_ts = ""
+    lines = 0
+    job_ids: Set[str] = set()
+    tmp = dest.with_name("." + dest.name + ".tmp")
+    with source.open("rb") as src, gzip.open(tmp, "wb") as out:
+        for raw in src:
+            out.write(raw)
+            line = raw.decode("utf-8", errors="replace")
+            if not line.strip():
+                continue
+            lines += 1
+            ts = line.split(" ", 1)[0]
+            if parse_timestamp(ts):
+                first_ts = first_ts or ts
+                last_ts = ts
+            match = _JOB_ID_RE.search(line)
+            if match and match.group(1) != "-":
+                job_ids.add(match.group(1))
+    os.replace(tmp, dest)
+    return {"first_ts": first_ts, "last_ts": last_ts, "lines": lines, "job_ids": sorted(job_ids)}
+
+
+def rotate_log(name: str, path: Path, index: Optional[JobLogIndex] = None) -> Optional[Segment]:
+    # Microseconds keep two rotations in the same second apart (and sortable).
+    stamp = datetime.now().strftime("%Y%m%dT%H%M%S.%f")
+    rotated = path.with_name(f"{path.name}.{stamp}")
+    if index is not None:
+        # Make sure the index has a row for this inode so it can follow the rename.
+        index.refresh()
+    try:
+        os.rename(path, rotated)
+    except FileNotFoundError:
+        return None
+
+    if index is not None:
+        # Catches the index up on the renamed file (found by inode) before it goes away.
+        index.refresh()
+    return _archive(name, path, rotated, stamp, index)
+
+
+def _archive(name: str, path: Path, rotated: Path, stamp: str, index: Optional[JobLogIndex]) -> Segment:
+    """Compress a renamed-aside log into the archive, then drop it."""
+    archive = archive_dir(path)
+    archive.mkdir(parents=True, exist_ok=True)
+    segment_path = archive / f"{path.name}.{stamp}{_SEGMENT_SUFFIX}"
+    sidecar = _sidecar_path(segment_path)
+    meta: Optional[Dict[str, object]] = None
+    if segment_path.exists():
+        # Finishing an interrupted rotation that got as far as its sidecar.
+        try:
+            meta = json.loads(sidecar.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            meta = None
+    if meta is None:
+        meta = _compress(rotated, segment_path)
+        meta["log"] = name
+        sidecar_tmp = sidecar.with_name("." + sidecar.name + ".tmp")
+        sidecar_tmp.write_text(json.dumps(meta), encoding="utf-8")
+        os.replace(sidecar_tmp, sidecar)
+
+    if index is not None:
+        index.move_file(rotated, segment_path)
+    rotated.unlink()
+    return Segment(
+        log=name,
+        path=segment_path,
+        first_ts=str(meta["first_ts"]),
+        last_ts=str(meta["last_ts"]),
+        lines=int(meta["lines"]),  # type: ignore[arg-type]
+        job_ids=set(meta["job_ids"]),  # type: ignore[arg-type]
+    )
+
+
+def finish_rotations(name: str, path: Path, index: Optional[JobLogIndex] = None) -> List[Segment]:
+    """Archive <name>.<stamp> files left beside the live log by a rotation that did not finish."""
+    leftovers = []
+    for rotated in sorted(path.parent.glob(f"{glob.escape(path.name)}.*")):
+        stamp = rotated.name[len(path.name) + 1:]
+        if _STAMP_RE.fullmatch(stamp) and rotated.is_file():
+            leftovers.append((rotated, stamp))
+    if leftovers and index is not None:
+        # Follows a rename the index saw the start of; adopt() covers the rest.
+        index.refresh()
+        for rotated, _stamp in leftovers:
+            index.adopt(name, rotated)
+    return [_archive(name, path, rotated, stamp, index) for rotated, stamp in leftovers]
+
+
+def list_segments(log_path: Path, name: str) -> List[Segment]:
+    """Archived segments of one log, oldest first, read from their sidecars."""
+    segments: List[Segment] = []
+    archive = archive_dir(log_path)
+    try:
+        sidecars = sorted(archive.glob(f"{log_path.name}.*{_SIDECAR_SUFFIX}"))
+    except OSError:
+        return segments
+    for sidecar in sidecars:
+        try:
+            meta = json.loads(sidecar.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            continue
+        segment_path = sidecar.with_name(sidecar.name[: -len(_SIDECAR_SUFFIX)] + _SEGMENT_SUFFIX)
+        if not segment_path.exists():
+            continue
+        segments.append(
+            Segment(
+                log=name,
+                path=segment_path,
+                first_ts=meta.get("first_ts", ""),
+                last_ts=meta.get("last_ts", ""),
+                lines=meta.get("lines", 0),
+                job_ids=set(meta.get("job_ids", [])),
+            )
+        )
+    return segments
+
+
+def prune_segments(log_path: Path, name: str, keep_days: float, index: Optional[JobLogIndex] = None) -> int:
+    cutoff = time.time() - keep_days * 86400
+    removed = 0
+    for segment in list_segments(log_path, name):
+        last = parse_timestamp(segment.last_ts)
+        if last is None or last.timestamp() >= cutoff:
+            continue
+        if index is not None:
+            index.forget_file(segment.path)
+        segment.path.unlink(missing_ok=True)
+        _sidecar_path(segment.path).unlink(missing_ok=True)
+        removed += 1
+    return removed
+
+
+def rotate_logs(paths: Paths, settings: Settings, force: bool = False) -> List[Segment]:
+    index = JobLogIndex(paths.joblog_db, paths.named_logs())
+    segments: List[Segment] = []
+    for name, path in paths.named_logs().items():
+        segments.extend(finish_rotations(name, path, index))
+        if needs_rotation(path, settings, force=force):
+            segment = rotate_log(name, path, index)
+            if segment:
+                segments.append(segment)
+        prune_segments(path, name, settings.log_keep_days, index)
+    return segments
+
+
+def _segment_may_match(segment: Segment, job_id: Optional[str], since: Optional[datetime],
+                       until: Optional[datetime]) -> bool:
+    if job_id and job_id not in segment.job_ids:
+        return False
+    first = parse_timestamp(segment.first_ts)
+    last = parse_timestamp(segment.last_ts)
+    if since and last and last < since:
+        return False
+    if until and first and first > until:
+        return False
+    return True
+
+
+def _line_matches(line: str, job_id: Optional[str], text: Optional[str], since: Optional[datetime],
+                  until: Optional[datetime]) -> bool:
+    if job_id and f"job_id={job_id} " not in line:
+        return False
+    if text and text not in line:
+        return False
+    if since or until:
+        ts = parse_timestamp(line.split(" ", 1)[0])
+        if ts is None or (since and ts < since) or (until and ts > until):
+            return False
+    return True
+
+
+def search_log(
+    log_path: Path,
+    name: str,
+    job_id: Optional[str] = None,
+    text: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+) -> Iterator[str]:
+    """Matching lines across archived segments (oldest first) and the live log.
+
+    Segments whose sidecar rules out the job_id or time range are never opened.
+    """
+    for segment in list_segments(log_path, name):
+        if not _segment_may_match(segment, job_id, since, until):
+            continue
+        with gzip.open(segment.path, "rt", encoding="utf-8", errors="replace") as handle:
+            for line in handle:
+                line = line.rstrip("\n")
+                if line and _line_matches(line, job_id, text, since, until):
+                    yield line
+    try:
+        handle = log_path.open("r", encoding="utf-8", errors="replace")
+    except OSError:
+        return
+    with handle:
+        for line in handle:
+            line = line.rstrip("\n")
+            if line and _line_matches(line, job_id, text, since, until):
+                yield line
@@ -1,10 +1,13 @@
 from __future__ import annotations
 
+import os
+import threading
 import time
 import re
 from dataclasses import dataclass
+from datetime import datetime
 from pathlib import Path
-from typing import Iterable, Iterator, List, Optional
+from typing import Iterable, Iterator, List, Optional, Tuple
 
 
 @dataclass(frozen=True)
@@ -21,6 +24,26 @@ _LOG_RE = re.compile(
 )
 
 
+_APPEND_LOCK = threading.Lock()
+
+
+def append_entry(path: Path, action: str, job_id: str = "-", detail: str = "") -> None:
+    append_entries(path, [(action, job_id, detail)])
+
+
+def append_entries(path: Path, rows: Iterable[Tuple[str, str, str]]) -> None:
+    # Same shape as the shell stages' `printf ... "$(date -Is)"` lines so every
+    # reader (status, TUI, dashboard) parses Python- and shell-written logs alike.
+    timestamp = datetime.now().astimezone().isoformat(timespec="seconds")
+    data = "".join(f'{timestamp} action={action} job_id={job_id} detail="{detail}"\n' for action, job_id, detail in rows)
+    if not data:
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with _APPEND_LOCK:
+        with path.open("a", encoding="utf-8") as handle:
+            handle.write(data)
+
+
 def parse_line(line: str) -> Optional[LogEntry]:
     # Expected format: ISO action=... job_id=... detail="..."
     match = _LOG_RE.match(line.strip())
@@ -35,31 +58,49 @@ def parse_line(line: str) -> Optional[LogEntry]:
     )
 
 
-def read_entries(path: Path, limit: int = 200) -> List[LogEntry]:
-    if not path.exists():
+def tail_lines(path: Path, limit: int = 50, block_size: int = 64 * 1024) -> List[str]:
+    """Return the last `limit` lines of a file without reading the whole file.
+
+    Reads fixed-size blocks backwards from EOF until enough newlines have been
+    seen, so the cost depends on `limit` (and line length), not on file size.
+    """
+    if limit <= 0:
         return []
     try:
-        lines = path.read_text(encoding="utf-8", errors="replace").splitlines()
-    except Exception:
+        handle = path.open("rb")
+    except OSError:
         return []
+    with handle:
+        handle.seek(0, os.SEEK_END)
+        position = handle.tell()
+        blocks: List[bytes] = []
+        newlines = 0
+        # One extra newline: the file usually ends with "\n", which does not
+        # start a new line.
+        while position > 0 and newlines <= limit:
+            step = min(block_size, position)
+            position -= step
+            handle.seek(position)
+            block = handle.read(step)
+            newlines += block.count(b"\n")
+            blocks.append(block)
+    data = b"".join(reversed(blocks))
+    lines = data.decode("utf-8", errors="replace").splitlines()
+    if position > 0:
+        # The first line is probably cut off mid-way; enough lines follow it.
+        lines = lines[1:]
+    return lines[-limit:]
+
+
+def read_entries(path: Path, limit: int = 200) -> List[LogEntry]:
     entries: List[LogEntry] = []
-    for line in lines[-limit:]:
+    for line in tail_lines(path, limit=limit):
         entry = parse_line(line)
         if entry:
             entries.append(entry)
     return entries
 
 
-def tail_lines(path: Path, limit: int = 50) -> List[str]:
-    if not path.exists():
-        return []
-    try:
-        lines = path.read_text(encoding="utf-8", errors="replace").splitlines()
-    except Exception:
-        return []
-    return lines[-limit:]
-
-
 def follow(path: Path, sleep_s: float = 0.5) -> Iterator[str]:
     # Simple follow generator (tail -f style).
     path.parent.mkdir(parents=True, exist_ok=True)
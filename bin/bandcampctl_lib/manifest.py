@@ -0,0 +1,73 @@
+"""Per-album manifest: the expected track list and what is on disk.
+
+Written as <Artist>/<Album>/.bandcampsync.json by the download engine, once
+before fetching (complete=false) into the album's staging directory in
+scratch, and again when done, just before the album is published into the
+library with it:
+
+    {"url": ..., "job_id": ..., "artist": ..., "album": ..., "complete": true,
+     "updated": "2026-01-01T12:00:00+00:00",
+     "tracks": [{"index": 1, "number": 1, "title": ..., "duration": 215.4,
+                 "file": "01 - Title.flac", "size": 23456789}, ...]}
+
+Albums without a manifest (downloaded before it existed) count as complete.
+An incomplete manifest in the library is left from a download interrupted
+before albums were staged in scratch; the next attempt completes it in place.
+"""
+from __future__ import annotations
+
+import json
+import os
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List, Optional
+
+MANIFEST_NAME = ".bandcampsync.json"
+
+
+@dataclass
+class TrackEntry:
+    index: int
+    number: int
+    title: str
+    duration: Optional[float]
+    file: str = ""
+    size: int = 0
+
+
+@dataclass
+class AlbumManifest:
+    url: str
+    job_id: str
+    artist: str
+    album: str
+    complete: bool = False
+    updated: str = ""
+    tracks: List[TrackEntry] = field(default_factory=list)
+
+    def missing(self) -> List[TrackEntry]:
+        return [track for track in self.tracks if not track.file]
+
+
+def read_manifest(album_path: Path) -> Optional[AlbumManifest]:
+    try:
+        data = json.loads((album_path / MANIFEST_NAME).read_text(encoding="utf-8"))
+        tracks = [TrackEntry(**track) for track in data.pop("tracks", [])]
+        return AlbumManifest(tracks=tracks, **data)
+    except (OSError, ValueError, TypeError):
+        return None
+
+
+def write_manifest(album_path: Path, manifest: AlbumManifest) -> None:
+    manifest.updated = datetime.now(timezone.utc).astimezone().isoformat(timespec="seconds")
+    album_path.mkdir(parents=True, exist_ok=True)
+    path = album_path / MANIFEST_NAME
+    tmp = path.with_name(f"{MANIFEST_NAME}.{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(asdict(manifest), indent=1, ensure_ascii=False) + "\n", encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def album_complete(album_path: Path) -> bool:
+    manifest = read_manifest(album_path)
+    return manifest is None or manifest.complete
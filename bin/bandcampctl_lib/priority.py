@@ -0,0 +1,59 @@
+"""Job priority classes, stored in the job file next to the retry metadata.
+
+    PRIORITY=new
+    ENQUEUED_AT=2026-01-01T12:34:56.000001+00:00
+
+The worker runs manual requests first, then new purchases, then retries,
+then the backfill; within a class, oldest ENQUEUED_AT first. Jobs without
+these lines (written before priorities existed) count as backfill, ordered
+by file mtime.
+"""
+from __future__ import annotations
+
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Optional
+
+from .fs import read_job_file, write_job_file
+
+MANUAL = "manual"
+NEW = "new"
+RETRY = "retry"
+BACKFILL = "backfill"
+
+RANKS = {MANUAL: 0, NEW: 1, RETRY: 2, BACKFILL: 3}
+
+PRIORITY = "PRIORITY"
+ENQUEUED_AT = "ENQUEUED_AT"
+
+
+def rank(meta: Dict[str, str]) -> int:
+    return RANKS.get(meta.get(PRIORITY, BACKFILL), RANKS[BACKFILL])
+
+
+def enqueued_at(meta: Dict[str, str], fallback: float) -> float:
+    value = meta.get(ENQUEUED_AT)
+    if not value:
+        return fallback
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        return fallback
+
+
+def stamp(meta: Dict[str, str], priority: str, when: Optional[float] = None) -> Dict[str, str]:
+    """Set PRIORITY, and ENQUEUED_AT (microseconds, so a batch keeps its order)."""
+    meta[PRIORITY] = priority
+    if when is not None:
+        meta[ENQUEUED_AT] = datetime.fromtimestamp(when, timezone.utc).astimezone().isoformat(timespec="microseconds")
+    return meta
+
+
+def bump(job_path: Path, priority: str) -> None:
+    """Re-stamp a queued job in place (rewritten atomically, so the worker
+    sees an update event and re-files it)."""
+    url, meta = read_job_file(job_path)
+    if not url:
+        raise FileNotFoundError(job_path)
+    write_job_file(job_path, url, stamp(meta, priority, time.time()))
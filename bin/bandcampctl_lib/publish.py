@@ -0,0 +1,107 @@
+"""Publishing a finished album from scratch into the music library.
+
+Albums are assembled in a staging directory under the job's scratch
+directory (BANDCAMPSYNC_SCRATCH_DIR, ideally a local disk or tmpfs): the
+raw streams, every ffmpeg pass, the cover and the manifest are written
+there, and the library (often a network share) only sees the result:
+
+- a new album is moved into place with one directory rename, or, when
+  scratch is on another filesystem, copied next to its final place under a
+  dot-name (which the library index and the "already have" checks skip)
+  and then renamed;
+- tracks added to an album that is already in the library are moved in
+  file by file, each with a rename (again via a dot-name copy across
+  filesystems), the manifest last.
+
+Either way a half-built album is never visible under its real name.
+"""
+from __future__ import annotations
+
+import errno
+import glob
+import os
+import shutil
+from pathlib import Path
+from typing import List
+
+from .library import AUDIO_EXTS
+from .manifest import MANIFEST_NAME
+
+
+def _move_file(src: Path, dest: Path) -> None:
+    try:
+        os.replace(src, dest)
+        return
+    except OSError as exc:
+        if exc.errno != errno.EXDEV:
+            raise
+    part = dest.with_name(f".{dest.name}.{os.getpid()}.part")
+    try:
+        shutil.copy2(src, part)
+        os.replace(part, dest)
+    except BaseException:
+        try:
+            part.unlink()
+        except OSError:
+            pass
+        raise
+    src.unlink()
+
+
+def _merge(stage: Path, album_path: Path) -> None:
+    # Dot-names are leftovers (.part files) and the manifest, which goes last.
+    files: List[Path] = sorted(p for p in stage.iterdir() if p.is_file() and not p.name.startswith("."))
+    for src in files:
+        dest = album_path / src.name
+        if src.suffix.lower() in AUDIO_EXTS:
+            # A re-fetched track may come in another format than the copy it replaces.
+            for stale in album_path.glob(f"{glob.escape(dest.stem)}.*"):
+                if stale.suffix.lower() in AUDIO_EXTS and stale.name != dest.name:
+                    stale.unlink()
+        _move_file(src, dest)
+    # Until the manifest is replaced the album reads as it was before.
+    manifest = stage / MANIFEST_NAME
+    if manifest.is_file():
+        _move_file(manifest, album_path / MANIFEST_NAME)
+    shutil.rmtree(stage, ignore_errors=True)
+
+
+def _rename_dir(src: Path, dest: Path) -> bool:
+    # False when dest appeared in the meantime (then the caller merges).
+    try:
+        os.rename(src, dest)
+        return True
+    except OSError as exc:
+        if exc.errno in (errno.EEXIST, errno.ENOTEMPTY):
+            return False
+        raise
+
+
+def publish_album(stage: Path, album_path: Path) -> Path:
+    """Move the staged album to album_path in one step; returns album_path."""
+    album_path.parent.mkdir(parents=True, exist_ok=True)
+    if album_path.exists():
+        _merge(stage, album_path)
+        return album_path
+    try:
+        if _rename_dir(stage, album_path):
+            return album_path
+    except OSError as exc:
+        if exc.errno != errno.EXDEV:
+            raise
+        tmp = album_path.with_name(f".{album_path.name}.{os.getpid()}.publish")
+        shutil.rmtree(tmp, ignore_errors=True)
+        try:
+            shutil.copytree(stage, tmp, ignore=shutil.ignore_patterns(".*.part", ".*.tmp"))
+            if _rename_dir(tmp, album_path):
+                shutil.rmtree(stage, ignore_errors=True)
+                return album_path
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        # Lost a race with another writer: fall through and merge from the copy.
+        shutil.rmtree(stage, ignore_errors=True)
+        stage = tmp
+    _merge(stage, album_path)
+    return album_path
+
@@ -0,0 +1,296 @@
+"""In-memory view of the inbox queues, kept current without rescanning.
+
+One scandir per queue directory at startup (names only, job files are not
+opened), then inotify events on pending/, in_progress/, failed/ and done/
+keep it up to date. Counts, the queue a job is in and, once read, a job's
+URL are dictionary lookups. Ordered job lists are sorted lazily, only after
+a queue has changed.
+
+There is no background thread: every accessor first drains whatever events
+are waiting on the (non-blocking) inotify descriptor. Where inotify is not
+available, or a queue directory does not exist yet, that queue falls back to
+a stat() of the directory and a rescan only when its mtime moved.
+
+Listeners (add_listener) hear about every change as it is applied, which
+lets the worker keep a priority heap without ever re-listing pending/.
+A job file rewritten in place (rename over the same name) is reported as
+"update": inotify sees the rename, the mtime fallback a new inode number
+under a name it already had (scandir reports those without a stat()).
+"""
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import os
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set
+
+from .fs import Job, read_job_url
+
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_MOVE_SELF = 0x00000800
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_NONBLOCK = os.O_NONBLOCK
+_IN_CLOEXEC = os.O_CLOEXEC
+_WATCH_MASK = _IN_CREATE | _IN_DELETE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_DELETE_SELF | _IN_MOVE_SELF
+_EVENT = struct.Struct("iIII")
+
+# Directory mtimes this close to "now" may still change within the same
+# timestamp tick on coarse filesystems; rescan again next time to be safe.
+_MTIME_SETTLE_NS = 2_000_000_000
+
+
+def _is_job_name(name: str) -> bool:
+    # Dot-files are in-flight writes (enqueue writes .<id>.tmp then renames).
+    return name.endswith(".job") and not name.startswith(".")
+
+
+class _Inotify:
+    def __init__(self) -> None:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+    def add_watch(self, path: Path) -> int:
+        wd = self._add_watch(self.fd, os.fsencode(str(path)), _WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed: {path}")
+        return wd
+
+    def read_events(self) -> List[tuple]:
+        events = []
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return events
+            pos = 0
+            while pos < len(data):
+                wd, mask, _cookie, length = _EVENT.unpack_from(data, pos)
+                pos += _EVENT.size
+                name = data[pos : pos + length].rstrip(b"\0").decode("utf-8", "surrogateescape")
+                pos += length
+                events.append((wd, mask, name))
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class QueueState:
+    def __init__(self, queues: Dict[str, Path], use_inotify: bool = True) -> None:
+        self.queues = dict(queues)
+        self._lock = threading.RLock()
+        self._jobs: Dict[str, Set[str]] = {name: set() for name in self.queues}
+        self._sorted: Dict[str, Optional[List[str]]] = {name: None for name in self.queues}
+        self._where: Dict[str, str] = {}
+        self._urls: Dict[str, str] = {}
+        self._mtimes: Dict[str, Optional[int]] = {name: None for name in self.queues}
+        self._inodes: Dict[str, Dict[str, int]] = {name: {} for name in self.queues}
+        self._watches: Dict[int, str] = {}
+        self._generation = 0
+        self._listeners: List[Callable[[str, str, str], None]] = []
+        self._inotify: Optional[_Inotify] = None
+        if use_inotify:
+            try:
+                self._inotify = _Inotify()
+            except (OSError, AttributeError):
+                self._inotify = None
+        with self._lock:
+            for name in self.queues:
+                self._attach(name)
+
+    @property
+    def watching(self) -> bool:
+        return self._inotify is not None
+
+    def close(self) -> None:
+        with self._lock:
+            if self._inotify is not None:
+                self._inotify.close()
+                self._inotify = None
+                self._watches.clear()
+
+    def add_listener(self, callback: Callable[[str, str, str], None]) -> None:
+        """callback(queue, job_id, event) with event in add/remove/update.
+
+        Called with the state lock held, from whichever thread triggered the
+        sync: keep it cheap (e.g. note the job id and return).
+        """
+        with self._lock:
+            self._listeners.append(callback)
+
+    def _notify(self, queue: str, job_id: str, event: str) -> None:
+        for callback in self._listeners:
+            callback(queue, job_id, event)
+
+    # -- keeping current -------------------------------------------------
+
+    def _attach(self, name: str) -> None:
+        """Watch (if possible) then scan one queue directory."""
+        if self._inotify is not None and name not in self._watches.values():
+            try:
+                self._watches[self._inotify.add_watch(self.queues[name])] = name
+            except OSError:
+                pass
+        self._rescan(name)
+
+    def _rescan(self, name: str) -> None:
+        path = self.queues[name]
+        try:
+            st = path.stat()
+            with os.scandir(path) as it:
+                inodes = {e.name[: -len(".job")]: e.inode() for e in it if _is_job_name(e.name)}
+        except OSError:
+            st, inodes = None, {}
+        if st is not None and time.time_ns() - st.st_mtime_ns > _MTIME_SETTLE_NS:
+            self._mtimes[name] = st.st_mtime_ns
+        else:
+            self._mtimes[name] = None
+        names = set(inodes)
+        current = self._jobs[name]
+        previous, self._inodes[name] = self._inodes[name], inodes
+        for job_id in current - names:
+            self._discard(name, job_id)
+        for job_id in names - current:
+            self._add(name, job_id)
+        for job_id in names & current:
+            if job_id in previous and previous[job_id] != inodes[job_id]:
+                self._notify(name, job_id, "update")
+
+    def _add(self, name: str, job_id: str) -> None:
+        jobs = self._jobs[name]
+        if job_id in jobs:
+            self._notify(name, job_id, "update")
+            return
+        jobs.add(job_id)
+        self._where[job_id] = name
+        self._sorted[name] = None
+        self._generation += 1
+        self._notify(name, job_id, "add")
+
+    def _discard(self, name: str, job_id: str) -> None:
+        jobs = self._jobs[name]
+        if job_id not in jobs:
+            return
+        jobs.discard(job_id)
+        if self._where.get(job_id) == name:
+            del self._where[job_id]
+        self._sorted[name] = None
+        self._generation += 1
+        self._notify(name, job_id, "remove")
+
+    def _sync(self) -> None:
+        if self._inotify is not None:
+            for wd, mask, filename in self._inotify.read_events():
+                if mask & _IN_Q_OVERFLOW:
+                    for name in self.queues:
+                        self._rescan(name)
+                    continue
+                name = self._watches.get(wd)
+                if name is None:
+                    continue
+                if mask & (_IN_IGNORED | _IN_DELETE_SELF | _IN_MOVE_SELF):
+                    # Directory removed or replaced: drop the watch, re-attach below.
+                    self._watches.pop(wd, None)
+                    continue
+                if not _is_job_name(filename):
+                    continue
+                job_id = filename[: -len(".job")]
+                if mask & (_IN_CREATE | _IN_MOVED_TO):
+                    self._add(name, job_id)
+                elif mask & (_IN_DELETE | _IN_MOVED_FROM):
+                    self._discard(name, job_id)
+
+        watched = set(self._watches.values())
+        for name, path in self.queues.items():
+            if name in watched:
+                continue
+            if self._inotify is not None and path.is_dir():
+                self._attach(name)
+                continue
+            try:
+                mtime: Optional[int] = path.stat().st_mtime_ns
+            except OSError:
+                mtime = None
+            if mtime is None or mtime != self._mtimes[name]:
+                self._rescan(name)
+
+    # -- queries ---------------------------------------------------------
+
+    @property
+    def generation(self) -> int:
+        """Bumped on every change; cheap to compare for "did anything move?"."""
+        with self._lock:
+            self._sync()
+            return self._generation
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            self._sync()
+            return {name: len(jobs) for name, jobs in self._jobs.items()}
+
+    def job_ids(self, queue: str) -> List[str]:
+        """Job ids in one queue, sorted (same order as fs.list_jobs)."""
+        with self._lock:
+            self._sync()
+            ordered = self._sorted[queue]
+            if ordered is None:
+                ordered = self._sorted[queue] = sorted(self._jobs[queue])
+            return list(ordered)
+
+    def queue_of(self, job_id: str) -> Optional[str]:
+        with self._lock:
+            self._sync()
+            return self._where.get(job_id)
+
+    def job_ids_by_queue(self) -> Dict[str, str]:
+        """job_id -> queue name for every queued job."""
+        with self._lock:
+            self._sync()
+            return dict(self._where)
+
+    def path_of(self, job_id: str) -> Optional[Path]:
+        queue = self.queue_of(job_id)
+        return self.queues[queue] / f"{job_id}.job" if queue else None
+
+    def url(self, job_id: str) -> str:
+        # A job id is the sha1 of its URL, so a URL once read never changes.
+        with self._lock:
+            cached = self._urls.get(job_id)
+        if cached is not None:
+            return cached
+        path = self.path_of(job_id)
+        url = read_job_url(path) if path else ""
+        if url:
+            with self._lock:
+                self._urls[job_id] = url
+        return url
+
+    def job(self, job_id: str) -> Optional[Job]:
+        queue = self.queue_of(job_id)
+        if queue is None:
+            return None
+        path = self.queues[queue] / f"{job_id}.job"
+        try:
+            mtime = path.stat().st_mtime
+        except OSError:
+            mtime = 0.0
+        return Job(job_id=job_id, path=path, url=self.url(job_id), mtime=mtime, queue=queue)
+
+    def jobs(self, queue: str, limit: Optional[int] = None) -> List[Job]:
+        """Job records for the first `limit` jobs of a queue (stat + URL per job)."""
+        ids = self.job_ids(queue)
+        if limit is not None:
+            ids = ids[:limit]
+        return [job for job in (self.job(job_id) for job_id in ids) if job is not None]
@@ -0,0 +1,268 @@
+"""Rate limiter shared by every process that talks to Bandcamp.
+
+State lives in one JSON file (cache/ratelimit.json) guarded by flock, so the
+worker's slots, sync.sh and the collection fetcher all draw from the same
+buckets without a daemon. Each host class has:
+
+- a token bucket (requests per second, ~1s of burst),
+- a cap on concurrent leases (open downloads / connections), with leases
+  tied to a pid and an expiry so a crashed holder cannot leak its slot;
+  a live holder renews its leases in the background, so a download that
+  outlasts the expiry keeps its slot,
+- AIMD pacing: a 429/503 halves the rate (and honours Retry-After), a run of
+  successes adds back a tenth of the ceiling, and so does each quiet minute
+  without pushback (so a rate cut hours ago does not stick).
+
+Hosts are grouped as "bandcamp.com" (*.bandcamp.com) and "bcbits.com" (the
+CDN); anything else gets its own bucket with the bandcamp limits.
+"""
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, ContextManager, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from .config import Settings
+from .fs import locked_json, pid_alive
+from .failures import throttled
+
+BANDCAMP = "bandcamp.com"
+CDN = "bcbits.com"
+
+_DECREASE = 0.5
+_INCREASE_AFTER = 10
+_MIN_RPS_FRACTION = 0.1
+_QUIET_S = 60.0
+_LEASE_TTL_S = 600.0
+_RENEW_S = 60.0
+_POLL_S = 0.25
+
+
+@dataclass(frozen=True)
+class HostLimits:
+    max_rps: float
+    max_connections: int
+
+
+@dataclass
+class Lease:
+    host: str
+    lease_id: str
+    status: Optional[int] = None
+    retry_after: Optional[float] = None
+
+
+def host_key(url_or_host: str) -> str:
+    host = urlsplit(url_or_host).hostname if "://" in url_or_host else url_or_host.split(":")[0]
+    host = (host or "").lower()
+    for suffix in (BANDCAMP, CDN):
+        if host == suffix or host.endswith("." + suffix):
+            return suffix
+    return host or BANDCAMP
+
+
+class RateLimiter:
+    def __init__(self, state_path: Path, settings: Settings) -> None:
+        self.state_path = Path(state_path)
+        self.limits = {
+            BANDCAMP: HostLimits(settings.rate_bandcamp_rps, settings.conn_bandcamp),
+            CDN: HostLimits(settings.rate_cdn_rps, settings.conn_cdn),
+        }
+        # Leases this limiter holds, renewed by _keepalive until released.
+        self._held: Dict[str, str] = {}
+        self._held_lock = threading.Lock()
+        self._keeper: Optional[threading.Thread] = None
+
+    def _limits(self, host: str) -> HostLimits:
+        return self.limits.get(host, self.limits[BANDCAMP])
+
+    def _state(self) -> ContextManager[Dict[str, Any]]:
+        return locked_json(self.state_path)
+
+    def _bucket(self, state: Dict[str, Any], host: str, now: float) -> Dict[str, Any]:
+        limits = self._limits(host)
+        bucket = state.setdefault(host, {})
+        bucket.setdefault("rate", limits.max_rps)
+        bucket.setdefault("tokens", 1.0)
+        bucket.setdefault("updated", now)
+        bucket.setdefault("successes", 0)
+        bucket.setdefault("cooldown_until", 0.0)
+        bucket.setdefault("throttled_at", 0.0)
+        bucket.setdefault("leases", {})
+        # Settings may have been lowered since the state was written.
+        bucket["rate"] = min(bucket["rate"], limits.max_rps)
+        capacity = max(1.0, bucket["rate"])
+        elapsed = max(0.0, now - bucket["updated"])
+        if now - bucket["throttled_at"] > _QUIET_S:
+            bucket["rate"] = min(limits.max_rps, bucket["rate"] + limits.max_rps / 10 * elapsed / _QUIET_S)
+        bucket["tokens"] = min(capacity, bucket["tokens"] + elapsed * bucket["rate"])
+        bucket["updated"] = now
+        bucket["leases"] = {
+            lease_id: lease
+            for lease_id, lease in bucket["leases"].items()
+            if lease["expires"] > now and pid_alive(lease["pid"])
+        }
+        return bucket
+
+    def _try_acquire(self, host: str, hold: bool) -> Tuple[Optional[Lease], float]:
+        now = time.time()
+        with self._state() as state:
+            bucket = self._bucket(state, host, now)
+            if now < bucket["cooldown_until"]:
+                return None, bucket["cooldown_until"] - now
+            if hold and len(bucket["leases"]) >= self._limits(host).max_connections:
+                return None, _POLL_S
+            if bucket["tokens"] < 1.0:
+                return None, (1.0 - bucket["tokens"]) / bucket["rate"]
+            bucket["tokens"] -= 1.0
+            lease = Lease(host=host, lease_id=f"{os.getpid()}:{uuid.uuid4().hex[:8]}")
+            if hold:
+                bucket["leases"][lease.lease_id] = {"pid": os.getpid(), "expires": now + _LEASE_TTL_S}
+                self._hold(lease)
+            return lease, 0.0
+
+    def _hold(self, lease: Lease) -> None:
+        with self._held_lock:
+            self._held[lease.lease_id] = lease.host
+            if self._keeper is None or not self._keeper.is_alive():
+                self._keeper = threading.Thread(target=self._keepalive, name="ratelimit-keepalive", daemon=True)
+                self._keeper.start()
+
+    def _keepalive(self) -> None:
+        while True:
+            time.sleep(_RENEW_S)
+            with self._held_lock:
+                held = dict(self._held)
+                if not held:
+                    self._keeper = None
+                    return
+            now = time.time()
+            with self._state() as state:
+                for lease_id, host in held.items():
+                    entry = state.get(host, {}).get("leases", {}).get(lease_id)
+                    if entry is not None:
+                        entry["expires"] = now + _LEASE_TTL_S
+
+    def acquire(
+        self,
+        host: str,
+        hold: bool = True,
+        timeout: Optional[float] = None,
+        cancel: Optional[threading.Event] = None,
+    ) -> Optional[Lease]:
+        """Wait for a token (and, with hold, a connection slot) for host.
+
+        Returns None if `timeout` passes or `cancel` is set first.
+        """
+        host = host_key(host)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            lease, wait_s = self._try_acquire(host, hold)
+            if lease is not None:
+                return lease
+            if deadline is not None:
+                wait_s = min(wait_s, deadline - time.monotonic())
+                if wait_s <= 0:
+                    return None
+            if cancel is not None:
+                if cancel.wait(wait_s):
+                    return None
+            else:
+                time.sleep(wait_s)
+
+    def release(self, lease: Lease) -> None:
+        """Free the connection slot and feed lease.status back into the pacing."""
+        with self._held_lock:
+            self._held.pop(lease.lease_id, None)
+        with self._state() as state:
+            bucket = self._bucket(state, lease.host, time.time())
+            bucket["leases"].pop(lease.lease_id, None)
+            self._feedback(bucket, lease.host, lease.status, lease.retry_after)
+
+    def report(self, host: str, status: Optional[int], retry_after: Optional[float] = None) -> None:
+        host = host_key(host)
+        with self._state() as state:
+            self._feedback(self._bucket(state, host, time.time()), host, status, retry_after)
+
+    def _feedback(self, bucket: Dict[str, Any], host: str, status: Optional[int], retry_after: Optional[float]) -> None:
+        limits = self._limits(host)
+        if status in (429, 503):
+            # Multiplicative decrease, and nobody sends until the server's window is over.
+            bucket["rate"] = max(limits.max_rps * _MIN_RPS_FRACTION, bucket["rate"] * _DECREASE)
+            bucket["tokens"] = min(bucket["tokens"], 0.0)
+            bucket["successes"] = 0
+            bucket["throttled_at"] = time.time()
+            pause = retry_after if retry_after else 1.0 / bucket["rate"]
+            bucket["cooldown_until"] = max(bucket["cooldown_until"], time.time() + pause)
+        elif status is not None and status < 400:
+            bucket["successes"] += 1
+            if bucket["successes"] >= _INCREASE_AFTER:
+                # Additive increase back towards the configured ceiling.
+                bucket["rate"] = min(limits.max_rps, bucket["rate"] + limits.max_rps / 10)
+                bucket["successes"] = 0
+
+    def interval(self, host: str) -> float:
+        """Seconds between requests at the current pace (for yt-dlp --sleep-requests)."""
+        host = host_key(host)
+        with self._state() as state:
+            return 1.0 / self._bucket(state, host, time.time())["rate"]
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        now = time.time()
+        with self._state() as state:
+            for host in list(state) + [h for h in self.limits if h not in state]:
+                self._bucket(state, host, now)
+            return {
+                host: {
+                    "rate": round(bucket["rate"], 3),
+                    "max_rps": self._limits(host).max_rps,
+                    "connections": len(bucket["leases"]),
+                    "max_connections": self._limits(host).max_connections,
+                    "cooling_down_s": round(max(0.0, bucket["cooldown_until"] - now), 1),
+                }
+                for host, bucket in state.items()
+            }
+
+    @contextmanager
+    def slot(self, host: str, cancel: Optional[threading.Event] = None) -> Iterator[Optional[Lease]]:
+        """`with limiter.slot(url) as lease:` ... set lease.status; released on exit."""
+        lease = self.acquire(host, cancel=cancel)
+        try:
+            yield lease
+        finally:
+            if lease is not None:
+                self.release(lease)
+
+
+def run_limited(limiter: RateLimiter, host: str, cmd: List[str]) -> int:
+    """Run cmd holding a connection slot for host (for the shell stages).
+
+    stderr is passed through and scanned for 429/503 to feed the pacing;
+    BANDCAMPSYNC_SLEEP_REQUESTS carries the current pace to the command.
+    yt-dlp does not read it, so a yt-dlp command also gets --sleep-requests.
+    """
+    with limiter.slot(host) as lease:
+        pace = f"{limiter.interval(host):.2f}"
+        env = dict(os.environ, BANDCAMPSYNC_SLEEP_REQUESTS=pace)
+        if cmd and os.path.basename(cmd[0]) == "yt-dlp" and "--sleep-requests" not in cmd:
+            cmd = [cmd[0], "--sleep-requests", pace] + cmd[1:]
+        proc = subprocess.Popen(cmd, stderr=subprocess.PIPE, text=True, errors="replace", env=env)
+        lines: List[str] = []
+        for line in proc.stderr:
+            sys.stderr.write(line)
+            lines.append(line)
+            del lines[:-50]
+        returncode = proc.wait()
+        if throttled(lines):
+            lease.status = 429
+        elif returncode == 0:
+            lease.status = 200
+    return returncode
@@ -0,0 +1,213 @@
+"""Per-job retry bookkeeping and the retry stage.
+
+Failed jobs carry their retry state in the job file, after the URL line:
+
+    https://artist.bandcamp.com/album/name
+    ATTEMPTS=3
+    LAST_ERROR=download_one.sh exited rc=1
+    NEXT_ELIGIBLE=2026-01-01T12:34:56+00:00
+    FAILURE_KIND=transient
+
+Each transient failure pushes NEXT_ELIGIBLE out by an exponentially growing, jittered
+delay, so a batch that failed together (e.g. rate limited) is spread out
+instead of retried in lockstep. The retry stage only requeues jobs whose
+window has passed; the worker skips pending jobs that are not yet eligible.
+Auth-blocked jobs (see failures.py) remember a digest of the cookies they
+failed with (COOKIES=) and are requeued once cookies.txt holds different
+cookies; dead jobs only when named explicitly. Its mtime is no use there:
+yt-dlp writes the jar back after every run.
+
+Requeued jobs go back to pending/ as PRIORITY=retry (behind new purchases),
+or PRIORITY=manual when retried by hand (see priority.py).
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import random
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from .config import Paths, Settings
+from .failures import AUTH, TRANSIENT, Failure
+from .fs import ensure_dirs, read_job_file, write_job_file
+from .logs import append_entries
+from .priority import MANUAL, RETRY, stamp
+
+ATTEMPTS = "ATTEMPTS"
+LAST_ERROR = "LAST_ERROR"
+NEXT_ELIGIBLE = "NEXT_ELIGIBLE"
+FAILURE_KIND = "FAILURE_KIND"
+COOKIES = "COOKIES"
+
+
+@dataclass(frozen=True)
+class RetryResult:
+    requeued: List[str]
+    waiting: int
+
+
+def _format_ts(epoch: float) -> str:
+    return datetime.fromtimestamp(epoch, timezone.utc).astimezone().isoformat(timespec="seconds")
+
+
+def next_eligible(meta: Dict[str, str]) -> float:
+    """Epoch seconds after which the job may run again (0 = now)."""
+    value = meta.get(NEXT_ELIGIBLE)
+    if not value:
+        return 0.0
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        return 0.0
+
+
+def attempts(meta: Dict[str, str]) -> int:
+    try:
+        return int(meta.get(ATTEMPTS, "0"))
+    except ValueError:
+        return 0
+
+
+def backoff_delay(attempt: int, base_s: float, max_s: float) -> float:
+    # "Equal jitter": half of the exponential step is fixed, half random.
+    step = min(max_s, base_s * (2 ** max(0, attempt - 1)))
+    return step / 2 + random.uniform(0, step / 2)
+
+
+def cookies_digest(path: Path) -> str:
+    """Digest of the cookies in a cookies.txt, "" if unreadable.
+
+    Comments and line order are left out, so yt-dlp saving the same jar
+    back does not count as new cookies.
+    """
+    try:
+        text = path.read_text(encoding="utf-8", errors="replace")
+    except OSError:
+        return ""
+    lines = sorted(line.strip() for line in text.splitlines()
+                   if line.strip() and (not line.startswith("#") or line.startswith("#HttpOnly_")))
+    return hashlib.sha1("\n".join(lines).encode("utf-8")).hexdigest()
+
+
+def record_failure(job_path: Path, failure: Failure, settings: Settings, now: Optional[float] = None,
+                   cookies: Optional[Path] = None) -> Dict[str, str]:
+    """Bump ATTEMPTS and store the error; transient failures also get a
+    NEXT_ELIGIBLE backoff window, auth failures the digest of `cookies`.
+    Returns the new metadata."""
+    url, meta = read_job_file(job_path)
+    count = attempts(meta) + 1
+    meta[ATTEMPTS] = str(count)
+    # One line per key: keep the error on one line.
+    meta[LAST_ERROR] = " ".join(failure.reason.split())[:500]
+    meta[FAILURE_KIND] = failure.kind
+    if failure.kind == TRANSIENT:
+        eligible_at = (time.time() if now is None else now) + backoff_delay(
+            count, settings.retry_base_s, settings.retry_max_s
+        )
+        meta[NEXT_ELIGIBLE] = _format_ts(eligible_at)
+    else:
+        meta.pop(NEXT_ELIGIBLE, None)
+    if failure.kind == AUTH and cookies is not None:
+        meta[COOKIES] = cookies_digest(cookies)
+    write_job_file(job_path, url, meta)
+    return meta
+
+
+def requeue(job_path: Path, dest_queue: Path, clear_backoff: bool = True, priority: Optional[str] = None) -> Path:
+    """Move a job to dest_queue; a manual requeue makes it eligible at once.
+
+    ATTEMPTS and LAST_ERROR are kept so the next failure backs off further.
+    With a priority, the job is re-stamped as enqueued now in that class.
+    """
+    dest_queue.mkdir(parents=True, exist_ok=True)
+    if clear_backoff or priority:
+        url, meta = read_job_file(job_path)
+        changed = clear_backoff and meta.pop(NEXT_ELIGIBLE, None) is not None
+        if priority:
+            stamp(meta, priority, time.time())
+            changed = True
+        if changed:
+            write_job_file(job_path, url, meta)
+    dest = dest_queue / job_path.name
+    os.replace(job_path, dest)
+    return dest
+
+
+def _job_paths(queue_path: Path) -> List[Path]:
+    try:
+        with os.scandir(queue_path) as it:
+            names = sorted(e.name for e in it if e.name.endswith(".job") and not e.name.startswith("."))
+    except FileNotFoundError:
+        return []
+    return [queue_path / name for name in names]
+
+
+def _file_mtime(path: Path) -> float:
+    try:
+        return path.stat().st_mtime
+    except OSError:
+        return 0.0
+
+
+def _cookies_changed(job_path: Path, digest: str, cookies: Path) -> bool:
+    _url, meta = read_job_file(job_path)
+    if COOKIES in meta:
+        return bool(digest) and meta[COOKIES] != digest
+    # Blocked before digests were recorded.
+    return _file_mtime(cookies) > _file_mtime(job_path)
+
+
+def retry_failed(paths: Paths, job_ids: Optional[Iterable[str]] = None, now: Optional[float] = None) -> RetryResult:
+    """Requeue failed jobs whose backoff window has passed, and auth-blocked
+    jobs once the cookies have been refreshed.
+
+    With explicit job_ids the window is ignored (manual retry), and the jobs
+    may be in failed/, auth_blocked/ or dead/.
+    """
+    ensure_dirs([paths.failed, paths.pending])
+    now = time.time() if now is None else now
+    forced = job_ids is not None
+    retryable = {"failed": paths.failed, "auth_blocked": paths.auth_blocked, "dead": paths.dead}
+    if forced:
+        candidates = [
+            (queue, path / f"{job_id}.job")
+            for job_id in job_ids
+            for queue, path in retryable.items()
+            if (path / f"{job_id}.job").exists()
+        ]
+    else:
+        candidates = [("failed", job_path) for job_path in _job_paths(paths.failed)]
+        # A job blocked with other cookies than the current ones gets another go.
+        digest = cookies_digest(paths.cookies)
+        candidates += [
+            ("auth_blocked", job_path)
+            for job_path in _job_paths(paths.auth_blocked)
+            if _cookies_changed(job_path, digest, paths.cookies)
+        ]
+
+    rows = [("retry_start", "-", "bandcampctl retry started")]
+    requeued: List[str] = []
+    waiting = 0
+    for queue, job_path in candidates:
+        job_id = job_path.name[: -len(".job")]
+        _url, meta = read_job_file(job_path)
+        if not job_path.exists():
+            continue
+        if not forced and next_eligible(meta) > now:
+            waiting += 1
+            continue
+        try:
+            requeue(job_path, paths.pending, clear_backoff=forced, priority=MANUAL if forced else RETRY)
+        except FileNotFoundError:
+            continue
+        requeued.append(job_id)
+        rows.append(("retry_requeue", job_id, f"moving {queue}->pending attempts={attempts(meta)}"))
+    if not candidates:
+        rows.append(("retry_noop", "-", "no failed jobs found"))
+    rows.append(("retry_end", "-", f"requeued {len(requeued)} jobs, {waiting} still backing off"))
+    append_entries(paths.retry_log, rows)
+    return RetryResult(requeued=requeued, waiting=waiting)
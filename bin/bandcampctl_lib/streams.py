@@ -0,0 +1,149 @@
+"""Parallel fetching of an album's track streams.
+
+yt-dlp downloads an album's tracks one after another, so one long album
+takes the sum of its tracks however fast the link is. After the probe every
+track's stream URL is already in the album's info (with expired ones
+refreshed, see infocache.py), so the network stage fetches them side by
+side instead:
+
+- up to BANDCAMPSYNC_TRACK_PARALLEL (default 4) tracks of an album at once,
+  each holding a connection slot on the shared rate limiter for the CDN
+  host, so all albums in flight together stay within BANDCAMPSYNC_CONN_CDN,
+- over one pooled requests session per download slot, so CDN connections
+  are kept alive across tracks and albums,
+- each into <track id>.<ext> in scratch, the name yt-dlp would have used,
+  through a dot-named .part file that is renamed once complete.
+
+Tracks are keyed by their position in the album, so the post stage numbers
+and tags them in album order whatever order they finished in. A track this
+cannot fetch (no plain HTTP stream, an HTTP error, a short read) is left to
+the yt-dlp fetch that follows.
+"""
+from __future__ import annotations
+
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import IO, Any, Dict, List, Optional, Sequence
+
+from .ratelimit import RateLimiter
+
+_CHUNK = 256 * 1024
+
+
+class StreamError(Exception):
+    pass
+
+
+class StreamFetcher:
+    def __init__(self, limiter: RateLimiter, parallel: int, cancel: Optional[threading.Event] = None) -> None:
+        self.limiter = limiter
+        self.parallel = max(1, parallel)
+        self.cancel = cancel
+        self._session: Any = None
+
+    def _connect(self) -> Any:
+        if self._session is None:
+            import requests
+
+            session = requests.Session()
+            # Room for every track of an album in flight on one host.
+            adapter = requests.adapters.HTTPAdapter(pool_connections=2, pool_maxsize=self.parallel)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update({"User-Agent": "BandcampSync/1.0"})
+            self._session = session
+        return self._session
+
+    def fetch(self, entries: Sequence[Dict[str, Any]], positions: Sequence[int], scratch: Path,
+              err: Optional[IO[str]] = None) -> List[int]:
+        """Fetch the tracks at the given (1-based) positions; returns the ones now in scratch."""
+        err = err or sys.stderr
+        todo = [p for p in positions if 1 <= p <= len(entries) and _stream_url(entries[p - 1])]
+        if not todo:
+            return []
+        scratch.mkdir(parents=True, exist_ok=True)
+
+        def one(position: int) -> Optional[int]:
+            try:
+                self._fetch_one(entries[position - 1], scratch)
+                return position
+            except StreamError as exc:
+                err.write(f"WARNING: track {position}: {exc}; leaving it to yt-dlp\n")
+                return None
+
+        try:
+            self._connect()
+        except ImportError as exc:
+            err.write(f"WARNING: parallel track fetch unavailable ({exc})\n")
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.parallel, len(todo)), thread_name_prefix="track") as pool:
+            done = [p for p in pool.map(one, todo) if p is not None]
+        print(f"⇉ fetched {len(done)}/{len(todo)} tracks, up to {self.parallel} at a time")
+        return done
+
+    def _fetch_one(self, entry: Dict[str, Any], scratch: Path) -> Path:
+        dest = scratch / f"{entry.get('id')}.{entry.get('ext') or 'mp3'}"
+        if dest.is_file() and dest.stat().st_size > 0:
+            # Completed by an earlier attempt (only whole files get this name).
+            return dest
+        url = _stream_url(entry)
+        lease = self.limiter.acquire(url, cancel=self.cancel)
+        if lease is None:
+            raise StreamError("cancelled")
+        part = scratch / f".{dest.name}.part"
+        resp = None
+        try:
+            resp = self._session.get(url, headers=entry.get("http_headers") or {}, stream=True, timeout=60)
+            lease.status = resp.status_code
+            retry_after = resp.headers.get("Retry-After", "")
+            lease.retry_after = float(retry_after) if retry_after.isdigit() else None
+            if resp.status_code != 200:
+                raise StreamError(f"HTTP Error {resp.status_code}")
+            expected = int(resp.headers.get("Content-Length") or 0)
+            with part.open("wb") as out:
+                for chunk in resp.iter_content(_CHUNK):
+                    if self.cancel is not None and self.cancel.is_set():
+                        raise StreamError("cancelled")
+                    out.write(chunk)
+            # Content-Length counts bytes on the wire, which under a
+            # Content-Encoding are not the decoded bytes written out.
+            received = resp.raw.tell()
+            if expected and received != expected:
+                raise StreamError(f"IncompleteRead ({received} of {expected} bytes)")
+            os.replace(part, dest)
+            return dest
+        except StreamError:
+            _unlink(part)
+            raise
+        except Exception as exc:
+            # requests' connection errors, timeouts, disk errors
+            _unlink(part)
+            raise StreamError(f"download failed: {exc}") from exc
+        finally:
+            if resp is not None:
+                resp.close()
+            self.limiter.release(lease)
+
+    def close(self) -> None:
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+
+def _stream_url(entry: Dict[str, Any]) -> str:
+    # Only a single progressive HTTP(S) stream; HLS, DASH and merged formats go to yt-dlp.
+    url = entry.get("url") or ""
+    protocol = entry.get("protocol") or url.split(":", 1)[0]
+    if protocol not in ("http", "https") or entry.get("requested_formats"):
+        return ""
+    return url
+
+
+def _unlink(path: Path) -> None:
+    try:
+        path.unlink()
+    except OSError:
+        pass
@@ -8,8 +8,12 @@ from typing import List, Optional, Tuple
 from .actions import append_ctl_log, run_reconcile, run_worker_once
 from .config import Paths, get_paths
 from .diagnostics import collect_warnings
-from .fs import Job, list_jobs, move_job, read_job_contents
+from .fs import Job, read_job_contents
+from .joblog import JobLogIndex
 from .logs import read_entries, tail_lines
+from .priority import MANUAL
+from .queue_state import QueueState
+from .retry import requeue
 from .systemd import list_timers, status_unit
 
 
@@ -25,16 +29,8 @@ class UiState:
     selection: Selection = field(default_factory=Selection)
     log_name: str = "worker"
     message: str = ""
-
-
-def _get_queue_jobs(paths: Paths, queue: str) -> List[Job]:
-    if queue == "pending":
-        return list_jobs(paths.pending, "pending")
-    if queue == "in_progress":
-        return list_jobs(paths.in_progress, "in_progress")
-    if queue == "failed":
-        return list_jobs(paths.failed, "failed")
-    return list_jobs(paths.done, "done")
+    job_index: Optional[JobLogIndex] = None
+    queues: Optional[QueueState] = None
 
 
 def _draw_header(stdscr: "curses._CursesWindow", title: str, width: int) -> None:
@@ -53,36 +49,38 @@ def _clip(text: str, width: int) -> str:
     return text[: width - 3] + "..."
 
 
-def _selected_job(jobs: List[Job], selection: Selection) -> Optional[Job]:
-    if not jobs:
+def _selected_job(state: UiState) -> Optional[Job]:
+    selection = state.selection
+    job_ids = state.queues.job_ids(selection.queue)
+    if not job_ids:
         return None
-    idx = max(0, min(selection.index, len(jobs) - 1))
+    idx = max(0, min(selection.index, len(job_ids) - 1))
     selection.index = idx
-    return jobs[idx]
+    return state.queues.job(job_ids[idx])
+
+
+def _queue_counts(state: UiState) -> str:
+    counts = state.queues.counts()
+    return (
+        f"pending={counts['pending']} in_progress={counts['in_progress']} "
+        f"failed={counts['failed']} done={counts['done']} "
+        f"auth_blocked={counts['auth_blocked']} dead={counts['dead']}"
+    )
 
 
 def _render_queue_view(stdscr: "curses._CursesWindow", paths: Paths, state: UiState) -> None:
     height, width = stdscr.getmaxyx()
-    jobs = _get_queue_jobs(paths, state.selection.queue)
-    pending = len(list_jobs(paths.pending, "pending"))
-    in_progress = len(list_jobs(paths.in_progress, "in_progress"))
-    failed = len(list_jobs(paths.failed, "failed"))
-    done = len(list_jobs(paths.done, "done"))
-
-    header = (
-        f"BandcampSync TUI — Queue View | pending={pending} in_progress={in_progress} "
-        f"failed={failed} done={done}"
-    )
-    _draw_header(stdscr, header, width)
+    _draw_header(stdscr, f"BandcampSync TUI — Queue View | {_queue_counts(state)}", width)
 
     left_width = max(30, width // 2)
     stdscr.addstr(2, 0, f"Queue: {state.selection.queue}")
-    for i, job in enumerate(jobs[: height - 6]):
+    # Only the visible rows are looked up; done/ may hold tens of thousands.
+    for i, job_id in enumerate(state.queues.job_ids(state.selection.queue)[: height - 6]):
         prefix = "> " if i == state.selection.index else "  "
-        line = f"{prefix}{job.job_id} {job.url}"
+        line = f"{prefix}{job_id} {state.queues.url(job_id)}"
         stdscr.addstr(3 + i, 0, _clip(line, left_width - 1))
 
-    selected = _selected_job(jobs, state.selection)
+    selected = _selected_job(state)
     detail_x = left_width + 1
     if selected:
         stdscr.addstr(2, detail_x, f"Job: {selected.job_id}")
@@ -94,8 +92,7 @@ def _render_queue_view(stdscr: "curses._CursesWindow", paths: Paths, state: UiSt
             stdscr.addstr(7 + i, detail_x, _clip(line, width - detail_x - 1))
 
         stdscr.addstr(12, detail_x, "History:")
-        entries = read_entries(paths.worker_log, limit=200)
-        history = [e.raw for e in entries if e.job_id == selected.job_id][-5:]
+        history = [e.raw for e in state.job_index.history(selected.job_id, logs=["worker"], limit=5)]
         for i, line in enumerate(history):
             stdscr.addstr(13 + i, detail_x, _clip(line, width - detail_x - 1))
 
@@ -107,12 +104,7 @@ def _render_logs_view(stdscr: "curses._CursesWindow", paths: Paths, state: UiSta
     height, width = stdscr.getmaxyx()
     _draw_header(stdscr, f"BandcampSync TUI — Log View ({state.log_name})", width)
 
-    log_path = {
-        "worker": paths.worker_log,
-        "reconcile": paths.reconcile_log,
-        "enqueue": paths.enqueue_log,
-        "ctl": paths.ctl_log,
-    }.get(state.log_name, paths.worker_log)
+    log_path = paths.named_logs().get(state.log_name, paths.worker_log)
 
     lines = tail_lines(log_path, limit=height - 4)
     for i, line in enumerate(lines):
@@ -136,8 +128,7 @@ def _render_actions_view(stdscr: "curses._CursesWindow", paths: Paths, state: Ui
         stdscr.addstr(8, 0, _clip(f"Last action: {state.message}", width - 1))
 
     stdscr.addstr(10, 0, "Selection:")
-    jobs = _get_queue_jobs(paths, state.selection.queue)
-    selected = _selected_job(jobs, state.selection)
+    selected = _selected_job(state)
     if selected:
         stdscr.addstr(11, 2, _clip(f"{selected.queue} {selected.job_id} {selected.url}", width - 3))
     else:
@@ -151,12 +142,7 @@ def _render_dashboard_view(stdscr: "curses._CursesWindow", paths: Paths, state:
     height, width = stdscr.getmaxyx()
     _draw_header(stdscr, "BandcampSync Dashboard (read-only by default)", width)
 
-    pending = len(list_jobs(paths.pending, "pending"))
-    in_progress = len(list_jobs(paths.in_progress, "in_progress"))
-    failed = len(list_jobs(paths.failed, "failed"))
-    done = len(list_jobs(paths.done, "done"))
-
-    stdscr.addstr(2, 0, f"Queues: pending={pending} in_progress={in_progress} failed={failed} done={done}")
+    stdscr.addstr(2, 0, f"Queues: {_queue_counts(state)}")
 
     timer = list_timers("bandcamp-sync-reconcile.timer")
     stdscr.addstr(4, 0, "Reconcile timer:")
@@ -173,7 +159,7 @@ def _render_dashboard_view(stdscr: "curses._CursesWindow", paths: Paths, state:
     last_done_line = last_done.raw if last_done else "(no successful downloads yet)"
     stdscr.addstr(14, 0, _clip(f"Last successful download: {last_done_line}", width - 1))
 
-    warnings = collect_warnings(paths)
+    warnings = collect_warnings(paths, state.queues)
     stdscr.addstr(16, 0, "Warnings:")
     if warnings:
         for i, warning in enumerate(warnings[:4]):
@@ -214,23 +200,21 @@ def _handle_action(stdscr: "curses._CursesWindow", paths: Paths, state: UiState,
             result = run_worker_once(paths)
             state.message = f"worker rc={result.returncode}"
     elif action == "retry_failed":
-        jobs = _get_queue_jobs(paths, state.selection.queue)
-        selected = _selected_job(jobs, state.selection)
+        selected = _selected_job(state)
         if not selected or selected.queue != "failed":
             state.message = "select a failed job first"
             return
         if _confirm(stdscr, f"Retry failed job {selected.job_id}?"):
-            move_job(selected, paths.pending)
+            requeue(selected.path, paths.pending, priority=MANUAL)
             append_ctl_log(paths, "ctl_retry", selected.job_id, "failed->pending")
             state.message = f"requeued {selected.job_id}"
     elif action == "requeue":
-        jobs = _get_queue_jobs(paths, state.selection.queue)
-        selected = _selected_job(jobs, state.selection)
+        selected = _selected_job(state)
         if not selected or selected.queue not in {"failed", "in_progress"}:
             state.message = "select failed/in_progress job first"
             return
         if _confirm(stdscr, f"Requeue job {selected.job_id} to pending?"):
-            move_job(selected, paths.pending)
+            requeue(selected.path, paths.pending, priority=MANUAL)
             append_ctl_log(paths, "ctl_requeue", selected.job_id, f"{selected.queue}->pending")
             state.message = f"requeued {selected.job_id}"
 
@@ -299,9 +283,15 @@ def run_tui(dashboard_only: bool = False) -> None:
         curses.curs_set(0)
         stdscr.nodelay(True)
         stdscr.timeout(200)
-        state = UiState(view="dashboard" if dashboard_only else "queue")
+        state = UiState(
+            view="dashboard" if dashboard_only else "queue",
+            job_index=JobLogIndex(paths.joblog_db, paths.named_logs()),
+            queues=QueueState(paths.queues()),
+        )
 
         while True:
+            # Only reads what was appended to the logs since the last frame.
+            state.job_index.refresh()
             stdscr.erase()
             if state.view == "queue":
                 _render_queue_view(stdscr, paths, state)
@@ -0,0 +1,648 @@
+"""Long-running download worker.
+
+Replaces the one-job-per-invocation worker.sh loop with a pool of download
+slots that keep pulling from inbox/pending until the queue drains. Queue
+semantics are unchanged: a job is claimed by moving pending -> in_progress,
+and finishes in done/ or failed/, with the same job_transition log lines.
+
+Every claimed job is leased (leases.py) and a heartbeat thread renews the
+leases while downloads run; the same thread reaps jobs whose owner died.
+
+Downloads and conversions are separate stages. A slot only runs the network
+stage (download.fetch_job, raw audio into scratch) and then puts
+the job on a bounded handoff queue; post-processing threads take it from
+there and convert its tracks on a pool of BANDCAMPSYNC_POST_WORKERS ffmpeg
+processes (default: one per CPU). When that pool falls behind the queue
+fills and slots wait, so neither side runs away from the other.
+
+The network stage runs in this process: each slot keeps one embedded
+YoutubeDL (ytdlp.py) across jobs instead of starting yt-dlp twice per job,
+and one pooled HTTP session for fetching an album's tracks in parallel
+(streams.py).
+Without an importable yt_dlp module the slots fall back to running
+download_one.sh --fetch-only per job.
+
+Slots stop claiming jobs while the music library or scratch filesystem is
+short of space (diskspace.py): an album that does not fit goes back to
+pending without counting as an attempt, and the queue resumes once there
+is room for it. One larger than the free space itself fails instead.
+"""
+from __future__ import annotations
+
+import heapq
+import importlib.util
+import os
+import queue
+import signal
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import IO, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from . import priority
+from .config import Paths, Settings
+from .diskspace import DISK_LOW_EXIT, DiskBudget
+from .download import FETCHED, HANDOFF_NAME, Handoff, fetch_job, postprocess, scratch_for
+from .failures import AUTH, PERMANENT, TRANSIENT, Failure, classify, throttled
+from .fs import ensure_dirs, file_mtime, job_id_for_url, read_collection, read_job_file, read_job_url
+from .leases import reap_expired, release_lease, renew_lease, write_lease
+from .library import LibraryIndex
+from .logs import append_entry
+from .queue_state import QueueState
+from .ratelimit import BANDCAMP, RateLimiter
+from .retry import attempts, next_eligible, record_failure
+from .streams import StreamFetcher
+from .ytdlp import YtDlpEngine
+
+# Albums in post-processing at once; their tracks share the ffmpeg pool.
+_POST_ALBUMS = 2
+
+
+@dataclass(frozen=True)
+class ClaimedJob:
+    job_id: str
+    path: Path
+
+
+class JobSource:
+    """Hands out pending jobs to slots, one claim at a time, in priority order.
+
+    Pending jobs sit in a heap keyed by (priority rank, ENQUEUED_AT, job id):
+    manual requests, then new purchases, then retries, then the backfill,
+    FIFO within a class (see priority.py). The heap is fed by QueueState
+    events, so each job file is read once when it appears (or is rewritten,
+    e.g. by `bandcampctl bump`), not on every pick; a claim is a heap pop.
+    Entries for jobs that have since left pending/ or been re-keyed are
+    dropped lazily when they surface.
+
+    The claim itself is an os.rename into in_progress/: rename is atomic on
+    one filesystem, so when two slots (or two workers) race for the same file
+    exactly one succeeds and the other just pops the next entry.
+
+    Jobs still inside their retry backoff window (NEXT_ELIGIBLE) wait in a
+    second heap keyed by that time and move over once it has passed.
+    """
+
+    def __init__(self, paths: Paths, on_defer: Optional[Callable[[str, Dict[str, str]], None]] = None) -> None:
+        self._paths = paths
+        self._lock = threading.Lock()
+        self._ready: List[Tuple[int, float, str]] = []
+        self._deferred: List[Tuple[float, Tuple[int, float, str]]] = []
+        self._keys: Dict[str, Tuple[int, float, str]] = {}
+        self._dirty: Set[str] = set()
+        self._on_defer = on_defer
+        self._queue = QueueState({"pending": paths.pending})
+        self._queue.add_listener(self._changed)
+        self._dirty.update(self._queue.job_ids("pending"))
+
+    def _changed(self, _queue: str, job_id: str, event: str) -> None:
+        if event == "remove":
+            self._keys.pop(job_id, None)
+            self._dirty.discard(job_id)
+        else:
+            self._dirty.add(job_id)
+
+    def _read(self, job_id: str) -> Optional[Tuple[Tuple[int, float, str], float, Dict[str, str]]]:
+        path = self._paths.pending / f"{job_id}.job"
+        try:
+            mtime = path.stat().st_mtime
+        except OSError:
+            return None
+        _url, meta = read_job_file(path)
+        key = (priority.rank(meta), priority.enqueued_at(meta, mtime), job_id)
+        return key, next_eligible(meta), meta
+
+    def _schedule(self, job_id: str, now: float) -> None:
+        entry = self._read(job_id)
+        if entry is None:
+            self._keys.pop(job_id, None)
+            return
+        key, eligible_at, meta = entry
+        if self._keys.get(job_id) == key:
+            return
+        self._keys[job_id] = key
+        if eligible_at > now:
+            heapq.heappush(self._deferred, (eligible_at, key))
+            if self._on_defer:
+                self._on_defer(job_id, meta)
+        else:
+            heapq.heappush(self._ready, key)
+
+    def _update(self) -> None:
+        # Reading the generation drains pending inotify events into _dirty.
+        self._queue.generation
+        now = time.time()
+        while self._dirty:
+            self._schedule(self._dirty.pop(), now)
+        while self._deferred and self._deferred[0][0] <= now:
+            _eligible_at, key = heapq.heappop(self._deferred)
+            if self._keys.get(key[2]) == key:
+                heapq.heappush(self._ready, key)
+
+    def claim(self) -> Optional[ClaimedJob]:
+        with self._lock:
+            self._update()
+            while self._ready:
+                key = heapq.heappop(self._ready)
+                job_id = key[2]
+                if self._keys.get(job_id) != key:
+                    continue
+                del self._keys[job_id]
+                name = f"{job_id}.job"
+                dest = self._paths.in_progress / name
+                try:
+                    os.rename(self._paths.pending / name, dest)
+                except FileNotFoundError:
+                    continue
+                return ClaimedJob(job_id=job_id, path=dest)
+        return None
+
+    def deferred(self) -> bool:
+        """Whether a job in pending/ is waiting out its backoff window."""
+        with self._lock:
+            self._update()
+            return any(self._keys.get(key[2]) == key for _eligible_at, key in self._deferred)
+
+    def close(self) -> None:
+        self._queue.close()
+
+
+def _tee_stderr(stream: IO[str], tail: Deque[str]) -> None:
+    # Pass stderr through (journal) while keeping the last lines to classify.
+    for line in stream:
+        sys.stderr.write(line)
+        tail.append(line)
+    stream.close()
+
+
+class _StderrTail:
+    """stderr for an in-process download: passed through, last lines kept."""
+
+    def __init__(self) -> None:
+        self.lines: Deque[str] = deque(maxlen=50)
+
+    def write(self, text: str) -> int:
+        sys.stderr.write(text)
+        self.lines.extend(line for line in text.splitlines() if line.strip())
+        return len(text)
+
+    def flush(self) -> None:
+        sys.stderr.flush()
+
+
+def _terminate(proc: subprocess.Popen) -> None:
+    if proc.poll() is not None:
+        return
+    try:
+        os.killpg(proc.pid, signal.SIGTERM)
+    except OSError:
+        pass
+
+
+class Worker:
+    def __init__(
+        self,
+        paths: Paths,
+        settings: Settings,
+        slots: Optional[int] = None,
+        once: bool = False,
+        idle_exit_s: Optional[float] = None,
+    ) -> None:
+        self.paths = paths
+        self.settings = settings
+        self.slots = 1 if once else max(1, slots or settings.worker_slots)
+        self.once = once
+        self.idle_exit_s = settings.worker_idle_exit_s if idle_exit_s is None else idle_exit_s
+        self.source = JobSource(paths, on_defer=self._log_deferred)
+        self.library = LibraryIndex(paths.library_db, paths.music)
+        self.limiter = RateLimiter(paths.ratelimit_state, settings)
+        self.disk = DiskBudget(paths, settings)
+        self._disk_low = False
+        self._collection_mtime: Optional[float] = None
+        self._collection: Dict[str, Tuple[str, str]] = {}
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._procs: Dict[str, subprocess.Popen] = {}
+        self._leases: Dict[str, Tuple[ClaimedJob, float]] = {}
+        self._handoffs: "queue.Queue[Optional[Tuple[ClaimedJob, Handoff]]]" = queue.Queue(maxsize=settings.post_queue)
+        # Each conversion task is one ffmpeg process, so this caps concurrent ffmpegs.
+        self._converters = ThreadPoolExecutor(max_workers=settings.post_workers, thread_name_prefix="ffmpeg")
+        self._embedded = importlib.util.find_spec("yt_dlp") is not None
+        self._engines = threading.local()
+        self._slots_done = threading.Event()
+        self._active = 0
+        self._processed = 0
+        self._last_activity = time.monotonic()
+
+    def log(self, action: str, job_id: str = "-", detail: str = "") -> None:
+        append_entry(self.paths.worker_log, action, job_id, detail)
+
+    def _log_deferred(self, job_id: str, meta: Dict[str, str]) -> None:
+        self.log("job_deferred", job_id, f"backing off until {meta.get('NEXT_ELIGIBLE')} attempts={attempts(meta)}")
+
+    def fail(self, job: ClaimedJob, failure: Failure) -> None:
+        # Transient -> failed/ (retried after backoff), auth -> auth_blocked/
+        # (retried after new cookies), permanent -> dead/ (manual only).
+        queue = {TRANSIENT: "failed", AUTH: "auth_blocked", PERMANENT: "dead"}[failure.kind]
+        if not job.path.exists():
+            self._lost(job)
+            return
+        # Record the reason (and retry window) before the job becomes visible there.
+        meta = record_failure(job.path, failure, self.settings, cookies=self.paths.cookies)
+        if not self.transition(job, self.paths.queues()[queue], f"in_progress->{queue}"):
+            return
+        detail = f"kind={failure.kind} attempts={attempts(meta)}"
+        if failure.kind == TRANSIENT:
+            detail += f" next_eligible={meta.get('NEXT_ELIGIBLE')}"
+        self.log("job_failure", job.job_id, f"{detail} reason={meta.get('LAST_ERROR')}")
+
+    def transition(self, job: ClaimedJob, dest_queue: Path, detail: str) -> bool:
+        dest_queue.mkdir(parents=True, exist_ok=True)
+        try:
+            os.replace(job.path, dest_queue / job.path.name)
+        except FileNotFoundError:
+            self._lost(job)
+            return False
+        self._drop_lease(job)
+        self.log("job_transition", job.job_id, detail)
+        return True
+
+    def _lost(self, job: ClaimedJob) -> None:
+        # Reaped while we held it (e.g. the process was suspended past the
+        # lease): it is someone else's job now, leave it where it is.
+        self._drop_lease(job, release=False)
+        self.log("job_lost", job.job_id, "no longer in in_progress (lease reclaimed)")
+
+    # -- leases ----------------------------------------------------------
+
+    def _take_lease(self, job: ClaimedJob) -> None:
+        lease = write_lease(self.paths, job.job_id, self.settings.lease_ttl_s)
+        with self._lock:
+            self._leases[job.job_id] = (job, lease.claimed_at)
+
+    def _drop_lease(self, job: ClaimedJob, release: bool = True) -> None:
+        with self._lock:
+            self._leases.pop(job.job_id, None)
+        if release:
+            release_lease(self.paths, job.job_id)
+        # The album's disk reservation ends with the job, wherever it went.
+        try:
+            self.disk.release(job.job_id)
+        except OSError as exc:
+            self.log("disk_error", job.job_id, str(exc))
+
+    def _heartbeat_loop(self) -> None:
+        # Renew at a third of the TTL so two missed beats still leave a margin.
+        interval = self.settings.lease_ttl_s / 3
+        while not self._slots_done.wait(interval):
+            with self._lock:
+                held = list(self._leases.values())
+            for job, claimed_at in held:
+                # Only while the lease is still ours; a reaped job's slot finds
+                # out when it tries to move the job (_lost).
+                renew_lease(self.paths, job.job_id, self.settings.lease_ttl_s, claimed_at)
+            self.reap()
+
+    def reap(self) -> List[str]:
+        # Our own jobs hold live, renewed leases, so only other owners' lapse.
+        return reap_expired(self.paths, self.settings.lease_ttl_s, self.log)
+
+    def _collection_meta(self, job_id: str) -> Tuple[str, str]:
+        # (artist, title) from collection.json, reloaded only when the file changes.
+        with self._lock:
+            mtime = file_mtime(self.paths.collection)
+            if mtime != self._collection_mtime:
+                self._collection = {
+                    job_id_for_url(item["item_url"]): (item.get("band_name", ""), item.get("item_title", ""))
+                    for item in read_collection(self.paths.collection)
+                    if item.get("item_url")
+                }
+                self._collection_mtime = mtime
+            return self._collection.get(job_id, ("", ""))
+
+    def already_have(self, job: ClaimedJob) -> Optional[str]:
+        url = read_job_url(job.path)
+        if not url:
+            return None
+        artist, title = self._collection_meta(job.job_id)
+        try:
+            self.library.refresh_if_stale(60.0)
+            return self.library.lookup(url, artist, title)
+        except Exception as exc:
+            # The index is an optimization; download_one.sh still checks on its own.
+            self.log("library_error", job.job_id, str(exc))
+            return None
+
+    def stop(self, *_args: object) -> None:
+        self._stop.set()
+        with self._lock:
+            procs = list(self._procs.values())
+        for proc in procs:
+            _terminate(proc)
+
+    def run(self) -> int:
+        ensure_dirs(self.paths.queues().values())
+        self.log(
+            "worker_start",
+            "-",
+            f"worker started slots={self.slots} post_workers={self.settings.post_workers} "
+            f"engine={'embedded' if self._embedded else 'download_one.sh'} pid={os.getpid()}",
+        )
+        if self.slots > self.settings.conn_bandcamp:
+            # Each album in flight holds one bandcamp.com connection (see _process).
+            self.log(
+                "worker_config", "-",
+                f"slots={self.slots} > BANDCAMPSYNC_CONN_BANDCAMP={self.settings.conn_bandcamp}; "
+                f"only {self.settings.conn_bandcamp} albums download at once",
+            )
+
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, self.stop)
+            signal.signal(signal.SIGINT, self.stop)
+
+        # Jobs orphaned by a previous worker go back to pending/ before we start.
+        self.reap()
+        heartbeat = threading.Thread(target=self._heartbeat_loop, name="heartbeat", daemon=True)
+        heartbeat.start()
+        post_threads = [
+            threading.Thread(target=self._post_loop, name=f"post-{i}", daemon=True)
+            for i in range(_POST_ALBUMS)
+        ]
+        for thread in post_threads:
+            thread.start()
+        threads = [
+            threading.Thread(target=self._slot_loop, name=f"slot-{i}", daemon=True)
+            for i in range(self.slots)
+        ]
+        for thread in threads:
+            thread.start()
+        _join(threads)
+        # Slots are done; let the post stage drain what was handed off.
+        for _ in post_threads:
+            self._handoffs.put(None)
+        _join(post_threads)
+        self._converters.shutdown(wait=True)
+        self._slots_done.set()
+        heartbeat.join(timeout=5)
+        self.source.close()
+
+        if self.once and self._processed == 0:
+            self.log("worker_noop", "-", "no pending jobs")
+        self.log("worker_end", "-", f"worker exited processed={self._processed}")
+        return 0
+
+    def _idle_expired(self) -> bool:
+        if self.idle_exit_s <= 0:
+            return False
+        with self._lock:
+            if self._active or time.monotonic() - self._last_activity < self.idle_exit_s:
+                return False
+        # A job in backoff still keeps pending/*.job, so the .path unit would
+        # start us again at once: stay and claim it once it is eligible.
+        return not self.source.deferred()
+
+    def _finished(self) -> None:
+        with self._lock:
+            self._active -= 1
+            self._processed += 1
+            self._last_activity = time.monotonic()
+
+    def _slot_loop(self) -> None:
+        try:
+            self._claim_loop()
+        finally:
+            engine = getattr(self._engines, "engine", None)
+            if engine is not None:
+                engine.close()
+            streams = getattr(self._engines, "streams", None)
+            if streams is not None:
+                streams.close()
+
+    def _disk_ok(self) -> bool:
+        """Whether a new job may be claimed; logs each change of the disk state."""
+        try:
+            reason = self.disk.admit()
+        except OSError as exc:
+            self.log("disk_error", "-", str(exc))
+            return True
+        with self._lock:
+            changed = (reason is not None) != self._disk_low
+            self._disk_low = reason is not None
+        if changed and reason is not None:
+            self.log("disk_low", "-", f"not claiming jobs: {reason}")
+        elif changed:
+            self.log("disk_ok", "-", "free space recovered, claiming jobs again")
+        return reason is None
+
+    def _claim_loop(self) -> None:
+        while not self._stop.is_set():
+            if not self._disk_ok():
+                if self.once:
+                    return
+                self._stop.wait(self.settings.worker_poll_s)
+                continue
+            job = self.source.claim()
+            if job is None:
+                if self.once or self._idle_expired():
+                    return
+                self._stop.wait(self.settings.worker_poll_s)
+                continue
+
+            with self._lock:
+                self._active += 1
+            self._take_lease(job)
+            self.log("job_transition", job.job_id, "pending->in_progress")
+            handed_off = False
+            try:
+                handed_off = self._run_job(job)
+            finally:
+                if not handed_off:
+                    self._finished()
+            if self.once:
+                return
+
+    def _run_job(self, job: ClaimedJob) -> bool:
+        """Network stage for one job; True once it is queued for post-processing."""
+        album_dir = self.already_have(job)
+        if album_dir:
+            self.log("job_skip", job.job_id, f"already have: {album_dir}")
+            self.transition(job, self.paths.done, "in_progress->done")
+            return False
+
+        # One connection slot on the shared limiter per album download, so
+        # BANDCAMPSYNC_CONN_BANDCAMP caps albums in flight across every
+        # process (keep it >= the slot count); the current pace is handed to
+        # yt-dlp as --sleep-requests.
+        lease = self.limiter.acquire(BANDCAMP, cancel=self._stop)
+        if lease is None:
+            self.transition(job, self.paths.pending, "in_progress->pending")
+            return False
+        try:
+            returncode, stderr_tail = self._download(job, self.limiter.interval(BANDCAMP))
+            if returncode == 0:
+                lease.status = 200
+            elif throttled(stderr_tail):
+                lease.status = 429
+        finally:
+            self.limiter.release(lease)
+
+        if returncode == DISK_LOW_EXIT:
+            # Not the album's fault: back to pending, and no new claims until
+            # there is room (the reservation that failed recorded disk_low).
+            self.log("disk_low", job.job_id, "no room for this album; back to pending")
+            self.transition(job, self.paths.pending, "in_progress->pending")
+            return False
+        if returncode == 0:
+            handoff = self._load_handoff(job)
+            if handoff is None:
+                self.transition(job, self.paths.done, "in_progress->done")
+                return False
+            # Blocks while the post stage is saturated: that is the backpressure
+            # that keeps slots from piling raw audio into scratch.
+            self.log("job_fetched", job.job_id, f"{len(handoff.raw)} tracks -> post-processing")
+            self._handoffs.put((job, handoff))
+            return True
+        if self._stop.is_set():
+            # Interrupted by shutdown, not a download failure: hand it back.
+            self.transition(job, self.paths.pending, "in_progress->pending")
+        elif returncode is None:
+            self.fail(job, Failure(TRANSIENT, stderr_tail[-1]))
+        else:
+            self.fail(job, classify(returncode, stderr_tail))
+        return False
+
+    def _load_handoff(self, job: ClaimedJob) -> Optional[Handoff]:
+        # No handoff file means the network stage finished the job itself
+        # (already present, or fetched directly from the download page).
+        path = scratch_for(self.settings, job.job_id) / HANDOFF_NAME
+        try:
+            handoff = Handoff.load(path)
+        except (OSError, ValueError, TypeError, KeyError):
+            return None
+        return handoff if handoff.status == FETCHED else None
+
+    def _post_loop(self) -> None:
+        while True:
+            item = self._handoffs.get()
+            if item is None:
+                return
+            job, handoff = item
+            try:
+                if self._stop.is_set():
+                    # Raw tracks stay in scratch; the next attempt reuses them.
+                    self.transition(job, self.paths.pending, "in_progress->pending")
+                    continue
+                returncode, errors = postprocess(
+                    self.paths, self.settings, handoff, executor=self._converters, cancel=self._stop
+                )
+                for line in errors:
+                    sys.stderr.write(line + "\n")
+                if returncode == 0:
+                    self.transition(job, self.paths.done, "in_progress->done")
+                elif self._stop.is_set():
+                    self.transition(job, self.paths.pending, "in_progress->pending")
+                else:
+                    self.fail(job, classify(returncode, errors))
+            except Exception as exc:
+                self.fail(job, Failure(TRANSIENT, f"post-processing error: {exc}"))
+            finally:
+                self._finished()
+
+    def _engine(self) -> Optional[YtDlpEngine]:
+        """This slot's embedded yt-dlp, replaced when the cookies file changes."""
+        engine: Optional[YtDlpEngine] = getattr(self._engines, "engine", None)
+        if engine is not None and engine.stale:
+            engine.close(save_cookies=False)
+            engine = self._engines.engine = None
+        if engine is None and self._embedded:
+            try:
+                engine = self._engines.engine = YtDlpEngine(self.paths.cookies, cancel=self._stop)
+            except ImportError as exc:
+                self._embedded = False
+                self.log("worker_engine", "-", f"yt_dlp not importable ({exc}); running download_one.sh per job")
+        return engine
+
+    def _streams(self) -> Optional[StreamFetcher]:
+        """This slot's parallel track fetcher (one pooled HTTP session); None if disabled."""
+        if self.settings.track_parallel <= 0:
+            return None
+        streams: Optional[StreamFetcher] = getattr(self._engines, "streams", None)
+        if streams is None:
+            # Every slot's tracks share the limiter's CDN connection budget.
+            parallel = min(self.settings.track_parallel, self.settings.conn_cdn)
+            streams = self._engines.streams = StreamFetcher(self.limiter, parallel, cancel=self._stop)
+        return streams
+
+    def _download(self, job: ClaimedJob, sleep_requests: float) -> Tuple[Optional[int], List[str]]:
+        """Network stage for one job; (returncode or None if it could not start, stderr tail)."""
+        engine = self._engine()
+        if engine is None:
+            return self._download_subprocess(job, sleep_requests)
+        tail = _StderrTail()
+        engine.err = tail
+        try:
+            returncode, _handoff = fetch_job(
+                self.paths, self.settings, job.path, f"{sleep_requests:.2f}", engine=engine, err=tail,
+                budget=self.disk, streams=self._streams(),
+            )
+        except Exception as exc:
+            tail.write(f"ERROR: download failed: {exc}\n")
+            returncode = 1
+        finally:
+            engine.err = sys.stderr
+        return returncode, list(tail.lines)
+
+    def _download_subprocess(self, job: ClaimedJob, sleep_requests: float) -> Tuple[Optional[int], List[str]]:
+        """Run download_one.sh --fetch-only; (returncode or None if it could not start, stderr tail)."""
+        cmd = [str(self.paths.stage / "bin" / "download_one.sh"), str(job.path), "--fetch-only"]
+        env = dict(
+            os.environ,
+            BANDCAMPSYNC_SLEEP_REQUESTS=f"{sleep_requests:.2f}",
+            # Disk reservations are held in the worker's name.
+            BANDCAMPSYNC_WORKER_PID=str(os.getpid()),
+        )
+        try:
+            # Own process group so shutdown reaches yt-dlp, not just the wrapper.
+            proc = subprocess.Popen(
+                cmd, start_new_session=True, stderr=subprocess.PIPE, text=True, errors="replace", env=env
+            )
+        except OSError as exc:
+            self.log("job_error", job.job_id, f"could not start download_one.sh: {exc}")
+            return None, [f"could not start download_one.sh: {exc}"]
+        stderr_tail: Deque[str] = deque(maxlen=50)
+        tee = threading.Thread(target=_tee_stderr, args=(proc.stderr, stderr_tail), daemon=True)
+        tee.start()
+
+        with self._lock:
+            self._procs[job.job_id] = proc
+        if self._stop.is_set():
+            _terminate(proc)
+        try:
+            returncode = proc.wait()
+            tee.join(timeout=5)
+        finally:
+            with self._lock:
+                self._procs.pop(job.job_id, None)
+        return returncode, list(stderr_tail)
+
+
+def _join(threads: List[threading.Thread]) -> None:
+    # Join with a timeout so the main thread keeps servicing signals.
+    while any(thread.is_alive() for thread in threads):
+        for thread in threads:
+            thread.join(timeout=0.5)
+
+
+def run_worker(
+    paths: Paths,
+    settings: Settings,
+    slots: Optional[int] = None,
+    once: bool = False,
+    idle_exit_s: Optional[float] = None,
+) -> int:
+    return Worker(paths, settings, slots=slots, once=once, idle_exit_s=idle_exit_s).run()
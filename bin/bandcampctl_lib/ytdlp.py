@@ -0,0 +1,172 @@
+"""yt-dlp embedded in the worker, so a job does not pay for cold starts.
+
+Run as a program, every job costs a bash wrapper, a Python interpreter and
+two `yt-dlp` starts (probe, fetch), each importing the whole extractor
+registry. The worker instead imports `yt_dlp` once and gives each download
+slot one YoutubeDL, with its HTTP connections and cookie jar, for the life
+of the slot. A YoutubeDL keeps per-call options (output template, playlist
+items) in its params, so slots do not share one.
+
+The engine mirrors the two command lines download.py runs:
+
+    probe()       ~ yt-dlp -J --format bestaudio/best --output <template> URL
+    fetch()       ~ yt-dlp --format bestaudio/best --output <template>
+                           [--playlist-items N,M] URL
+    fetch_info()  ~ the same with --no-clean-info-json --load-info-json FILE
+                    instead of URL
+
+and writes yt-dlp's warnings and errors to `err` as the CLI would to stderr,
+so the worker classifies failures from the same lines. A call failed if it
+reported an error, the same rule the CLI's exit status follows;
+YoutubeDL.download()'s own return value sticks at 1 after the first failure
+of the instance's life. The per-call options (output template, playlist
+items, request pacing) are set for the call and put back afterwards.
+
+The engine never writes its cookie jar back to cookies.txt: that file is the
+user's export, and the retry stage and the other slots watch it for
+changes. When it does change (re-exported after an auth block) the engine
+is replaced.
+"""
+from __future__ import annotations
+
+import os
+import sys
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, Any, Dict, Iterator, Optional, Sequence
+
+
+class _Logger:
+    def __init__(self, engine: "YtDlpEngine") -> None:
+        self.engine = engine
+
+    def debug(self, msg: str) -> None:
+        # Screen and progress lines; nobody watches the worker's terminal.
+        pass
+
+    def info(self, msg: str) -> None:
+        pass
+
+    def warning(self, msg: str) -> None:
+        self.engine._emit(msg if msg.startswith("WARNING") else f"WARNING: {msg}")
+
+    def error(self, msg: str) -> None:
+        self.engine._failures += 1
+        self.engine._emit(msg)
+
+
+class YtDlpEngine:
+    def __init__(self, cookies: Path, cancel: Optional[threading.Event] = None) -> None:
+        import yt_dlp
+        from yt_dlp.utils import DownloadCancelled, YoutubeDLError
+
+        self._cancelled = DownloadCancelled
+        self._errors = YoutubeDLError
+        self.cookies = cookies
+        self.cookies_mtime = _mtime(cookies)
+        self.cancel = cancel
+        self.err: IO[str] = sys.stderr
+        self._last = ""
+        self._failures = 0
+        self._ydl = yt_dlp.YoutubeDL({
+            "cookiefile": str(cookies),
+            "format": "bestaudio/best",
+            "quiet": True,
+            "noprogress": True,
+            "logger": _Logger(self),
+            "progress_hooks": [self._progress],
+            # CLI default: a track that fails does not stop the rest of the album.
+            "ignoreerrors": "only_download",
+            # Keep a saved album's "entries" when it is loaded back (fetch_info).
+            "clean_infojson": False,
+        })
+
+    def _emit(self, line: str) -> None:
+        self._last = line.rstrip("\n")
+        self.err.write(self._last + "\n")
+
+    def _failed(self, exc: Exception) -> None:
+        # DownloadError carries the line yt-dlp already reported; do not repeat it.
+        line = str(exc) if str(exc).startswith("ERROR") else f"ERROR: {exc}"
+        if line != self._last:
+            self._emit(line)
+
+    def _progress(self, status: Dict[str, Any]) -> None:
+        if self.cancel is not None and self.cancel.is_set():
+            raise self._cancelled("worker is stopping")
+
+    @property
+    def stale(self) -> bool:
+        """True once the cookies file was replaced since this engine loaded it."""
+        return _mtime(self.cookies) != self.cookies_mtime
+
+    @contextmanager
+    def _call(self, outtmpl: str, sleep_requests: Optional[str], playlist_items: Optional[str]) -> Iterator[None]:
+        """Options for one call, restored afterwards; counts the errors it reports."""
+        params = self._ydl.params
+        options = {
+            "outtmpl": {"default": outtmpl},
+            "playlist_items": playlist_items,
+            "sleep_interval_requests": float(sleep_requests) if sleep_requests else None,
+        }
+        saved = {key: params.get(key) for key in options}
+        params.update(options)
+        self._failures = 0
+        self._last = ""
+        try:
+            yield
+        finally:
+            params.update(saved)
+
+    def probe(self, url: str, outtmpl: str, sleep_requests: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """The release's metadata with each track's "filename", like `yt-dlp -J`; None on failure."""
+        with self._call(outtmpl, sleep_requests, None):
+            try:
+                info = self._ydl.extract_info(url, download=False)
+            except self._errors as exc:
+                self._failed(exc)
+                return None
+            if not info:
+                return None
+            for entry in info.get("entries") or [info]:
+                if entry:
+                    entry["filename"] = self._ydl.prepare_filename(entry)
+            return self._ydl.sanitize_info(info)
+
+    def fetch(self, url: str, outtmpl: str, positions: Optional[Sequence[int]] = None,
+              sleep_requests: Optional[str] = None) -> int:
+        """Download (all or the given playlist positions); the CLI's exit status."""
+        items = ",".join(str(p) for p in positions) if positions else None
+        with self._call(outtmpl, sleep_requests, items):
+            try:
+                self._ydl.download([url])
+            except self._errors as exc:
+                self._failed(exc)
+                return 1
+            return 1 if self._failures else 0
+
+    def fetch_info(self, info_file: Path, outtmpl: str, positions: Optional[Sequence[int]] = None,
+                   sleep_requests: Optional[str] = None) -> int:
+        """fetch() from a saved probe instead of the page, like --load-info-json."""
+        items = ",".join(str(p) for p in positions) if positions else None
+        with self._call(outtmpl, sleep_requests, items):
+            try:
+                self._ydl.download_with_info_file(str(info_file))
+            except self._errors as exc:
+                self._failed(exc)
+                return 1
+            return 1 if self._failures else 0
+
+    def close(self, save_cookies: bool = False) -> None:
+        """Release connections; the jar goes back to cookies.txt only if asked."""
+        if not save_cookies:
+            self._ydl.params["cookiefile"] = None
+        self._ydl.close()
+
+
+def _mtime(path: Path) -> Optional[int]:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
@@ -1,23 +1,52 @@
 """
-Scrapes the user's Bandcamp collection using Playwright.
-replaces the unreliable API method.
+Fetches the user's Bandcamp collection into collection.json.
 
-Features:
-- Robust pagination handling (infinite scroll + "Show more" button)
-- Retries on scroll to handle lazy loading
-- Extracts item metadata (Artist, Title, URL) to collection.json
+Engines:
+- api (default): pages through the fan collection_items JSON endpoint using the
+  cached fan_id (config/fan_id.txt) and the existing cookies. No browser, a
+  few seconds for a large collection.
+- playwright (fallback): scrolls the profile page in headless Chromium
+  (infinite scroll + "Show more" button) and scrapes the rendered items.
+
+Both write item metadata (Artist, Title, URL) to collection.json.
+
+Refreshes are incremental by default: new purchases appear first, so the API
+engine stops at the first page made up entirely of items already in
+collection.json and merges the new ones in at the front. Use --full for a
+complete rescan (e.g. once a day) to pick up removals and reordering.
 """
+import argparse
 import json
+import os
+import tempfile
 import time
 import sys
 from pathlib import Path
-from playwright.sync_api import sync_playwright
+
+# Request pacing is shared with the download worker (bin/bandcampctl_lib).
+sys.path.insert(0, str(Path(__file__).resolve().parent / "bin"))
+from bandcampctl_lib.config import get_paths, get_settings  # noqa: E402
+from bandcampctl_lib.ratelimit import RateLimiter  # noqa: E402
 
 # Configuration
 CONFIG_DIR = Path.home() / "BandcampSync/config"
 COOKIES_FILE = Path.home() / ".config/bandcamp/cookies.txt"
 OUT_FILE = Path.home() / "BandcampSync/collection.json"
 FAILED_LOG = Path.home() / "BandcampSync/dashboard.log"
+FAN_ID_FILE = CONFIG_DIR / "fan_id.txt"
+
+API_URL = "https://bandcamp.com/api/fancollection/1/collection_items"
+PAGE_SIZE = 100
+MAX_RATE_LIMIT_RETRIES = 5
+
+# Fields kept from each API item. The first three are what the pipeline reads;
+# the ids are kept so later stages can tell items apart without re-scraping.
+# Each item also gets its "redownload_url" (the purchase download page the
+# direct download engine starts from), looked up in the page's redownload_urls.
+ITEM_FIELDS = (
+    "item_title", "band_name", "item_url",
+    "tralbum_type", "tralbum_id", "sale_item_type", "sale_item_id", "purchased",
+)
 
 def log(msg):
     print(msg)
@@ -55,7 +84,194 @@ def load_netscape_cookies(context):
                 pass
     log(f"Loaded {count} cookies.")
 
-def scrape_collection():
+class ApiError(Exception):
+    pass
+
+
+def read_fan_id():
+    try:
+        fan_id = FAN_ID_FILE.read_text().strip()
+    except OSError:
+        return None
+    return fan_id if fan_id.isdigit() else None
+
+
+def load_cookies_into_session(session):
+    """Loads Netscape-formatted cookies into a requests session."""
+    if not COOKIES_FILE.exists():
+        log(f"WARNING: Cookies file not found at {COOKIES_FILE}")
+        return
+
+    count = 0
+    with COOKIES_FILE.open() as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            parts = line.split("\t")
+            if len(parts) < 6:
+                continue
+            if len(parts) == 6:
+                domain, flag, path, secure, name, value = parts
+            else:
+                domain, flag, path, secure, expiry, name, value = parts[:7]
+            session.cookies.set(name, value, domain=domain, path=path, secure=secure.lower() == "true")
+            count += 1
+    log(f"Loaded {count} cookies.")
+
+
+def build_session():
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    # One pooled keep-alive connection serves every page.
+    session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=2))
+    session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=2))
+    session.headers.update({"User-Agent": "BandcampSync/1.0", "Accept": "application/json"})
+    load_cookies_into_session(session)
+    return session
+
+
+class Pacer:
+    """Paces API calls through the shared rate limiter, so collection fetches
+    and album downloads draw from one budget for bandcamp.com and a 429 here
+    slows the worker down too (and vice versa)."""
+
+    def __init__(self, api_url):
+        self.host = api_url
+        self.limiter = RateLimiter(get_paths().ratelimit_state, get_settings())
+
+    def wait(self):
+        self.limiter.acquire(self.host, hold=False)
+
+    def report(self, status, retry_after=None):
+        self.limiter.report(self.host, status, retry_after)
+
+
+def fetch_page(session, pacer, api_url, fan_id, older_than_token, count=PAGE_SIZE):
+    payload = {"fan_id": int(fan_id), "older_than_token": older_than_token, "count": count}
+    for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+        pacer.wait()
+        resp = session.post(api_url, json=payload, timeout=30)
+        if resp.status_code in (429, 503):
+            retry_after = resp.headers.get("Retry-After", "")
+            delay = float(retry_after) if retry_after.replace(".", "", 1).isdigit() else 2 ** attempt
+            log(f"Rate limited ({resp.status_code}); retrying in {delay:.1f}s")
+            # The limiter holds every client off for `delay` and halves the rate.
+            pacer.report(resp.status_code, delay)
+            continue
+        pacer.report(resp.status_code)
+        if resp.status_code != 200:
+            raise ApiError(f"collection_items returned HTTP {resp.status_code}")
+        try:
+            data = resp.json()
+        except ValueError as e:
+            raise ApiError(f"collection_items returned invalid JSON: {e}")
+        if data.get("error"):
+            raise ApiError(f"collection_items error: {data.get('error_message') or data.get('error')}")
+        return data
+    raise ApiError("collection_items still rate limited after retries")
+
+
+def to_item(raw, redownload_urls=None):
+    item = {key: raw[key] for key in ITEM_FIELDS if key in raw}
+    # Keyed by sale item type + id, e.g. "p12345678".
+    key = f"{raw.get('sale_item_type', '')}{raw.get('sale_item_id', '')}"
+    if redownload_urls and key in redownload_urls:
+        item["redownload_url"] = redownload_urls[key]
+    return item
+
+
+def iter_collection_pages(session, api_url, fan_id, page_size=PAGE_SIZE):
+    """Yields one list of items per API page, newest purchases first."""
+    pacer = Pacer(api_url)
+    # The cursor starts "now" and walks back through purchase history.
+    token = f"{int(time.time())}::a::"
+    seen_tokens = set()
+    while True:
+        data = fetch_page(session, pacer, api_url, fan_id, token, page_size)
+        redownload_urls = data.get("redownload_urls") or {}
+        items = [to_item(raw, redownload_urls) for raw in data.get("items", []) if raw.get("item_url")]
+        yield items
+
+        next_token = data.get("last_token")
+        if not data.get("more_available") or not next_token:
+            return
+        if next_token in seen_tokens:
+            raise ApiError(f"cursor did not advance (last_token={next_token})")
+        seen_tokens.add(next_token)
+        token = next_token
+
+
+def scrape_collection_api(api_url=API_URL, fan_id=None, known_urls=None):
+    """Fetches collection items, newest first.
+
+    With `known_urls`, stops after the first page whose items are all known;
+    that page and everything older is already in collection.json.
+    """
+    fan_id = fan_id or read_fan_id()
+    if not fan_id:
+        raise ApiError(f"no fan_id in {FAN_ID_FILE}; run bin/capture_fan_id.py")
+
+    session = build_session()
+    items = []
+    for page in iter_collection_pages(session, api_url, fan_id):
+        if known_urls is not None and page and all(item["item_url"] in known_urls for item in page):
+            log(f"Reached already-known items after {len(items)} new/updated items.")
+            break
+        items.extend(page)
+        print(f"Status: {len(items)} items.")
+    log(f"Fetched {len(items)} items via collection API.")
+    return items
+
+
+def load_collection(path=OUT_FILE):
+    try:
+        data = json.loads(path.read_text())
+    except (OSError, ValueError):
+        return []
+    if not isinstance(data, list):
+        return []
+    items = [item for item in data if isinstance(item, dict)]
+    if len(items) < len(data):
+        log(f"WARNING: skipped {len(data) - len(items)} malformed entries in {path}")
+    return items
+
+
+def merge_new_items(fetched, existing):
+    """New items first (in API order), then the existing list minus duplicates."""
+    merged = []
+    seen = set()
+    for item in list(fetched) + list(existing):
+        url = item.get("item_url")
+        if not url or url in seen:
+            continue
+        seen.add(url)
+        merged.append(item)
+    return merged
+
+
+def save_collection(items, out_file=OUT_FILE):
+    # Write to a temp file in the same directory and rename over the target so
+    # readers (dashboard, extract_owned.py) never see a half-written file.
+    out_file.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=f".{out_file.name}.", dir=str(out_file.parent))
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(items, f, indent=2)
+        os.replace(tmp, out_file)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def scrape_collection_playwright():
+    from playwright.sync_api import sync_playwright
+
     with sync_playwright() as p:
         browser = p.chromium.launch(headless=True)
         context = browser.new_context()
@@ -78,7 +294,7 @@ def scrape_collection():
         except Exception as e:
             log(f"Navigation failed: {e}")
             browser.close()
-            return
+            return None
 
         # Check if we got redirected
         final_url = page.url
@@ -192,11 +408,48 @@ def scrape_collection():
         }""")
 
         log(f"Scraped {len(items_data)} items.")
-        
-        with OUT_FILE.open("w") as f:
-            json.dump(items_data, f, indent=2)
-            
         browser.close()
+        return items_data
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fetch the Bandcamp collection into collection.json")
+    parser.add_argument("--engine", choices=["auto", "api", "playwright"], default="auto",
+                        help="auto = API first, Playwright only if the API fails")
+    parser.add_argument("--api-url", default=API_URL, help="collection_items endpoint (e.g. a local fixture server)")
+    parser.add_argument("--fan-id", default=None, help="override config/fan_id.txt")
+    parser.add_argument("--out", type=Path, default=OUT_FILE)
+    parser.add_argument("--full", action="store_true",
+                        help="rescan the whole collection instead of stopping at known items")
+    args = parser.parse_args(argv)
+
+    existing = [] if args.full else load_collection(args.out)
+    known_urls = {item.get("item_url") for item in existing if item.get("item_url")}
+
+    items = None
+    if args.engine in ("auto", "api"):
+        try:
+            fetched = scrape_collection_api(args.api_url, args.fan_id, known_urls if known_urls else None)
+            items = merge_new_items(fetched, existing)
+        except Exception as e:
+            log(f"Collection API failed: {e}")
+            if args.engine == "api":
+                return 1
+            log("Falling back to Playwright scraper.")
+
+    if items is None:
+        # The browser scrape always sees the full collection.
+        items = scrape_collection_playwright()
+        if items is None:
+            return 1
+
+    if items == existing:
+        log("Collection unchanged.")
+        return 0
+    save_collection(items, args.out)
+    log(f"Wrote {len(items)} items to {args.out}.")
+    return 0
+
 
 if __name__ == "__main__":
-    scrape_collection()
+    sys.exit(main())
@@ -0,0 +1,113 @@
+"""
+Local stand-in for Bandcamp's fan collection_items endpoint.
+
+Serves a collection.json-style fixture through the same paged JSON API that
+capture_collection_api.py talks to, so pagination, cursor handling and rate
+limiting can be exercised offline:
+
+    python3 collection_fixture_server.py --port 8765 --rate-limit-every 3 &
+    python3 capture_collection_api.py --engine api --fan-id 1 \
+        --api-url http://127.0.0.1:8765/api/fancollection/1/collection_items \
+        --out /tmp/collection.json
+
+Cursors look like Bandcamp's ("<timestamp>:<id>:a::"); here the id is the
+offset of the last item returned, so a page boundary can be checked by eye.
+"""
+import argparse
+import json
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+DEFAULT_FIXTURE = Path(__file__).resolve().parent / "collection.json"
+BASE_TS = 1700000000
+
+
+def make_token(offset):
+    return f"{BASE_TS - offset}:{offset}:a::"
+
+
+def parse_offset(token):
+    # First page: "<now>::a::" (no id) -> start from the top.
+    parts = str(token or "").split(":")
+    if len(parts) < 2 or not parts[1].isdigit():
+        return 0
+    return int(parts[1]) + 1
+
+
+def make_handler(items, fan_id, max_page_size, rate_limit_every):
+    state = {"requests": 0}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status, body, headers=None):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            if not self.path.endswith("/collection_items"):
+                self._send(404, {"error": True, "error_message": "not found"})
+                return
+
+            with lock:
+                state["requests"] += 1
+                throttled = rate_limit_every and state["requests"] % rate_limit_every == 0
+            if throttled:
+                self._send(429, {"error": True, "error_message": "rate limited"}, {"Retry-After": "1"})
+                return
+
+            length = int(self.headers.get("Content-Length") or 0)
+            try:
+                payload = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                self._send(400, {"error": True, "error_message": "bad json"})
+                return
+            if str(payload.get("fan_id")) != str(fan_id):
+                self._send(200, {"error": True, "error_message": "No such fan"})
+                return
+
+            count = min(int(payload.get("count") or 20), max_page_size)
+            start = parse_offset(payload.get("older_than_token"))
+            page = items[start:start + count]
+            end = start + len(page) - 1
+            self._send(200, {
+                "items": page,
+                "more_available": start + len(page) < len(items),
+                "last_token": make_token(end) if page else None,
+            })
+
+        def log_message(self, fmt, *args):
+            sys.stderr.write(f"[fixture] {fmt % args}\n")
+
+    return Handler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline fixture for the collection_items API")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--fixture", type=Path, default=DEFAULT_FIXTURE)
+    parser.add_argument("--fan-id", default="1")
+    parser.add_argument("--page-size", type=int, default=20, help="server-side cap on items per page")
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="answer every Nth request with 429")
+    args = parser.parse_args(argv)
+
+    items = json.loads(args.fixture.read_text())
+    handler = make_handler(items, args.fan_id, args.page_size, args.rate_limit_every)
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), handler)
+    print(f"Serving {len(items)} items from {args.fixture} on http://127.0.0.1:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
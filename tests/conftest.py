@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# bandcampctl_lib is not installed; it ships next to the bandcampctl script.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "bin"))
@@ -0,0 +1,76 @@
+import io
+import struct
+import zipfile
+import zlib
+
+import pytest
+
+from bandcampctl_lib.direct import DirectDownloadError, _Stream, extract_zip_stream
+
+
+class _Unseekable(io.RawIOBase):
+    """What a streaming writer sees: sizes go into data descriptors."""
+
+    def __init__(self):
+        self.buf = io.BytesIO()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        return self.buf.write(data)
+
+
+def _streamed_zip(entries, method, force_zip64=False):
+    out = _Unseekable()
+    with zipfile.ZipFile(out, "w", compression=method) as zf:
+        for name, data in entries:
+            with zf.open(zipfile.ZipInfo(name), "w", force_zip64=force_zip64) as f:
+                f.write(data)
+    return out.buf.getvalue()
+
+
+def _chunks(data, size=1000):
+    return iter([data[i:i + size] for i in range(0, len(data), size)])
+
+
+# Deflate only: Python's zipfile writes stored entries to a stream with
+# their sizes up front, not behind a descriptor.
+@pytest.mark.parametrize("force_zip64", [False, True])
+def test_streamed_archive_with_descriptors(tmp_path, force_zip64):
+    entries = [
+        ("Artist - Album - 01 One.flac", bytes(range(256)) * 40),
+        ("Artist - Album - 02 Two.flac", b"two" * 5000),
+        ("cover.jpg", b"\xff\xd8" + b"x" * 100),
+    ]
+    data = _streamed_zip(entries, zipfile.ZIP_DEFLATED, force_zip64)
+    written = extract_zip_stream(_Stream(_chunks(data)), tmp_path, "Artist", "Album")
+    assert [p.name for p in written] == ["01 - One.flac", "02 - Two.flac", "cover.jpg"]
+    assert [p.read_bytes() for p in written] == [content for _name, content in entries]
+
+
+def _stored_with_descriptor(name, data, zip64):
+    """A stored entry whose sizes only follow it, as some servers stream them."""
+    size = 0xFFFFFFFF if zip64 else 0
+    extra = struct.pack("<HHQQ", 1, 16, 0, 0) if zip64 else b""
+    header = struct.pack("<IHHHHHIIIHH", 0x04034B50, 45, 0x08, 0, 0, 0, 0, size, size, len(name), len(extra))
+    sizes = struct.pack("<QQ" if zip64 else "<II", len(data), len(data))
+    descriptor = struct.pack("<II", 0x08074B50, zlib.crc32(data)) + sizes
+    return header + name.encode() + extra + data + descriptor
+
+
+@pytest.mark.parametrize("zip64", [False, True])
+def test_stored_entries_with_descriptors(tmp_path, zip64):
+    one, two = b"PK\x07\x08 inside the audio " * 300, b"second"
+    data = (_stored_with_descriptor("01 One.flac", one, zip64)
+            + _stored_with_descriptor("02 Two.flac", two, zip64) + b"PK\x01\x02")
+    written = extract_zip_stream(_Stream(_chunks(data, 777)), tmp_path, "A", "B")
+    assert [p.read_bytes() for p in written] == [one, two]
+
+
+def test_corrupt_entry_is_rejected(tmp_path):
+    data = bytearray(_streamed_zip([("a.flac", b"a" * 5000)], zipfile.ZIP_DEFLATED, True))
+    crc_at = data.index(b"PK\x07\x08") + 4
+    data[crc_at] ^= 0xFF
+    with pytest.raises(DirectDownloadError):
+        extract_zip_stream(_Stream(_chunks(bytes(data))), tmp_path, "A", "B")
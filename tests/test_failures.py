@@ -0,0 +1,23 @@
+from bandcampctl_lib.failures import AUTH, PERMANENT, TRANSIENT, classify
+
+
+def test_retryable_errors_are_not_permanent():
+    for line in (
+        "ERROR: [bandcamp] 123: Requested format is not available. Use --list-formats for a list of available formats",
+        "ERROR: ffprobe/ffmpeg not found. Please install or provide the path using --ffmpeg-location",
+    ):
+        assert classify(1, [line]).kind != PERMANENT, line
+
+
+def test_removed_releases_are_permanent():
+    for line in (
+        "ERROR: [bandcamp] x: Unable to download webpage: HTTP Error 404: Not Found",
+        "ERROR: [bandcamp] x: This album is no longer available",
+        "ERROR: job file not found: /tmp/x.job",
+    ):
+        assert classify(1, [line]).kind == PERMANENT, line
+
+
+def test_auth_and_transient():
+    assert classify(1, ["ERROR: Missing cookies at /x/cookies.txt"]).kind == AUTH
+    assert classify(1, ["ERROR: HTTP Error 503: Service Unavailable"]).kind == TRANSIENT
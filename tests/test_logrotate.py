@@ -0,0 +1,62 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from bandcampctl_lib.config import get_paths, get_settings
+from bandcampctl_lib.joblog import JobLogIndex
+from bandcampctl_lib.logrotate import list_segments, rotate_logs
+from bandcampctl_lib.logs import append_entry
+
+
+@pytest.fixture
+def paths(tmp_path, monkeypatch):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    return get_paths()
+
+
+@pytest.mark.parametrize("indexed", [False, True])
+def test_interrupted_rotation_is_finished(paths, indexed):
+    log = paths.worker_log
+    index = JobLogIndex(paths.joblog_db, paths.named_logs())
+    append_entry(log, "job_start", "abc", "before the rotation")
+    if indexed:
+        index.refresh()
+    # The rotation died right after renaming the live log aside.
+    leftover = log.with_name(f"{log.name}.20260101T000000.000000")
+    os.rename(log, leftover)
+    append_entry(log, "job_start", "def", "after it")
+
+    rotate_logs(paths, get_settings())
+
+    assert not leftover.exists()
+    segments = list_segments(log, "worker")
+    assert [s.path.name for s in segments] == [f"{leftover.name}.gz"]
+    assert segments[0].job_ids == {"abc"}
+    assert [e.detail for e in index.history("abc")] == ["before the rotation"]
+    assert [e.detail for e in index.history("def")] == ["after it"]
+
+
+class _Crash(Exception):
+    pass
+
+
+def test_rotation_interrupted_before_the_unlink(paths, monkeypatch):
+    log = paths.worker_log
+    index = JobLogIndex(paths.joblog_db, paths.named_logs())
+    append_entry(log, "job_start", "abc")
+
+    def crash(self, missing_ok=False):
+        raise _Crash(self)
+
+    with monkeypatch.context() as patch:
+        patch.setattr(Path, "unlink", crash)
+        with pytest.raises(_Crash):
+            rotate_logs(paths, get_settings(), force=True)
+    [leftover] = log.parent.glob("worker.log.*")
+
+    rotate_logs(paths, get_settings())
+
+    assert not leftover.exists()
+    assert [s.job_ids for s in list_segments(log, "worker")] == [{"abc"}]
+    assert len(index.history("abc")) == 1